@@ -0,0 +1,83 @@
+"""
+Load time and resident memory of a large generated flow read as JSON versus
+the binary program format (interpreter/binary.py). Each measurement runs in a
+fresh process that loads `copies` copies of the flow and gets its cache key
+(json.load + flow_hash for JSON; the header hash and a decode of the steps
+for binary), which is everything compile_flow needs before compiling.
+
+    python benchmarks/bench_binary_load.py [steps] [copies]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from interpreter import binary
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from interpreter import binary
+from interpreter.compiler import flow_hash
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * 4096
+
+def load_json(path):
+    with open(path) as f:
+        flow = json.load(f)
+    return flow, flow_hash(flow['steps'])
+
+def load_binary(path):
+    flow = binary.load(path)
+    flow['steps']
+    return flow, flow.steps_hash
+
+load = load_binary if {binary!r} else load_json
+before = rss()
+start = time.perf_counter()
+flows = [load({path!r}) for _ in range({copies})]
+print(time.perf_counter() - start, rss() - before)
+"""
+
+def build_flow(steps):
+    body = []
+    for i in range(steps // 2):
+        name = f"v{i % 50}"
+        body.append({"let": {name: {"add": [{"get": "balance"}, {"value": i}, {"get": ["accounts", f"user{i % 20}", "balance"]}]}}})
+        body.append({"if": {
+            "condition": {"compare": {"left": {"get": name}, "op": ">", "right": {"value": 100}}},
+            "then": [{"set": {"target": "status", "value": {"value": "high"}}}, {"log": {"level": "info", "message": ["'over'", name]}}],
+            "else": [{"set": {"target": "status", "value": {"value": "low"}}}],
+        }})
+    return {"function": "generated", "schema": {"inputs": {}, "context": {"status": "string"}}, "context": {}, "steps": body}
+
+def measure(path, is_binary, copies):
+    code = PROBE.format(root=ROOT, binary=is_binary, path=path, copies=copies)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    seconds, rss = out.split()
+    return float(seconds) / copies, int(rss) / copies
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    flow = build_flow(steps)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "flow.json")
+        bin_path = os.path.join(tmp, "flow.jfb")
+        with open(json_path, "w") as f:
+            json.dump(flow, f)
+        binary.dump(flow, bin_path)
+        print(f"steps={len(flow['steps'])} copies={copies}")
+        print(f"file size: json {os.path.getsize(json_path) / 1024:.0f} KiB, binary {os.path.getsize(bin_path) / 1024:.0f} KiB")
+        for label, path, is_binary in (("json", json_path, False), ("binary", bin_path, True)):
+            seconds, rss = measure(path, is_binary, copies)
+            print(f"{label:6}: {seconds * 1000:6.1f}ms and {rss / 2**20:5.1f} MiB RSS per loaded copy")
+
+if __name__ == "__main__":
+    main()
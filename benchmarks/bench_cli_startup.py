@@ -0,0 +1,44 @@
+"""
+Measures import-time cost of the natural-language CLI with `python -X importtime`,
+and checks that startup does not load spaCy, OpenAI or Lark, which are only
+imported once a sentence actually needs them.
+
+    python benchmarks/bench_cli_startup.py [module] [top]
+
+`module` defaults to `cli` (interpreter/cli.py); `cli_main` skips click.
+"""
+import os
+import subprocess
+import sys
+
+INTERPRETER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interpreter")
+HEAVY = ("spacy", "openai", "lark")
+
+def import_times(module):
+    """Returns {module: (self_us, cumulative_us)} from one cold interpreter start."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=INTERPRETER_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "cli"
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    times = import_times(module)
+    print(f"import {module}: {times[module][1] / 1000:.1f}ms cumulative, {len(times)} modules")
+    for name, (_, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+    loaded = [name for name in times if name.split(".")[0] in HEAVY]
+    print(f"heavy modules loaded: {', '.join(sorted({name.split('.')[0] for name in loaded})) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares the static cost model's "python" predictions (nanoseconds) with
+measured interpreter run times.
+
+    python benchmarks/bench_cost_model.py [repeats]
+"""
+import copy
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "multi_compiler"))
+
+from analysis.cost_estimator import estimate_cost
+from interpreter.compiler import compile_steps
+from interpreter.context import Context
+
+def accumulate(target, source):
+    return {"set": {"target": target, "value": {"add": [{"get": target}, {"get": source}]}}}
+
+def workloads():
+    yield "flat sets", {"x": 0, "one": 1}, [accumulate("x", "one") for _ in range(200)]
+    yield "let + compare", {"x": 5}, [
+        {"let": {"big": {"compare": {"left": {"get": "x"}, "op": ">", "right": {"value": i}}}}} for i in range(200)
+    ]
+    yield "forEach 1000", {"xs": list(range(1000)), "total": 0}, [
+        {"forEach": {"source": "xs", "as": "x", "body": [accumulate("total", "x")]}}
+    ]
+    yield "forEach 1000, 3-step body", {"xs": list(range(1000)), "a": 0, "b": 0}, [
+        {"forEach": {"source": "xs", "as": "x", "body": [
+            accumulate("a", "x"), accumulate("b", "a"),
+            {"let": {"c": {"add": [{"get": "a"}, {"get": "b"}, {"value": 1}]}}},
+        ]}}
+    ]
+    yield "nested forEach 60x60", {"rows": list(range(60)), "cols": list(range(60)), "total": 0}, [
+        {"forEach": {"source": "rows", "as": "r", "body": [
+            {"forEach": {"source": "cols", "as": "c", "body": [accumulate("total", "c")]}}
+        ]}}
+    ]
+    yield "map 2000", {"xs": list(range(2000)), "one": 1}, [
+        {"map": {"source": "xs", "as": "x", "target": "ys", "body": [accumulate("x", "one")]}}
+    ]
+    yield "try 200", {"x": 0, "one": 1}, [
+        {"try": {"body": [accumulate("x", "one")], "catch": []}} for _ in range(200)
+    ]
+
+def measure(steps, context, repeats):
+    program = compile_steps(steps)
+    best = float("inf")
+    for _ in range(repeats):
+        ctx = Context(copy.deepcopy(context))
+        start = time.perf_counter_ns()
+        program.run_sync(ctx)
+        best = min(best, time.perf_counter_ns() - start)
+    return best
+
+def main():
+    logging.disable(logging.INFO)
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'workload':28} {'predicted':>12} {'measured':>12} {'ratio':>7}")
+    ratios = []
+    for name, context, steps in workloads():
+        predicted = estimate_cost({"context": context, "steps": steps}, backend="python").total.expected
+        measured = measure(steps, context, repeats)
+        ratios.append(predicted / measured)
+        print(f"{name:28} {predicted / 1e3:10.1f}us {measured / 1e3:10.1f}us {ratios[-1]:7.2f}")
+    print(f"ratio range {min(ratios):.2f}-{max(ratios):.2f}")
+
+if __name__ == "__main__":
+    main()
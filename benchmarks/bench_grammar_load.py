@@ -0,0 +1,41 @@
+"""
+Measures how long a fresh process takes to get both KidLang parsers, with the
+LALR tables built from kidlang.lark (cold) and loaded from the prebuilt
+tables next to the grammar (warm).
+
+    python benchmarks/bench_grammar_load.py [runs]
+"""
+import glob
+import os
+import subprocess
+import sys
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parser")
+
+PROBE = """
+import time
+start = time.perf_counter()
+import kidlang_grammar
+imported = time.perf_counter()
+kidlang_grammar.get_parser()
+kidlang_grammar.get_script_parser()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+def load_time(cold):
+    if cold:
+        for path in glob.glob(os.path.join(PARSER_DIR, "*.lark-cache")):
+            os.remove(path)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=PARSER_DIR, capture_output=True, text=True, check=True).stdout
+    return [float(value) for value in out.split()]
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, cold in (("cold (build tables)", True), ("warm (load tables)", False)):
+        load_time(cold)
+        times = sorted(load_time(cold) for _ in range(runs))
+        imported, parsers = times[len(times) // 2]
+        print(f"{label}: import {imported * 1000:.1f}ms, parsers {parsers * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
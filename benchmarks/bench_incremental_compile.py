@@ -0,0 +1,68 @@
+"""
+Compile latency for a one-step edit to a large flow: full recompilation versus
+incremental recompilation through a StepCache.
+
+    python benchmarks/bench_incremental_compile.py [steps]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "multi_compiler"))
+
+from main import compile_jsonflow
+from base import get_expr_code
+from utils import StepCache
+
+def build_flow(steps):
+    return {
+        "function": "accumulate",
+        "schema": {"inputs": {"amount": {"type": "integer"}}, "context": {"balance": "integer", "total": "integer"}},
+        "steps": [
+            {"set": {"target": "balance" if i % 2 else "total",
+                     "value": {"add": [{"get": "balance"}, {"get": "amount"}, {"value": i}]}}}
+            for i in range(steps)
+        ],
+    }
+
+def timed(path, step_cache=None):
+    start = time.perf_counter()
+    result = compile_jsonflow(path, step_cache)
+    return time.perf_counter() - start, result
+
+def main():
+    logging.disable(logging.INFO)
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    flow = build_flow(steps)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "flow.json")
+        with open(path, "w") as f:
+            json.dump(flow, f)
+
+        step_cache = StepCache(os.path.join(tmp, "flow.stepcache.json"))
+        cold, _ = timed(path, step_cache)
+
+        flow["steps"][steps // 2]["set"]["value"]["add"][2]["value"] = -1
+        with open(path, "w") as f:
+            json.dump(flow, f)
+
+        get_expr_code.cache_clear()
+        full, expected = timed(path)
+        hits, misses = step_cache.hits, step_cache.misses
+        incremental, result = timed(path, step_cache)
+        assert result == expected
+        reloaded, result = timed(path, StepCache(step_cache.path))
+        assert result == expected
+
+    print(f"{steps} steps, one edited step")
+    print(f"cold compile (filling cache): {cold:.3f}s")
+    print(f"full recompile:               {full:.3f}s")
+    print(f"incremental (in memory):      {incremental:.3f}s  ({full / incremental:.1f}x, "
+          f"{step_cache.misses - misses} of {step_cache.hits - hits + step_cache.misses - misses} step emits regenerated)")
+    print(f"incremental (cache on disk):  {reloaded:.3f}s")
+
+if __name__ == "__main__":
+    main()
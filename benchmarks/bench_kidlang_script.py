@@ -0,0 +1,64 @@
+"""
+Compares parsing a generated KidLang script sentence by sentence (a parse
+tree and a transformer pass per line) against parse_kid_script, which parses
+the script in bulk with the transformer embedded in the LALR parser.
+
+    python benchmarks/bench_kidlang_script.py [lines] [bad_every]
+
+About one line in `bad_every` (at random; 0 for none) is malformed, to show
+that bad lines are reported without falling back to per-line parsing.
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parser")
+sys.path.insert(0, PARSER_DIR)
+
+from kidlang_grammar import get_parser, get_script_parser, parse_kid_script, parse_kid_sentence_grammar
+
+TEMPLATES = [
+    "set v{i} to {i}",
+    'append "item{i}" to logs',
+    'if v{i} is greater than 50, then say "high"',
+    "map items to out{i} by adding {i}",
+    'call fetch with "url{i}" and save to r{i}',
+    'assert v{i} is less than 100 or say "too big"',
+    "return v{i}",
+]
+
+def generate(lines, bad_every):
+    rng = random.Random(0)
+    return [
+        f"set v{i} to" if bad_every and rng.randrange(bad_every) == 0 else TEMPLATES[i % len(TEMPLATES)].format(i=i)
+        for i in range(lines)
+    ]
+
+def main():
+    logging.disable(logging.CRITICAL)
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    bad_every = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    sentences = generate(lines, bad_every)
+    script = "\n".join(sentences)
+    # Build both parsers up front, so only parsing is timed
+    get_parser()
+    get_script_parser()
+
+    start = time.perf_counter()
+    per_line = [parse_kid_sentence_grammar(sentence) for sentence in sentences]
+    per_line_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blocks = parse_kid_script(script)
+    bulk_time = time.perf_counter() - start
+
+    errors = sum(1 for block in blocks if "error" in block)
+    assert len(per_line) == lines and len(blocks) == lines
+    print(f"lines={lines} bad lines={errors}")
+    print(f"per sentence: {per_line_time:.2f}s")
+    print(f"bulk script:  {bulk_time:.2f}s ({per_line_time / bulk_time:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Compares a CPU-bound `map` run in-process against the process-pool executor.
+
+    python benchmarks/bench_map_process.py [items] [inner]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from interpreter.pool import PROCESS_WORKERS, get_process_pool, shutdown_process_pool
+from interpreter.runtime import Context, run_steps
+
+def build_steps(executor=None):
+    body = [{"forEach": {"source": "inner", "as": "k", "body": [
+        {"set": {"target": "item", "value": {"add": [{"get": "item"}, {"get": "k"}]}}}
+    ]}}]
+    spec = {"source": "items", "as": "item", "target": "out", "body": body}
+    if executor:
+        spec["executor"] = executor
+    return [{"map": spec}]
+
+def timed(steps, items, inner):
+    ctx = Context({"items": list(range(items)), "inner": list(range(inner))})
+    start = time.perf_counter()
+    asyncio.run(run_steps(steps, ctx))
+    return time.perf_counter() - start, ctx.get("out")
+
+def main():
+    logging.disable(logging.INFO)
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    inner = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    get_process_pool().submit(int).result()  # warm the pool outside the timing
+    serial, expected = timed(build_steps(), items, inner)
+    parallel, result = timed(build_steps("process"), items, inner)
+    shutdown_process_pool()
+    assert result == expected
+    print(f"items={items} inner={inner} workers={PROCESS_WORKERS}")
+    print(f"in-process: {serial:.3f}s")
+    print(f"process pool: {parallel:.3f}s ({serial / parallel:.2f}x)")
+
+if __name__ == "__main__":
+    main()
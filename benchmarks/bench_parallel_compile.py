@@ -0,0 +1,56 @@
+"""
+Wall-clock time for compiling a directory of flows to every backend (Rust
+included): one process versus the compile_many process pool.
+
+    python benchmarks/bench_parallel_compile.py [flows] [steps] [workers]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "multi_compiler"))
+
+from main import DEFAULT_BACKENDS, compile_jsonflow, compile_many, expand_paths
+from base import get_expr_code
+
+BACKENDS = DEFAULT_BACKENDS + ("rust",)
+
+def build_flow(index, steps):
+    return {
+        "function": f"flow{index}",
+        "schema": {"inputs": {"amount": {"type": "integer"}}, "context": {"balance": "integer"}},
+        "steps": [
+            {"set": {"target": "balance", "value": {"add": [{"get": "balance"}, {"get": "amount"}, {"value": index * steps + i}]}}}
+            for i in range(steps)
+        ],
+    }
+
+def main():
+    logging.disable(logging.INFO)
+    flows = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(flows):
+            with open(os.path.join(tmp, f"flow{i}.json"), "w") as f:
+                json.dump(build_flow(i, steps), f)
+
+        start = time.perf_counter()
+        expected = {path: compile_jsonflow(path, backends=BACKENDS) for path in expand_paths([tmp])}
+        serial = time.perf_counter() - start
+
+        get_expr_code.cache_clear()
+        start = time.perf_counter()
+        result = compile_many([tmp], BACKENDS, workers)
+        parallel = time.perf_counter() - start
+        assert result == expected
+
+    print(f"{flows} flows x {steps} steps x {len(BACKENDS)} backends")
+    print(f"serial:              {serial:.3f}s")
+    print(f"pool ({workers} workers):    {parallel:.3f}s  ({serial / parallel:.2f}x)")
+
+if __name__ == "__main__":
+    main()
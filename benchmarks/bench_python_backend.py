@@ -0,0 +1,102 @@
+"""
+Runs examples/*.json, and a loop-heavy flow, through the interpreter
+(a cached Program run against a fresh Context) and through the Python
+backend's runnable mode (a cached function object called with a dict), and
+reports per-run latency. Results are checked to agree before timing; flows
+the interpreter cannot compile are listed and skipped.
+
+    python benchmarks/bench_python_backend.py [runs] [loop_size]
+"""
+import copy
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "multi_compiler", "compiler"))
+
+from interpreter.batch import schema_types
+from interpreter.compiler import compile_flow
+from interpreter.context import Context
+from python import load_python_function
+
+INPUTS = {
+    "square": {"x": 7},
+    "transfer": {"sender": "alice", "recipient": "bob", "amount": 30,
+                 "balances": {"sender": 100, "recipient": None}},
+    "deposit": {"key": "alice", "amount": 5, "balances": {"sender": 10}},
+}
+
+def loop_flow(size):
+    return {
+        "function": "collatz_steps",
+        "schema": {"inputs": {"n": "integer"}, "context": {}},
+        "steps": [
+            {"let": {"i": 1, "total": 0}},
+            {"while": {
+                "condition": {"compare": {"left": {"get": "i"}, "op": "<=", "right": {"get": "n"}}},
+                "max_iterations": size + 1,
+                "body": [
+                    {"let": {"x": {"get": "i"}}},
+                    {"if": {
+                        "condition": {"compare": {"left": {"mod": [{"get": "x"}, 2]}, "op": "==", "right": 0}},
+                        "then": [{"set": {"target": "x", "value": {"divide": [{"get": "x"}, 2]}}}],
+                        "else": [{"set": {"target": "x", "value": {"add": [{"multiply": [{"get": "x"}, 3]}, 1]}}}],
+                    }},
+                    {"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "x"}]}}},
+                    {"set": {"target": "i", "value": {"add": [{"get": "i"}, 1]}}},
+                ],
+            }},
+            {"return": {"get": "total"}},
+        ],
+    }
+
+def best(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    loop_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    # Both paths log the same messages; keep them off the terminal
+    logging.getLogger("jsonflow.flow").setLevel(logging.WARNING)
+
+    cases = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "examples", "*.json"))):
+        with open(path) as f:
+            flow = json.load(f)
+        cases.append((os.path.basename(path), flow, INPUTS.get(flow["function"], {}), runs))
+    cases.append((f"loop({loop_size})", loop_flow(loop_size), {"n": loop_size}, max(1, runs // 100)))
+
+    for label, flow, inputs, case_runs in cases:
+        base = {**copy.deepcopy(flow.get("context", {})), **inputs}
+        try:
+            program = compile_flow(flow)
+            fn = load_python_function(flow)
+        except Exception as e:
+            print(f"{label:16}: skipped ({type(e).__name__}: {e})")
+            continue
+        schema = schema_types(flow)
+
+        def interpreted():
+            return program.run_sync(Context(copy.deepcopy(base), schema))
+
+        def native():
+            return fn(copy.deepcopy(base))
+
+        assert interpreted() == native(), label
+        interpreter_time = best(interpreted, case_runs)
+        native_time = best(native, case_runs)
+        print(f"{label:16}: interpreter {interpreter_time * 1e6:9.1f}us  "
+              f"native {native_time * 1e6:9.1f}us ({interpreter_time / native_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares running a flow of independent I/O-bound calls step by step against
+the dependency scheduler, which overlaps steps that touch disjoint variables.
+
+    python benchmarks/bench_step_scheduler.py [calls] [latency_ms]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from interpreter import compiler
+from interpreter.functions import register
+from interpreter.runtime import Context, run_steps
+
+@register("fetch")
+async def fetch(key, latency):
+    await asyncio.sleep(latency)
+    return key
+
+def build_steps(calls, latency):
+    steps = [
+        {"let": {f"r{i}": {"call": {"function": "fetch", "args": {"key": i, "latency": latency}, "async": True}}}}
+        for i in range(calls)
+    ]
+    steps.append({"let": {"total": {"add": [{"get": f"r{i}"} for i in range(calls)]}}})
+    return steps
+
+def timed(steps, schedule):
+    compiler.SCHEDULE = schedule
+    compiler.clear_cache()
+    ctx = Context()
+    start = time.perf_counter()
+    asyncio.run(run_steps(steps, ctx))
+    return time.perf_counter() - start, ctx.get("total")
+
+def main():
+    logging.disable(logging.INFO)
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    steps = build_steps(calls, latency)
+    serial, expected = timed(steps, False)
+    scheduled, total = timed(steps, True)
+    assert total == expected
+    print(f"calls={calls} latency={latency * 1000:.0f}ms")
+    print(f"sequential: {serial:.3f}s")
+    print(f"scheduled:  {scheduled:.3f}s ({serial / scheduled:.2f}x)")
+
+if __name__ == "__main__":
+    main()
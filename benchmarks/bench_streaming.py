@@ -0,0 +1,60 @@
+"""
+Compares folding a large JSON array with forEach after json.load against
+streaming it with JSONArray: wall time and peak traced memory.
+
+    python benchmarks/bench_streaming.py [items]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from interpreter.compiler import compile_steps
+from interpreter.runtime import Context
+from interpreter.streams import JSONArray
+
+STEPS = [
+    {"set": {"target": "total", "value": 0}},
+    {"forEach": {"source": "events", "as": "e", "body": [
+        {"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": ["e", "amount"]}]}}},
+    ]}},
+]
+
+def measure(load):
+    program = compile_steps(STEPS)
+    tracemalloc.start()
+    start = time.perf_counter()
+    ctx = Context({"events": load()})
+    program.run_sync(ctx)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, ctx.get("total")
+
+def main():
+    logging.disable(logging.INFO)
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.json")
+        with open(path, "w") as f:
+            json.dump([{"id": i, "amount": i % 100, "note": "event payload " * 4} for i in range(items)], f)
+        size = os.path.getsize(path)
+
+        def load_list():
+            with open(path) as f:
+                return json.load(f)
+
+        listed = measure(load_list)
+        streamed = measure(lambda: JSONArray(path))
+    assert listed[2] == streamed[2]
+    print(f"items={items} file={size / 1e6:.1f}MB")
+    print(f"json.load:  {listed[0]:.3f}s peak {listed[1] / 1e6:.1f}MB")
+    print(f"JSONArray:  {streamed[0]:.3f}s peak {streamed[1] / 1e6:.2f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Validates a generated flow against schema/schema.json, whose recursive
+`$defs/step` (a oneOf of 27 step kinds) and `$defs/expr` dominate the cost:
+
+  naive      the schema compiled for every flow, every oneOf branch checked
+  compiled   the schema compiled for every flow, branches picked by `type`
+  cached     the compiled validator reused (results not memoized)
+  memoized   the same flow validated again (a content-hash lookup)
+
+jsonschema's Draft7Validator is timed too when it is installed. Each step
+branch of schema.json puts `additionalProperties: false` beside its `allOf`,
+which under draft-07 rejects every property, so every generated step reports
+errors; that is part of what is timed.
+
+    python benchmarks/bench_validation.py [steps] [runs]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from interpreter import validation
+
+SCHEMA = os.path.join(ROOT, "schema", "schema.json")
+
+def build_flow(steps):
+    body = []
+    for i in range(steps // 2):
+        total = {"add": [{"get": "balance"}, {"value": i}, {"multiply": [{"get": "rate"}, 2]}]}
+        body.append({"type": "set", "target": f"v{i % 50}", "value": total})
+        body.append({
+            "type": "if",
+            "condition": {"compare": {"left": {"get": f"v{i % 50}"}, "op": ">", "right": {"value": 100}}},
+            "then": [{"type": "assert", "condition": {"get": "ok"}, "message": "over"}],
+            "else": [{"type": "return", "value": {"get": "balance"}}],
+        })
+    return {
+        "function": "generated",
+        "schema": {"inputs": {"balance": {"type": "integer"}}, "context": {}, "outputs": {}},
+        "steps": body,
+    }
+
+def best(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    flow = build_flow(steps)
+
+    def uncached(dispatch):
+        def run():
+            validation.DISPATCH = dispatch
+            validation.clear_cache()
+            validation.validate_flow(flow, SCHEMA)
+        return run
+
+    def cached():
+        validation._results.clear()
+        validation.validate_flow(flow, SCHEMA)
+
+    timings = {
+        "naive": best(uncached(False), runs),
+        "compiled": best(uncached(True), runs),
+        "cached": best(cached, runs),
+        "memoized": best(lambda: validation.validate_flow(flow, SCHEMA), runs),
+    }
+    try:
+        import json
+        import jsonschema
+    except ImportError:
+        pass
+    else:
+        with open(SCHEMA) as f:
+            validator = jsonschema.Draft7Validator(json.load(f))
+        timings["jsonschema"] = best(lambda: list(validator.iter_errors(flow)), runs)
+
+    print(f"steps={len(flow['steps'])} errors={len(validation.validate_flow(flow, SCHEMA))}")
+    for label, seconds in timings.items():
+        print(f"{label:10}: {seconds * 1000:8.2f}ms ({timings['naive'] / seconds:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Runs a JSONFlow program:
+
+    python -m interpreter examples/deposit.json --context '{"sender": "alice", "amount": 50}'
+
+The flow may be JSON or a binary program written by
+`python multi_compiler/main.py --emit bin`. It is first validated against
+`--schema` or the schema file it names in `$schema` (if any); `--no-validate`
+skips that for trusted precompiled flows. Prints the value of the `return`
+step reached (if any) and the final variables as JSON.
+"""
+import argparse
+import asyncio
+import copy
+import json
+
+from interpreter.batch import schema_types
+from interpreter.compiler import compile_flow
+from interpreter.context import Context
+from interpreter.runtime import load_flow
+from interpreter.validation import ValidationError, check_flow, flow_schema
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a JSONFlow program.")
+    parser.add_argument("flow", help="Flow file (.json or binary .jfb)")
+    parser.add_argument("--context", default="{}", help="JSON object of input variables")
+    parser.add_argument("--schema", help="Validate the flow against this JSON Schema instead of the one it names in $schema")
+    parser.add_argument("--no-validate", dest="validate", action="store_false",
+                        help="Skip schema validation (trusted precompiled flows)")
+    args = parser.parse_args()
+
+    flow = load_flow(args.flow)
+    schema = args.schema or flow_schema(flow, args.flow)
+    if args.validate and schema:
+        try:
+            check_flow(flow, schema)
+        except ValidationError as e:
+            raise SystemExit(str(e))
+    program = compile_flow(flow)
+    ctx = Context({**copy.deepcopy(flow.get("context", {})), **json.loads(args.context)}, schema_types(flow))
+    result = asyncio.run(program.run(ctx)) if program.is_async else program.run_sync(ctx)
+    print(json.dumps({"result": result, "context": ctx.to_dict()}, indent=2, default=repr))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Batch execution: run one flow over many independent input records.
+
+The flow is compiled once and its `context` defaults are loaded once into a
+shared base Context. Each record runs in a copy-on-write child scope layered
+over that base, so no per-record deep copy of the defaults is needed and
+records cannot see each other's writes. Results are yielded in input order as
+they become available; a failing record yields an error entry instead of
+aborting the batch.
+"""
+import asyncio
+import copy
+import itertools
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from interpreter.compiler import MAP_CONCURRENCY, Program, compile_flow, compile_steps
+from interpreter.context import Context
+from interpreter.pool import PROCESS_WORKERS, get_process_pool
+
+log = logging.getLogger(__name__)
+
+SCHEMA_TYPES = {'string', 'integer', 'number', 'boolean', 'object', 'array', 'null'}
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of one record. `data` holds the record's final variables (the
+    flow's context defaults, its inputs and everything it wrote; containers it
+    modified are private copies); `error` is None on success, otherwise
+    {'message', 'details': {'type'}}.
+    """
+    index: int
+    data: Dict[str, Any]
+    error: Optional[Dict[str, Any]]
+
+def schema_types(flow: Dict[str, Any]) -> Dict[str, str]:
+    """Extracts the plain JSON types declared in a flow's schema.context."""
+    types = {}
+    for name, decl in flow.get('schema', {}).get('context', {}).items():
+        decl_type = decl.get('type') if isinstance(decl, dict) else decl
+        if decl_type in SCHEMA_TYPES:
+            types[name] = decl_type
+    return types
+
+def run_batch(flow: Dict[str, Any], records: Iterable[Dict[str, Any]], workers: Optional[int] = None,
+              chunk_size: int = 256) -> Iterator[BatchResult]:
+    """
+    Runs `flow` once per record and yields a BatchResult per record, in order.
+
+    Args:
+        flow: JSONFlow program with steps and optional context defaults.
+        records: Iterable of input dicts; consumed lazily, `chunk_size` at a time.
+        workers: If set, fan chunks out to the shared process pool, keeping up
+            to `workers` chunks in flight.
+        chunk_size: Number of records handed to a worker (or event loop) at once.
+    """
+    program = compile_flow(flow)
+    base = copy.deepcopy(flow.get('context', {}))
+    schema = schema_types(flow)
+    chunks = _chunks(records, chunk_size)
+
+    if workers:
+        yield from _run_in_pool(program, flow['steps'], base, schema, chunks, workers)
+        return
+
+    base_ctx = Context(base, schema)
+    base_ctx.bind(program.layout)
+    loop = asyncio.new_event_loop() if program.is_async else None
+    try:
+        for start, chunk in chunks:
+            yield from _run_chunk(program, base_ctx, chunk, start, loop)
+    finally:
+        if loop is not None:
+            loop.close()
+
+async def run_batch_async(flow: Dict[str, Any], records: Iterable[Dict[str, Any]],
+                          concurrency: int = MAP_CONCURRENCY) -> AsyncIterator[BatchResult]:
+    """Async variant of `run_batch`: runs up to `concurrency` records at once on the running loop."""
+    program = compile_flow(flow)
+    base_ctx = Context(copy.deepcopy(flow.get('context', {})), schema_types(flow))
+    base_ctx.bind(program.layout)
+    for start, chunk in _chunks(records, concurrency):
+        results = await asyncio.gather(*[
+            _run_record_async(program, base_ctx, record, start + offset)
+            for offset, record in enumerate(chunk)
+        ])
+        for result in results:
+            yield result
+
+def run_batch_chunk(key: str, steps: List[Dict[str, Any]], base: Dict[str, Any], schema: Dict[str, str],
+                    chunk: List[Dict[str, Any]], start: int) -> List[BatchResult]:
+    """Process-pool entry point: runs one chunk of records."""
+    program = compile_steps(steps, key)
+    loop = asyncio.new_event_loop() if program.is_async else None
+    try:
+        base_ctx = Context(base, schema)
+        base_ctx.bind(program.layout)
+        return list(_run_chunk(program, base_ctx, chunk, start, loop))
+    finally:
+        if loop is not None:
+            loop.close()
+
+def _chunks(records: Iterable[Dict[str, Any]], size: int) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    iterator = iter(records)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+def _run_chunk(program: Program, base_ctx: Context, chunk: List[Dict[str, Any]], start: int,
+               loop: Optional[asyncio.AbstractEventLoop]) -> Iterator[BatchResult]:
+    if loop is not None:
+        yield from loop.run_until_complete(asyncio.gather(*[
+            _run_record_async(program, base_ctx, record, start + offset)
+            for offset, record in enumerate(chunk)
+        ]))
+        return
+    for offset, record in enumerate(chunk):
+        scope = base_ctx.child()
+        scope.assign(record)
+        try:
+            program.run_sync(scope)
+        except Exception as e:
+            yield BatchResult(start + offset, scope.to_dict(), _error(e))
+        else:
+            yield BatchResult(start + offset, scope.to_dict(), None)
+
+async def _run_record_async(program: Program, base_ctx: Context, record: Dict[str, Any], index: int) -> BatchResult:
+    scope = base_ctx.child()
+    scope.assign(record)
+    try:
+        await program.run(scope)
+    except Exception as e:
+        return BatchResult(index, scope.to_dict(), _error(e))
+    return BatchResult(index, scope.to_dict(), None)
+
+def _run_in_pool(program: Program, steps: List[Dict[str, Any]], base: Dict[str, Any], schema: Dict[str, str],
+                 chunks: Iterator[Tuple[int, List[Dict[str, Any]]]], workers: int) -> Iterator[BatchResult]:
+    pool = get_process_pool()
+    in_flight = []
+    for start, chunk in chunks:
+        in_flight.append(pool.submit(run_batch_chunk, program.key, steps, base, schema, chunk, start))
+        if len(in_flight) >= min(workers, PROCESS_WORKERS) * 2:
+            yield from in_flight.pop(0).result()
+    for future in in_flight:
+        yield from future.result()
+
+def _error(e: Exception) -> Dict[str, Any]:
+    return {'message': str(e), 'details': {'type': type(e).__name__}}
@@ -0,0 +1,272 @@
+"""
+Compact binary encoding of JSONFlow programs (`.jfb`).
+
+A flow is stored as a string table followed by a graph of tagged nodes, so a
+program that repeats the same keys, names and sub-expressions hundreds of
+times stores each of them once. Files are opened with `mmap` and decoded
+straight out of the mapping, and the header carries the content hash the
+compiler caches programs under, so loading a flow that is already compiled
+decodes nothing at all:
+
+    dump(flow, 'flow.jfb')
+    program = compile_flow(load('flow.jfb'))
+
+Layout (little-endian, 4-byte aligned):
+
+    header   magic 'JFLB', version u16, reserved u16, string count u32,
+             string table offset u32, node section offset u32, root node
+             index u32, flow_hash(flow['steps']) as 32 raw bytes
+    strings  end offset u32 per string (in characters), then all strings
+             as one UTF-8 text
+    nodes    an array of u32 words; a node is an opcode word followed by
+             its operands, and nodes refer to each other by word index:
+               NULL, FALSE, TRUE     -
+               INT                   i32
+               FLOAT                 f64 (two words)
+               STR, BIGINT           string index
+               ARRAY                 count, child node indices[count]
+               OBJECT                count, key string indices[count], child node indices[count]
+
+Identical subtrees are encoded once and referenced by index. Strings are
+always shared. Within `steps`, which the compiler only reads, each distinct
+sub-step or expression is decoded once and shared by every reference to it
+(those holding list or object `value` literals excepted); other fields
+decode to fresh lists and dicts, as with `json.load`.
+"""
+import array
+import hashlib
+import mmap
+import struct
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+from interpreter.compiler import flow_hash
+
+MAGIC = b'JFLB'
+VERSION = 1
+
+NULL, FALSE, TRUE, INT, FLOAT, STR, BIGINT, ARRAY, OBJECT = range(9)
+
+_HEADER = struct.Struct('<4sHHIIII32s')
+_INT32_MIN, _INT32_MAX = -1 << 31, (1 << 31) - 1
+
+class FormatError(ValueError):
+    pass
+
+def encode(flow: Dict[str, Any]) -> bytes:
+    """Encodes a flow (a JSON object with a `steps` list) to the binary format."""
+    strings: Dict[str, int] = {}
+    nodes: Dict[tuple, int] = {}
+    words: List[int] = []
+
+    def string(value: str) -> int:
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    def node(value: Any) -> int:
+        if value is None:
+            encoded = (NULL,)
+        elif value is True:
+            encoded = (TRUE,)
+        elif value is False:
+            encoded = (FALSE,)
+        elif isinstance(value, int):
+            if _INT32_MIN <= value <= _INT32_MAX:
+                encoded = (INT, value & 0xFFFFFFFF)
+            else:
+                encoded = (BIGINT, string(str(value)))
+        elif isinstance(value, float):
+            encoded = (FLOAT,) + struct.unpack('<II', struct.pack('<d', value))
+        elif isinstance(value, str):
+            encoded = (STR, string(value))
+        elif isinstance(value, (list, tuple)):
+            encoded = (ARRAY, len(value), *[node(item) for item in value])
+        elif isinstance(value, dict):
+            keys = [string(key) for key in value]
+            encoded = (OBJECT, len(keys), *keys, *[node(item) for item in value.values()])
+        else:
+            raise TypeError(f"Cannot encode {type(value).__name__} in a JSONFlow program")
+        index = nodes.get(encoded)
+        if index is None:
+            index = nodes[encoded] = len(words)
+            words.extend(encoded)
+        return index
+
+    if not isinstance(flow, dict):
+        raise TypeError("A JSONFlow program must be an object")
+    root = node(flow)
+    ends = []
+    length = 0
+    for value in strings:
+        length += len(value)
+        ends.append(length)
+    text = ''.join(strings).encode('utf-8')
+    text += b'\0' * (-len(text) % 4)
+    strings_offset = _HEADER.size
+    nodes_offset = strings_offset + 4 * len(ends) + len(text)
+    steps_hash = bytes.fromhex(flow_hash(flow.get('steps', [])))
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(ends), strings_offset, nodes_offset, root, steps_hash)
+    return b''.join((header, struct.pack(f'<{len(ends)}I', *ends), text, struct.pack(f'<{len(words)}I', *words)))
+
+def dump(flow: Dict[str, Any], path: str) -> None:
+    with open(path, 'wb') as f:
+        f.write(encode(flow))
+
+def is_binary(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def _words(view: memoryview) -> Any:
+    """Reads little-endian u32 words in place; big-endian hosts get a swapped copy."""
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    words = array.array('I')
+    words.frombytes(view)
+    words.byteswap()
+    return words
+
+class BinaryFlow(Mapping):
+    """
+    A flow loaded from a `.jfb` file. Top-level fields decode on first
+    access, straight from the memory-mapped file; `steps_hash` is read from
+    the header without decoding anything.
+    """
+    def __init__(self, buffer: Any):
+        magic, version, _, count, strings_offset, nodes_offset, root, steps_hash = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise FormatError("Not a binary JSONFlow program")
+        if version != VERSION:
+            raise FormatError(f"Unsupported binary JSONFlow version: {version}")
+        self.steps_hash = steps_hash.hex()
+        self._view = memoryview(buffer)
+        self._ends = _words(self._view[strings_offset:strings_offset + 4 * count])
+        self._text_span = (strings_offset + 4 * count, nodes_offset)
+        self._text: Optional[str] = None
+        self._strings: List[Optional[str]] = [None] * count
+        self._words = _words(self._view[nodes_offset:])
+        self._fields: Dict[str, Any] = {}
+        self._content_hash: Optional[str] = None
+        words = self._words
+        if words[root] != OBJECT:
+            raise FormatError("Binary JSONFlow root must be an object")
+        size = words[root + 1]
+        keys = words[root + 2:root + 2 + size]
+        self._indices = dict(zip(map(self._string, keys), words[root + 2 + size:root + 2 + 2 * size]))
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of the whole encoded flow, for caches keyed on more than its steps."""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self._view).hexdigest()
+        return self._content_hash
+
+    def _string(self, index: int) -> str:
+        value = self._strings[index]
+        if value is None:
+            if self._text is None:
+                start, end = self._text_span
+                self._text = str(self._view[start:end], 'utf-8')
+            start = self._ends[index - 1] if index else 0
+            value = self._strings[index] = sys.intern(self._text[start:self._ends[index]])
+        return value
+
+    def _decode(self, index: int, shared: Optional[Dict[int, Any]] = None) -> Any:
+        """
+        Decodes the node at word `index`. With a `shared` memo, each distinct
+        subtree is decoded once and the same object is returned for every
+        reference to it, except subtrees holding list or object `value`
+        literals, which are always fresh since a flow may mutate the data
+        they evaluate to.
+        """
+        words = self._words
+        strings = self._strings
+        string = self._string
+
+        def decode(index: int) -> Any:
+            tag = words[index]
+            if tag == OBJECT:
+                size = words[index + 1]
+                start = index + 2
+                keys = [strings[key] or string(key) for key in words[start:start + size]]
+                children = words[start + size:start + 2 * size]
+                if shared is None:
+                    return dict(zip(keys, map(decode, children)))
+                if keys == ['value']:
+                    # A literal expression; mutable literals are decoded whole,
+                    # without the memo, at every reference
+                    if words[children[0]] >= ARRAY:
+                        fresh.add(index)
+                        return {'value': self._decode(children[0])}
+                    return {'value': decode(children[0])}
+                value = dict(zip(keys, map(share, children)))
+                if any(child in fresh for child in children):
+                    fresh.add(index)
+                return value
+            if tag == STR:
+                key = words[index + 1]
+                return strings[key] or string(key)
+            if tag == ARRAY:
+                size = words[index + 1]
+                children = words[index + 2:index + 2 + size]
+                if shared is None:
+                    return list(map(decode, children))
+                value = list(map(share, children))
+                if any(child in fresh for child in children):
+                    fresh.add(index)
+                return value
+            if tag == INT:
+                value = words[index + 1]
+                return value - 0x100000000 if value > _INT32_MAX else value
+            if tag == TRUE:
+                return True
+            if tag == FALSE:
+                return False
+            if tag == NULL:
+                return None
+            if tag == FLOAT:
+                return struct.unpack('<d', struct.pack('<II', words[index + 1], words[index + 2]))[0]
+            if tag == BIGINT:
+                return int(string(words[index + 1]))
+            raise FormatError(f"Unknown node opcode {tag} at word {index}")
+
+        def share(index: int) -> Any:
+            try:
+                return shared[index]
+            except KeyError:
+                value = decode(index)
+                if index not in fresh:
+                    shared[index] = value
+                return value
+
+        # Subtrees holding a mutable `value` literal, decoded afresh at every reference
+        fresh = set()
+
+        return decode(index) if shared is None else share(index)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._fields[key]
+        except KeyError:
+            # The compiler only reads steps, so their repeated parts are decoded once and shared
+            value = self._fields[key] = self._decode(self._indices[key], {} if key == 'steps' else None)
+            return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._indices)
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
+
+def load(path: str) -> BinaryFlow:
+    """Memory-maps a `.jfb` file; the mapping stays open for the flow's lifetime."""
+    with open(path, 'rb') as f:
+        return BinaryFlow(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def loads(data: bytes) -> BinaryFlow:
+    return BinaryFlow(data)
@@ -0,0 +1,62 @@
+"""
+Cross-run memoization of pure `call` results.
+
+A call opts in with the `cache: {enabled, ttl}` shape used by the workflow
+schema, e.g. `{"call": {"function": "price", "args": {...}, "cache":
+{"enabled": true, "ttl": 60}}}`. Results are kept in a bounded, process-wide
+LRU keyed by function name and named argument values and expire after `ttl`
+seconds (86400 if omitted, matching the schema default).
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_TTL = 86400
+
+MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int = 4096, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return MISSING
+
+    def put(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+call_cache = TTLCache()
+
+def cache_ttl(call: Dict[str, Any]) -> Optional[float]:
+    """Returns the TTL of a call whose `cache` is enabled, else None."""
+    spec = call.get('cache')
+    if isinstance(spec, dict) and spec.get('enabled'):
+        return spec.get('ttl', DEFAULT_TTL)
+    return None
+
+def call_key(function: str, args: Dict[str, Any]) -> Hashable:
+    """Keys a call by its function and `{name: value}` arguments, in name order."""
+    return function, json.dumps(args, sort_keys=True, separators=(',', ':'), default=repr)
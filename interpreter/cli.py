@@ -1,5 +1,5 @@
 import click
-from main import generate_code
+from cli_main import generate_code
 import logging
 
 log = logging.getLogger(__name__)
@@ -1,5 +1,15 @@
+import os
+import sys
 from typing import List, Dict, Any
-from nl_to_jsonflow import parse_natural_language
+
+# The parsers and backends import their siblings script-style (`from base import ...`).
+# Appended, not prepended, so `main` still resolves to interpreter/main.py.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "parser"), os.path.join(ROOT, "multi_compiler"), os.path.join(ROOT, "multi_compiler", "compiler")):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from main import parse_natural_language
 from javascript import generate_javascript_function
 from rust import generate_rust_function
 from python import generate_python_function
@@ -21,7 +31,7 @@ def generate_code(sentences: List[str], language: str, use_llm: bool = False) ->
     Returns:
         Generated code as a string.
     """
-    flow = parse_natural_language(sentences)
+    flow = parse_natural_language(sentences, use_llm)
     if language == "javascript":
         return generate_javascript_function(flow)
     elif language == "rust":
@@ -0,0 +1,1391 @@
+"""
+Compiles JSONFlow steps into a tree of pre-bound closures.
+
+Every dispatch decision (which step kind, which expression kind, which
+comparison operator) is made once at compile time, so executing a compiled
+program never probes the step or expression dicts. Compiled programs are
+cached by a content hash of the steps, so repeat invocations of the same flow
+skip compilation entirely.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import operator
+import weakref
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from interpreter import profiling, resilience, tracing
+from interpreter.call_cache import MISSING, cache_ttl, call_cache, call_key
+from interpreter.context import UNSET, Context, Layout, infer_type
+from interpreter.functions import loop_semaphore, placeholder, registry
+from interpreter.pool import PROCESS_WORKERS, get_process_pool
+from interpreter.streams import iterate_async
+
+log = logging.getLogger(__name__)
+
+# Messages of `log` steps.
+flow_log = logging.getLogger('jsonflow.flow')
+
+ExprFn = Callable[[Context], Awaitable[Tuple[Any, str]]]
+SyncExprFn = Callable[[Context], Tuple[Any, str]]
+
+COMPARE_OPS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '===': operator.eq,
+    '!==': operator.ne,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Left folds over two or more operands (`add` starts from 0 instead).
+ARITHMETIC_OPS = {
+    'subtract': operator.sub,
+    'multiply': operator.mul,
+    'divide': operator.truediv,
+    'mod': operator.mod,
+}
+
+# Operators of a single operand.
+UNARY_OPS = {
+    'not': (operator.not_, 'boolean'),
+    'neg': (operator.neg, 'number'),
+    'length': (len, 'integer'),
+}
+
+CACHE_SIZE = 256
+
+# Default number of `map` items in flight at once; a map step can override it
+# with its own `concurrency` key.
+MAP_CONCURRENCY = 64
+
+class Program:
+    """
+    A compiled flow: its root block, the slot layout its variables were
+    resolved to, and the content hash it is cached under. `is_async` is False
+    when no step awaits anything, in which case `run_sync` executes the flow
+    without touching the event loop. If `max_concurrent_runs` is set, at most
+    that many `run`s of the program proceed at once on an event loop.
+    """
+    __slots__ = ('key', 'layout', 'block', 'is_async', 'max_concurrent_runs', '_semaphores')
+
+    def __init__(self, key: str, layout: Layout, block: Callable, is_async: bool,
+                 max_concurrent_runs: Optional[int] = None):
+        self.key = key
+        self.layout = layout
+        self.block = block
+        self.is_async = is_async
+        self.max_concurrent_runs = max_concurrent_runs
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    async def run(self, ctx: Context) -> Any:
+        """Runs the program against `ctx`; returns the value of the `return` step reached, if any."""
+        if self.max_concurrent_runs is None:
+            return await self._run(ctx)
+        async with loop_semaphore(self._semaphores, self.max_concurrent_runs):
+            return await self._run(ctx)
+
+    async def _run(self, ctx: Context) -> Any:
+        ctx.bind(self.layout)
+        try:
+            if self.is_async:
+                await self.block(ctx)
+            else:
+                self.block(ctx)
+        except _Return as signal:
+            return signal.value
+        return None
+
+    def run_sync(self, ctx: Context) -> Any:
+        if self.is_async:
+            raise RuntimeError("Program contains async calls; use run() instead")
+        ctx.bind(self.layout)
+        try:
+            self.block(ctx)
+        except _Return as signal:
+            return signal.value
+        return None
+
+class _Return(BaseException):
+    """
+    Unwinds a run from a `return` step to its Program. It derives from
+    BaseException so that `try` steps and step error logging let it through.
+    """
+    def __init__(self, value: Any):
+        self.value = value
+
+_cache: 'OrderedDict[str, Program]' = OrderedDict()
+
+# id(steps) -> (steps, a copy of steps, flow_hash(steps)) for the step lists compiled most recently
+_hashes: 'OrderedDict[int, Tuple[Any, Any, str]]' = OrderedDict()
+
+# Frame labels of the enclosing steps while a profiled program is being
+# compiled; None when compiling normally.
+_profile_frames: Optional[List[str]] = None
+
+# Common-subexpression elimination: within a block, a pure expression is
+# evaluated once per run until a step writes one of the variables it reads.
+# The first occurrence stores its result in a temp slot of the context and
+# later occurrences load it.
+CSE = True
+
+class _CSEScope:
+    """
+    Compile-time table of the expressions already computed in the current
+    block. `used` collects the positions of the steps whose results the step
+    being compiled reuses, which the step scheduler must run first; `temps`
+    lists the temp slots the block's results are stored in, which are unset
+    every time the block is entered.
+    """
+    __slots__ = ('entries', 'step', 'used', 'temps')
+
+    def __init__(self):
+        # canonical expression -> (temp index, top-level names read, step position,
+        # compiled expression, whether it is async)
+        self.entries: Dict[str, Tuple[int, frozenset, int]] = {}
+        self.step = 0
+        self.used = set()
+        self.temps: List[int] = []
+
+    def invalidate(self, writes: Optional[set]) -> None:
+        """Drops entries reading any of `writes`; `None` (unknown effects) drops all."""
+        if writes is None:
+            self.entries.clear()
+        elif writes:
+            self.entries = {key: entry for key, entry in self.entries.items() if not entry[1] & writes}
+
+_cse: Optional[_CSEScope] = None
+
+# Whether the top-level steps of an async program are run by the dependency
+# scheduler, which overlaps independent steps (see `_schedule_block`).
+SCHEDULE = True
+
+def flow_hash(steps: Any) -> str:
+    """Returns a stable content hash for a step list (or any JSON value)."""
+    encoded = json.dumps(steps, sort_keys=True, separators=(',', ':'), default=repr)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def compile_steps(steps: List[Dict[str, Any]], key: Optional[str] = None,
+                  max_concurrent_runs: Optional[int] = None) -> Program:
+    """
+    Compiles a list of steps, reusing a cached program when the same content
+    has been compiled before. `key` may pass a precomputed `flow_hash(steps)`,
+    e.g. when steps are shipped to a worker process alongside their hash.
+    Without one, the hash of a step list seen before is looked up by identity
+    (see `_steps_key`).
+    """
+    key = key or _steps_key(steps)
+    program = cached_program(key, max_concurrent_runs)
+    if program is not None:
+        return program
+    layout = Layout()
+    if profiling.profiler is not None:
+        program = Program(key, layout, *_compile_profiled(steps, layout), max_concurrent_runs)
+    else:
+        program = Program(key, layout, *compile_block(steps, layout, SCHEDULE), max_concurrent_runs)
+    _cache[_cache_key(key, max_concurrent_runs)] = program
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return program
+
+def _steps_key(steps: List[Dict[str, Any]]) -> str:
+    """
+    `flow_hash(steps)`, hashed once per step list object. A list seen before is
+    compared with a copy taken when it was hashed, which is much cheaper than
+    hashing it again and still notices steps edited in place.
+    """
+    entry = _hashes.get(id(steps))
+    if entry is not None and entry[0] is steps and entry[1] == steps:
+        return entry[2]
+    key = flow_hash(steps)
+    # The entry holds the list itself, so its id cannot be reused while cached
+    _hashes[id(steps)] = (steps, copy.deepcopy(steps), key)
+    if len(_hashes) > CACHE_SIZE:
+        _hashes.popitem(last=False)
+    return key
+
+def cached_program(key: str, max_concurrent_runs: Optional[int] = None) -> Optional[Program]:
+    """Returns the cached program compiled from steps with hash `key`, if any."""
+    cache_key = _cache_key(key, max_concurrent_runs)
+    program = _cache.get(cache_key)
+    if program is not None:
+        _cache.move_to_end(cache_key)
+    return program
+
+def _cache_key(key: str, max_concurrent_runs: Optional[int]) -> str:
+    cache_key = 'profiled:' + key if profiling.profiler is not None else key
+    if max_concurrent_runs is not None:
+        cache_key += f':runs={max_concurrent_runs}'
+    return cache_key
+
+def compile_flow(flow: Dict[str, Any]) -> Program:
+    """
+    Compiles the steps of a full JSONFlow program, honoring its `execution_policy`.
+    Binary flows (see interpreter.binary) carry their steps' hash, so a cached
+    program is found without decoding or hashing the steps.
+    """
+    runs = flow.get('execution_policy', {}).get('max_concurrent_runs')
+    key = getattr(flow, 'steps_hash', None)
+    if key is not None:
+        program = cached_program(key, runs)
+        if program is not None:
+            return program
+    return compile_steps(flow['steps'], key, runs)
+
+def clear_cache() -> None:
+    _cache.clear()
+    _hashes.clear()
+
+def _compile_profiled(steps: List[Dict[str, Any]], layout: Layout) -> Tuple[Callable, bool]:
+    """Compiles a block with every step and expression wrapped by the profiler."""
+    global _profile_frames
+    _profile_frames = []
+    try:
+        return compile_block(steps, layout, SCHEDULE)
+    finally:
+        _profile_frames = None
+
+# Expressions
+
+def compile_expr(expr: Any, layout: Layout) -> ExprFn:
+    """
+    Compiles an expression into a coroutine function returning (value, type).
+    Variables resolve to slots of `layout`, so the function must be called
+    with a Context bound to it. Unsupported expressions compile to a function
+    that raises when evaluated, matching the tree-walking evaluator.
+    """
+    return _as_async(*_compile(expr, layout))
+
+def compile_sync_expr(expr: Any, layout: Layout) -> SyncExprFn:
+    """
+    Compiles an expression that contains no async call into a plain function
+    returning (value, type).
+    """
+    fn, is_async = _compile(expr, layout)
+    if is_async:
+        raise ValueError(f"Expression contains an async call: {expr}")
+    return fn
+
+def _as_async(fn: Callable, is_async: bool) -> Callable:
+    """Lifts a sync expression or step function into a coroutine function."""
+    if is_async:
+        return fn
+
+    async def lifted(ctx: Context) -> Any:
+        return fn(ctx)
+    return lifted
+
+def _compile(expr: Any, layout: Layout) -> Tuple[Callable, bool]:
+    """
+    Compiles an expression and reports whether it must be awaited. Only
+    subtrees containing a `call` with `async: true` are compiled to coroutine
+    functions; everything else evaluates synchronously.
+    """
+    if _cse is not None and isinstance(expr, dict):
+        compiled = _compile_cse(expr, layout, _cse)
+        if compiled is not None:
+            return compiled
+    return _compile_fresh(expr, layout)
+
+def _compile_fresh(expr: Any, layout: Layout) -> Tuple[Callable, bool]:
+    fn, is_async = _compile_node(expr, layout)
+    if _profile_frames is not None:
+        kind = next(iter(expr), 'unsupported') if isinstance(expr, dict) else 'literal'
+        fn = profiling.instrument_expr(fn, is_async, kind)
+    return fn, is_async
+
+def _compile_cse(expr: Dict[str, Any], layout: Layout, scope: _CSEScope) -> Optional[Tuple[Callable, bool]]:
+    """
+    Compiles a pure expression through the block's CSE table; returns None
+    for expressions that are impure or too cheap to be worth a temp slot.
+    """
+    if 'get' in expr:
+        if not isinstance(expr['get'], list):
+            return None
+    elif 'value' in expr:
+        return None
+    reads = _pure_reads(expr)
+    if reads is None:
+        return None
+    key = json.dumps(expr, sort_keys=True, separators=(',', ':'), default=repr)
+    entry = scope.entries.get(key)
+    if entry is not None:
+        index, _, step, fn, is_async = entry
+        scope.used.add(step)
+
+        # An in-place array append unsets every temp (see Context._append)
+        if is_async:
+            async def load_temp_async(ctx: Context) -> Tuple[Any, str]:
+                result = ctx.temps[index]
+                if result is UNSET:
+                    result = ctx.temps[index] = await fn(ctx)
+                return result
+            return load_temp_async, True
+
+        def load_temp(ctx: Context) -> Tuple[Any, str]:
+            result = ctx.temps[index]
+            if result is UNSET:
+                result = ctx.temps[index] = fn(ctx)
+            return result
+        return load_temp, False
+
+    fn, is_async = _compile_fresh(expr, layout)
+    index = layout.temp()
+    scope.temps.append(index)
+    scope.entries[key] = (index, reads, scope.step, fn, is_async)
+
+    if is_async:
+        async def store_temp_async(ctx: Context) -> Tuple[Any, str]:
+            result = ctx.temps[index] = await fn(ctx)
+            return result
+        return store_temp_async, True
+
+    def store_temp(ctx: Context) -> Tuple[Any, str]:
+        result = ctx.temps[index] = fn(ctx)
+        return result
+    return store_temp, False
+
+def _pure_reads(expr: Any) -> Optional[frozenset]:
+    """
+    Returns the top-level names a pure expression reads, or None if it may
+    have side effects or differ between evaluations (calls without an
+    enabled `cache`, unsupported nodes).
+    """
+    if not isinstance(expr, dict):
+        return frozenset() if expr is None or isinstance(expr, (str, int, float, bool)) else None
+    if 'get' in expr:
+        path = expr['get']
+        return frozenset(path[:1] if isinstance(path, list) else [path])
+    if 'value' in expr:
+        return frozenset()
+    if 'expr' in expr:
+        return _pure_reads(expr['expr'])
+    if 'call' in expr:
+        if cache_ttl(expr['call']) is None:
+            return None
+        operands = list(expr['call'].get('args', {}).values())
+    elif 'add' in expr:
+        operands = expr['add']
+    elif any(op in expr for op in ARITHMETIC_OPS) or 'and' in expr or 'or' in expr:
+        operands = next(expr[op] for op in (*ARITHMETIC_OPS, 'and', 'or') if op in expr)
+    elif any(op in expr for op in UNARY_OPS):
+        operands = [next(expr[op] for op in UNARY_OPS if op in expr)]
+    elif 'in' in expr:
+        operands = [expr['in'].get('item'), expr['in'].get('array')]
+    elif 'compare' in expr:
+        if expr['compare'].get('op') not in COMPARE_OPS:
+            return None
+        operands = [expr['compare'].get('left'), expr['compare'].get('right')]
+    else:
+        return None
+    names = frozenset()
+    for operand in operands:
+        reads = _pure_reads(operand)
+        if reads is None:
+            return None
+        names |= reads
+    return names
+
+def _compile_node(expr: Any, layout: Layout) -> Tuple[Callable, bool]:
+    if isinstance(expr, dict):
+        if 'get' in expr:
+            return _compile_get(expr['get'], layout), False
+        if 'value' in expr:
+            return _compile_literal(expr['value']), False
+        if 'call' in expr:
+            return _compile_call(expr['call'], layout)
+        if 'expr' in expr:
+            return _compile(expr['expr'], layout)
+        if 'add' in expr:
+            return _compile_add(expr['add'], layout)
+        for op, op_fn in ARITHMETIC_OPS.items():
+            if op in expr:
+                return _compile_arithmetic(op_fn, expr[op], layout)
+        if 'and' in expr or 'or' in expr:
+            return _compile_logical('and' in expr, expr['and' if 'and' in expr else 'or'], layout)
+        for op, (op_fn, value_type) in UNARY_OPS.items():
+            if op in expr:
+                return _compile_unary(op_fn, value_type, expr[op], layout)
+        if 'in' in expr:
+            return _compile_in(expr['in'], layout)
+        if 'compare' in expr:
+            return _compile_compare(expr['compare'], layout)
+    elif expr is None or isinstance(expr, (str, int, float, bool)):
+        return _compile_literal(expr), False
+    return _compile_error(Exception(f"Unsupported expression: {expr}")), False
+
+def _compile_error(error: Exception) -> SyncExprFn:
+    def raise_error(ctx: Context) -> Tuple[Any, str]:
+        raise error
+    return raise_error
+
+def _compile_literal(value: Any) -> SyncExprFn:
+    value_type = infer_type(value)
+
+    def literal(ctx: Context) -> Tuple[Any, str]:
+        return value, value_type
+    return literal
+
+def _compile_load(path: Any, layout: Layout) -> Callable[[Context], Any]:
+    """
+    Compiles a variable read. The top-level name resolves to a slot; only the
+    remaining keys of a list path are looked up dynamically.
+    """
+    if isinstance(path, list):
+        name, keys = path[0], list(path[1:])
+    else:
+        name, keys = path, []
+    index = layout.slot(name)
+
+    def load(ctx: Context) -> Any:
+        value = ctx.slots[index]
+        if value is UNSET:
+            raise KeyError(name)
+        return value
+
+    if not keys:
+        return load
+
+    def load_path(ctx: Context) -> Any:
+        value = load(ctx)
+        for key in keys:
+            value = value[key]
+        return value
+    return load_path
+
+def _compile_get(path: Any, layout: Layout) -> SyncExprFn:
+    if isinstance(path, list):
+        load_path = _compile_load(path, layout)
+
+        def get_path(ctx: Context) -> Tuple[Any, str]:
+            value = load_path(ctx)
+            return value, infer_type(value)
+        return get_path
+
+    index = layout.slot(path)
+
+    def get(ctx: Context) -> Tuple[Any, str]:
+        value = ctx.slots[index]
+        if value is UNSET:
+            raise KeyError(path)
+        return value, ctx.schema_context.get(path) or infer_type(value)
+    return get
+
+def _compile_store(path: Any, layout: Layout) -> Callable[[Context, Any, str], None]:
+    """Compiles a variable write; plain names go straight to their slot."""
+    if isinstance(path, list):
+        path = list(path)
+        layout.slot(path[0])
+
+        def store_path(ctx: Context, value: Any, value_type: str) -> None:
+            ctx.set(path, value, value_type)
+        return store_path
+
+    index = layout.slot(path)
+
+    def store(ctx: Context, value: Any, value_type: str) -> None:
+        ctx.set_slot(index, path, value, value_type)
+    return store
+
+def _compile_operands(exprs: List[Any], layout: Layout) -> Tuple[List[Callable], bool]:
+    """Compiles a list of operands; if any is async, all are lifted to async."""
+    compiled = [_compile(expr, layout) for expr in exprs]
+    if any(is_async for _, is_async in compiled):
+        return [_as_async(fn, is_async) for fn, is_async in compiled], True
+    return [fn for fn, _ in compiled], False
+
+def _compile_call(call: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    name = call['function']
+    arg_names = list(call.get('args', {}))
+    arg_fns, args_async = _compile_concurrent_operands(list(call.get('args', {}).values()), layout)
+    return_type = call.get('return_type')
+    ttl = cache_ttl(call)
+
+    def result(value: Any) -> Tuple[Any, str]:
+        return value, return_type or infer_type(value)
+
+    if call.get('async', False):
+        async def invoke_async(args: List[Tuple[Any, str]]) -> Tuple[Any, str]:
+            kwargs = {arg_name: arg[0] for arg_name, arg in zip(arg_names, args)}
+            function = registry.lookup(name)
+            if function is None:
+                return placeholder(name, kwargs), return_type or 'string'
+            return result(await function.call_async(kwargs))
+
+        async def async_call(ctx: Context) -> Tuple[Any, str]:
+            if args_async:
+                # Independent arguments are awaited concurrently
+                args = await asyncio.gather(*[arg_fn(ctx) for arg_fn in arg_fns])
+            else:
+                args = [arg_fn(ctx) for arg_fn in arg_fns]
+            if ttl is None:
+                return await invoke_async(args)
+            key = call_key(name, {arg_name: arg[0] for arg_name, arg in zip(arg_names, args)})
+            cached = call_cache.get(key)
+            if cached is MISSING:
+                cached = await invoke_async(args)
+                call_cache.put(key, cached, ttl)
+            return cached
+        return async_call, True
+
+    def invoke(args: List[Tuple[Any, str]]) -> Tuple[Any, str]:
+        kwargs = {arg_name: arg[0] for arg_name, arg in zip(arg_names, args)}
+        function = registry.lookup(name)
+        if function is None:
+            return placeholder(name, kwargs), 'string'
+        return result(function.call(kwargs))
+
+    if ttl is not None:
+        uncached = invoke
+
+        def invoke(args: List[Tuple[Any, str]]) -> Tuple[Any, str]:
+            key = call_key(name, {arg_name: arg[0] for arg_name, arg in zip(arg_names, args)})
+            cached = call_cache.get(key)
+            if cached is MISSING:
+                cached = uncached(args)
+                call_cache.put(key, cached, ttl)
+            return cached
+
+    if args_async:
+        async def sync_call_async_args(ctx: Context) -> Tuple[Any, str]:
+            return invoke(await asyncio.gather(*[arg_fn(ctx) for arg_fn in arg_fns]))
+        return sync_call_async_args, True
+
+    def sync_call(ctx: Context) -> Tuple[Any, str]:
+        return invoke([arg_fn(ctx) for arg_fn in arg_fns])
+    return sync_call, False
+
+def _compile_concurrent_operands(exprs: List[Any], layout: Layout) -> Tuple[List[Callable], bool]:
+    """
+    Like `_compile_operands`, for operands that may be awaited concurrently:
+    each may reuse results computed before it but not its siblings', which
+    may still be in flight.
+    """
+    scope = _cse
+    if scope is None:
+        return _compile_operands(exprs, layout)
+    before = scope.entries
+    after = dict(before)
+    compiled = []
+    try:
+        for expr in exprs:
+            scope.entries = dict(before)
+            compiled.append(_compile(expr, layout))
+            after.update(scope.entries)
+    finally:
+        # All operands have completed once the expression using them runs on
+        scope.entries = after
+    if any(is_async for _, is_async in compiled):
+        return [_as_async(fn, is_async) for fn, is_async in compiled], True
+    return [fn for fn, _ in compiled], False
+
+def _compile_add(operands: List[Any], layout: Layout) -> Tuple[Callable, bool]:
+    operand_fns, is_async = _compile_operands(operands, layout)
+
+    if is_async:
+        async def add_async(ctx: Context) -> Tuple[Any, str]:
+            total = 0
+            for operand_fn in operand_fns:
+                total += (await operand_fn(ctx))[0]
+            return total, 'number'
+        return add_async, True
+
+    def add(ctx: Context) -> Tuple[Any, str]:
+        total = 0
+        for operand_fn in operand_fns:
+            total += operand_fn(ctx)[0]
+        return total, 'number'
+    return add, False
+
+def _compile_arithmetic(op_fn: Callable[[Any, Any], Any], operands: List[Any], layout: Layout) -> Tuple[Callable, bool]:
+    (first_fn, *rest_fns), is_async = _compile_operands(operands, layout)
+
+    if is_async:
+        async def arithmetic_async(ctx: Context) -> Tuple[Any, str]:
+            value = (await first_fn(ctx))[0]
+            for operand_fn in rest_fns:
+                value = op_fn(value, (await operand_fn(ctx))[0])
+            return value, infer_type(value)
+        return arithmetic_async, True
+
+    def arithmetic(ctx: Context) -> Tuple[Any, str]:
+        value = first_fn(ctx)[0]
+        for operand_fn in rest_fns:
+            value = op_fn(value, operand_fn(ctx)[0])
+        return value, infer_type(value)
+    return arithmetic, False
+
+def _compile_logical(is_and: bool, operands: List[Any], layout: Layout) -> Tuple[Callable, bool]:
+    """`and`/`or` evaluate operands left to right only until the result is known."""
+    scope = _cse
+    if scope is None or len(operands) < 2:
+        operand_fns, is_async = _compile_operands(operands, layout)
+    else:
+        first = _compile(operands[0], layout)
+        # Later operands may be skipped, so nothing they compute can be reused
+        after_first = dict(scope.entries)
+        try:
+            compiled = [first] + [_compile(expr, layout) for expr in operands[1:]]
+        finally:
+            scope.entries = after_first
+        is_async = any(fn_async for _, fn_async in compiled)
+        operand_fns = [_as_async(fn, fn_async) if is_async else fn for fn, fn_async in compiled]
+
+    if is_async:
+        async def logical_async(ctx: Context) -> Tuple[Any, str]:
+            for operand_fn in operand_fns:
+                if bool((await operand_fn(ctx))[0]) is not is_and:
+                    return not is_and, 'boolean'
+            return is_and, 'boolean'
+        return logical_async, True
+
+    def logical(ctx: Context) -> Tuple[Any, str]:
+        for operand_fn in operand_fns:
+            if bool(operand_fn(ctx)[0]) is not is_and:
+                return not is_and, 'boolean'
+        return is_and, 'boolean'
+    return logical, False
+
+def _compile_unary(op_fn: Callable[[Any], Any], value_type: str, operand: Any, layout: Layout) -> Tuple[Callable, bool]:
+    operand_fn, is_async = _compile(operand, layout)
+
+    if is_async:
+        async def unary_async(ctx: Context) -> Tuple[Any, str]:
+            return op_fn((await operand_fn(ctx))[0]), value_type
+        return unary_async, True
+
+    def unary(ctx: Context) -> Tuple[Any, str]:
+        return op_fn(operand_fn(ctx)[0]), value_type
+    return unary, False
+
+def _compile_in(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    (item_fn, array_fn), is_async = _compile_operands([spec['item'], spec['array']], layout)
+
+    if is_async:
+        async def contains_async(ctx: Context) -> Tuple[Any, str]:
+            item = (await item_fn(ctx))[0]
+            return item in (await array_fn(ctx))[0], 'boolean'
+        return contains_async, True
+
+    def contains(ctx: Context) -> Tuple[Any, str]:
+        return item_fn(ctx)[0] in array_fn(ctx)[0], 'boolean'
+    return contains, False
+
+def _compile_compare(compare: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    op = compare['op']
+    if op not in COMPARE_OPS:
+        return _compile_error(KeyError(op)), False
+    op_fn = COMPARE_OPS[op]
+    (left_fn, right_fn), is_async = _compile_operands([compare['left'], compare['right']], layout)
+
+    if is_async:
+        async def compare_async(ctx: Context) -> Tuple[Any, str]:
+            left, _ = await left_fn(ctx)
+            right, _ = await right_fn(ctx)
+            return op_fn(left, right), 'boolean'
+        return compare_async, True
+
+    def compare_expr(ctx: Context) -> Tuple[Any, str]:
+        return op_fn(left_fn(ctx)[0], right_fn(ctx)[0]), 'boolean'
+    return compare_expr, False
+
+# Steps
+
+def compile_block(steps: List[Dict[str, Any]], layout: Layout, concurrent: bool = False) -> Tuple[Callable, bool]:
+    """
+    Compiles a list of steps into a single function and reports whether it
+    must be awaited. A block is synchronous when all of its steps are. With
+    `concurrent`, an async block runs independent steps concurrently (see
+    `_schedule_block`).
+    """
+    global _cse
+    outer = _cse
+    scope = _CSEScope() if CSE else None
+    compiled = []
+    reused = []
+    try:
+        for index, step in enumerate(steps):
+            # Steps tagged non-deterministic neither reuse nor provide results;
+            # steps with a timeout run in a scope of their own, so their temps
+            # would not outlive them, and steps with an `on_error` handler may
+            # fail before storing them
+            _cse = scope if step.get('deterministic', True) and 'timeout' not in step and 'on_error' not in step else None
+            if scope is not None:
+                scope.step, scope.used = index, set()
+            if _profile_frames is None:
+                step_compiled = compile_step(step, index, layout, steps)
+            else:
+                step_compiled = _compile_profiled_step(step, index, layout, steps)
+            if step_compiled is not None:
+                compiled.append(step_compiled + (index,))
+                reused.append(scope.used if scope is not None else set())
+            if scope is not None:
+                scope.invalidate(step_writes(step))
+    finally:
+        _cse = outer
+    # Results from an earlier run of the block (e.g. the previous loop
+    # iteration) are stale
+    temps = scope.temps if scope is not None else []
+
+    if concurrent and len(compiled) > 1 and any(is_async for _, is_async, _ in compiled):
+        return _schedule_block(steps, compiled, reused, temps), True
+
+    if any(is_async for _, is_async, _ in compiled):
+        async def block_async(ctx: Context) -> None:
+            for index in temps:
+                ctx.temps[index] = UNSET
+            for step_fn, is_async, index in compiled:
+                try:
+                    if is_async:
+                        await step_fn(ctx)
+                    else:
+                        step_fn(ctx)
+                except Exception as e:
+                    _step_failed(index, e)
+                    raise
+        return block_async, True
+
+    step_fns = [(step_fn, index) for step_fn, _, index in compiled]
+
+    def block(ctx: Context) -> None:
+        for index in temps:
+            ctx.temps[index] = UNSET
+        for step_fn, index in step_fns:
+            try:
+                step_fn(ctx)
+            except Exception as e:
+                _step_failed(index, e)
+                raise
+    return block, False
+
+def _schedule_block(steps: List[Dict[str, Any]], compiled: List[Tuple[Callable, bool, int]],
+                    reused: List[set], temps: List[int]) -> Callable:
+    """
+    Builds a block that runs each step as soon as the earlier steps it
+    depends on have finished. A step depends on an earlier one if either
+    writes a top-level name the other references, if it reuses a result the
+    earlier one computed, or if either writes in a way that cannot be tracked
+    (calls are not treated as writes here). Only plain `let` and `set` steps
+    are reordered, so independent calls filling different targets overlap on
+    the event loop; every other step (`try`, `assert`, `log`, `return`,
+    branches, loops, steps with an `on_error` handler) may raise or be
+    observed from outside, so it is a barrier. If a step fails, steps not yet
+    finished are cancelled and the error of the failing step is raised.
+    """
+    effects = []
+    for _, _, index in compiled:
+        step = steps[index]
+        writes = step_writes(step, calls=False) if _reorderable(step) else None
+        effects.append((writes, _referenced_names(step)))
+    positions = {index: position for position, (_, _, index) in enumerate(compiled)}
+
+    plan = []
+    for position, (step_fn, is_async, index) in enumerate(compiled):
+        writes, names = effects[position]
+        after = {positions[i] for i in reused[position] if i in positions}
+        for earlier in range(position):
+            earlier_writes, earlier_names = effects[earlier]
+            if writes is None or earlier_writes is None or writes & earlier_names or earlier_writes & names:
+                after.add(earlier)
+        plan.append((step_fn, is_async, index, sorted(after)))
+
+    async def run_step(step_fn: Callable, is_async: bool, index: int, after: List[asyncio.Future],
+                       ctx: Context) -> None:
+        if after:
+            await asyncio.gather(*after)
+        try:
+            if is_async:
+                await step_fn(ctx)
+            else:
+                step_fn(ctx)
+        except Exception as e:
+            _step_failed(index, e)
+            raise
+
+    async def scheduled_block(ctx: Context) -> None:
+        for index in temps:
+            ctx.temps[index] = UNSET
+        tasks = []
+        for step_fn, is_async, index, after in plan:
+            tasks.append(asyncio.ensure_future(run_step(step_fn, is_async, index, [tasks[i] for i in after], ctx)))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+        # Steps that depend on a failed step re-raise its error, so the first
+        # error in step order is the original one
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError):
+                raise result
+    return scheduled_block
+
+def _reorderable(step: Dict[str, Any]) -> bool:
+    return ('let' in step or 'set' in step) and 'on_error' not in step
+
+def _compile_profiled_step(step: Dict[str, Any], index: int, layout: Layout,
+                           block: List[Dict[str, Any]]) -> Optional[Tuple[Callable, bool]]:
+    _profile_frames.append(profiling.step_label(step, index))
+    try:
+        step_compiled = compile_step(step, index, layout, block)
+        frames = tuple(_profile_frames)
+    finally:
+        _profile_frames.pop()
+    if step_compiled is None:
+        return None
+    fn, is_async = step_compiled
+    return profiling.instrument_step(fn, is_async, frames), is_async
+
+def _step_failed(position: int, error: Exception) -> None:
+    log.error("Step failed: %s", error)
+    if tracing.tracer is not None:
+        tracing.tracer.record(logging.ERROR, 'step_failed', position, str(error))
+
+def compile_step(step: Dict[str, Any], index: int, layout: Layout,
+                 block: Optional[List[Dict[str, Any]]] = None) -> Optional[Tuple[Callable, bool]]:
+    """
+    Compiles one step into (function, is_async). `index` is the step's
+    position in its enclosing `block`, where an `on_error.step_id` handler is
+    looked up. Returns None for step kinds the runtime does not execute.
+    """
+    compiled = _compile_step_kind(step, index, layout)
+    if compiled is None:
+        return None
+    timeout = step.get('timeout')
+    # A synchronous step never waits on anything, so it cannot time out
+    if isinstance(timeout, dict) and 'duration' in timeout and compiled[1]:
+        compiled = resilience.with_timeout(compiled[0], timeout, index), True
+    on_error = step.get('on_error')
+    if isinstance(on_error, dict):
+        compiled = _compile_on_error(compiled, on_error, index, layout, block or [])
+    return compiled
+
+def _compile_on_error(compiled: Tuple[Callable, bool], spec: Dict[str, Any], index: int, layout: Layout,
+                      block: List[Dict[str, Any]]) -> Tuple[Callable, bool]:
+    """
+    Guards a step with its `on_error` handler: the `body` steps, or the step
+    of the enclosing block whose id is `step_id` (run without its own
+    `on_error`, so handlers cannot cycle).
+    """
+    if 'body' in spec:
+        handler_steps = spec['body']
+    else:
+        target = next((step for step in block if step.get('id') == spec.get('step_id')), None)
+        if target is None:
+            raise KeyError(f"on_error step not found: {spec.get('step_id')}")
+        handler_steps = [{key: value for key, value in target.items() if key != 'on_error'}]
+    return _compile_guarded(*compiled, *compile_block(handler_steps, layout), index, layout)
+
+def _compile_step_kind(step: Dict[str, Any], index: int, layout: Layout) -> Optional[Tuple[Callable, bool]]:
+    if 'let' in step:
+        return _compile_let(step['let'], layout)
+    if 'set' in step:
+        return _compile_set(step['set'], layout)
+    if 'map' in step:
+        return _compile_map(step['map'], layout)
+    if 'forEach' in step:
+        return _compile_for_each(step['forEach'], layout)
+    if 'try' in step:
+        return _compile_try(step['try'], index, layout)
+    if 'if' in step:
+        return _compile_if(step['if'], layout)
+    if 'while' in step:
+        return _compile_while(step['while'], layout)
+    if 'parallel' in step:
+        return _compile_parallel(step['parallel'], layout)
+    if 'assert' in step:
+        return _compile_assert(step['assert'], layout)
+    if 'log' in step:
+        return _compile_log(step['log'], layout)
+    if 'return' in step:
+        return _compile_return(step['return'], layout)
+    # Other steps (event, ai_*, etc.) are not executed yet
+    return None
+
+def _compile_let(bindings: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    stores = [_compile_store(name, layout) for name in bindings]
+    compiled_exprs = []
+    for name, expr in bindings.items():
+        compiled_exprs.append(_compile(expr, layout))
+        if _cse is not None:
+            # Later bindings are evaluated after this one is stored
+            _cse.invalidate({name})
+    if any(is_async for _, is_async in compiled_exprs):
+        expr_fns, is_async = [_as_async(fn, fn_async) for fn, fn_async in compiled_exprs], True
+    else:
+        expr_fns, is_async = [fn for fn, _ in compiled_exprs], False
+    compiled = list(zip(stores, expr_fns))
+
+    if is_async:
+        async def let_async(ctx: Context) -> None:
+            for store, expr_fn in compiled:
+                store(ctx, *await expr_fn(ctx))
+        return let_async, True
+
+    def let(ctx: Context) -> None:
+        for store, expr_fn in compiled:
+            store(ctx, *expr_fn(ctx))
+    return let, False
+
+def _compile_set(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    store = _compile_store(spec['target'], layout)
+    value_fn, is_async = _compile(spec['value'], layout)
+
+    if is_async:
+        async def set_async(ctx: Context) -> None:
+            store(ctx, *await value_fn(ctx))
+        return set_async, True
+
+    def set_step(ctx: Context) -> None:
+        store(ctx, *value_fn(ctx))
+    return set_step, False
+
+def _compile_map(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    """
+    Compiles a `map` step. The source may be any iterable, or (with
+    `"async": true`) an async iterable. Each item runs in its own
+    copy-on-write scope, and the items' writes merge back in item order,
+    whether the body is sync, async or run in the process pool. Sync items
+    run one after another, each merged before the next starts; async and
+    process-pool items run concurrently over the variables as they were
+    before the map. With `"stream": true` the target is
+    set to a lazy iterator instead of a list: items are mapped as a consumer
+    (e.g. a later forEach) pulls them, so neither the source nor the results
+    are ever held in memory at once, and the body runs when pulled, merging
+    each item's writes in order as it goes.
+    """
+    load_source = _compile_load(spec['source'], layout)
+    alias = spec['as']
+    store_alias = _compile_store(alias, layout)
+    load_alias = _compile_load(alias, layout)
+    store_target = _compile_store(spec['target'], layout)
+    concurrency = spec.get('concurrency') or MAP_CONCURRENCY
+    stream = spec.get('stream', False)
+    if spec.get('executor') == 'process':
+        return _compile_process_map(spec, load_source, alias, store_target), True
+    body, is_async = compile_block(spec['body'], layout)
+
+    if is_async or spec.get('async', False):
+        body = _as_async(body, is_async)
+
+        def map_items(ctx: Context) -> AsyncIterator[Context]:
+            async def map_item(item):
+                scope = ctx.child()
+                store_alias(scope, item, infer_type(item))
+                await body(scope)
+                return scope
+            # Items run concurrently in isolated scopes and come back in order
+            return ordered_window(map_item, load_source(ctx), concurrency)
+
+        if stream:
+            async def map_stream(ctx: Context) -> AsyncIterator[Any]:
+                async for scope in map_items(ctx):
+                    ctx.merge(scope.writes)
+                    yield load_alias(scope)
+
+            async def map_stream_step(ctx: Context) -> None:
+                store_target(ctx, map_stream(ctx), 'array')
+            return map_stream_step, True
+
+        async def map_async(ctx: Context) -> None:
+            scopes = [scope async for scope in map_items(ctx)]
+            result = []
+            for scope in scopes:
+                result.append(load_alias(scope))
+                ctx.merge(scope.writes)
+            store_target(ctx, result, 'array')
+        return map_async, True
+
+    def map_item(ctx: Context, item: Any) -> Context:
+        scope = ctx.child()
+        store_alias(scope, item, infer_type(item))
+        body(scope)
+        return scope
+
+    if stream:
+        def map_stream(ctx: Context) -> Iterator[Any]:
+            for item in load_source(ctx):
+                scope = map_item(ctx, item)
+                ctx.merge(scope.writes)
+                yield load_alias(scope)
+
+        def map_stream_step(ctx: Context) -> None:
+            store_target(ctx, map_stream(ctx), 'array')
+        return map_stream_step, False
+
+    def map_step(ctx: Context) -> None:
+        result = []
+        for item in load_source(ctx):
+            # One item scope at a time, merged as soon as the item finishes
+            scope = map_item(ctx, item)
+            result.append(load_alias(scope))
+            ctx.merge(scope.writes)
+        store_target(ctx, result, 'array')
+    return map_step, False
+
+def _compile_process_map(spec: Dict[str, Any], load_source: Callable, alias: str, store_target: Callable) -> Callable:
+    """
+    Compiles a map step that runs its body in the shared process pool. The
+    source is split into chunks; each worker compiles the body once (via the
+    content-hash cache) and runs its chunk against a snapshot of the variables
+    the body can touch. Results and writes come back and merge in item order.
+    """
+    body_steps = spec['body']
+    key = flow_hash(body_steps)
+    names = sorted(_referenced_names(body_steps) - {alias})
+    chunk_size = spec.get('chunk_size')
+
+    async def map_process(ctx: Context) -> None:
+        items = list(load_source(ctx))
+        snapshot = {}
+        for name in names:
+            try:
+                snapshot[name] = ctx.get(name)
+            except KeyError:
+                pass
+        size = chunk_size or max(1, -(-len(items) // (PROCESS_WORKERS * 4)))
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        chunks = await asyncio.gather(*[
+            loop.run_in_executor(pool, run_map_chunk, key, body_steps, alias, snapshot,
+                                 ctx.schema_context, items[i:i + size])
+            for i in range(0, len(items), size)
+        ])
+        result = []
+        for chunk in chunks:
+            for value, writes in chunk:
+                result.append(value)
+                ctx.merge(writes)
+        store_target(ctx, result, 'array')
+    return map_process
+
+def run_map_chunk(key: str, steps: List[Dict[str, Any]], alias: str, snapshot: Dict[str, Any],
+                  schema_context: Dict[str, str], items: List[Any]) -> List[Tuple[Any, list]]:
+    """Process-pool entry point: runs a map body over one chunk of items."""
+    program = compile_steps(steps, key)
+    base = Context(snapshot, schema_context)
+    base.bind(program.layout)
+    outputs = []
+    for item in items:
+        scope = base.child()
+        scope.set(alias, item, infer_type(item))
+        if program.is_async:
+            asyncio.run(program.run(scope))
+        else:
+            program.run_sync(scope)
+        outputs.append((scope.get(alias), scope.writes))
+    return outputs
+
+def step_writes(step: Any, calls: bool = True) -> Optional[set]:
+    """
+    Over-approximates the top-level names a step (including nested steps) may
+    write. Returns None if the step makes a call with unknown side effects
+    (unless `calls` is False) or writes into a nested path, which may mutate
+    a value shared by other names.
+    """
+    names = set()
+    stack = [step]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        for key, value in node.items():
+            if calls and key == 'call' and isinstance(value, dict) and cache_ttl(value) is None:
+                return None
+            if key == 'target' or key == 'as':
+                if not isinstance(value, str):
+                    return None
+                names.add(value)
+            elif key == 'let' and isinstance(value, dict):
+                names.update(value)
+            elif key == 'try':
+                names.add('error')
+            elif key == 'on_error':
+                if isinstance(value, dict) and 'step_id' in value:
+                    # The handler is another step, whose writes are not in this tree
+                    return None
+                names.add('error')
+            stack.append(value)
+    return names
+
+def _referenced_names(node: Any) -> set:
+    """Collects the top-level variable names a step tree reads or writes."""
+    names = set()
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ('get', 'source', 'target'):
+                head = value[0] if isinstance(value, list) and value else value
+                if isinstance(head, str):
+                    names.add(head)
+            elif key == 'let' and isinstance(value, dict):
+                names.update(value)
+            names |= _referenced_names(value)
+    elif isinstance(node, list):
+        for value in node:
+            names |= _referenced_names(value)
+    return names
+
+async def ordered_window(fn: Callable[[Any], Awaitable[Any]], items: Any, limit: int) -> AsyncIterator[Any]:
+    """
+    Yields `await fn(item)` for each item of a sync or async iterable, in
+    order, with at most `limit` in flight. Items are pulled from the source
+    only as results are consumed, so a slow consumer holds back the source.
+    Pending work is cancelled if the consumer stops early or an item fails.
+    """
+    window = deque()
+    try:
+        async for item in iterate_async(items):
+            window.append(asyncio.ensure_future(fn(item)))
+            if len(window) >= limit:
+                yield await window.popleft()
+        while window:
+            yield await window.popleft()
+    finally:
+        for task in window:
+            task.cancel()
+
+def _compile_for_each(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    load_source = _compile_load(spec['source'], layout)
+    store_alias = _compile_store(spec['as'], layout)
+    body, is_async = compile_block(spec['body'], layout)
+
+    if is_async or spec.get('async', False):
+        body = _as_async(body, is_async)
+
+        async def for_each_async(ctx: Context) -> None:
+            async for item in iterate_async(load_source(ctx)):
+                store_alias(ctx, item, infer_type(item))
+                await body(ctx)
+        return for_each_async, True
+
+    def for_each(ctx: Context) -> None:
+        for item in load_source(ctx):
+            store_alias(ctx, item, infer_type(item))
+            body(ctx)
+    return for_each, False
+
+def _compile_try(spec: Dict[str, Any], index: int, layout: Layout) -> Tuple[Callable, bool]:
+    body = compile_block(spec['body'], layout)
+    catch = compile_block(spec['catch'], layout) if 'catch' in spec else (None, False)
+    return _compile_guarded(*body, *catch, index, layout)
+
+def _compile_guarded(body: Callable, body_async: bool, catch: Optional[Callable], catch_async: bool,
+                     index: int, layout: Layout) -> Tuple[Callable, bool]:
+    """Runs `body`; if it raises, stores the error in `error` and runs `catch` (if any)."""
+    store_error = _compile_store('error', layout)
+
+    def error_obj(e: Exception) -> Dict[str, Any]:
+        return {'message': str(e), 'step': index, 'details': {'type': type(e).__name__}}
+
+    if body_async or catch_async:
+        body = _as_async(body, body_async)
+        catch = _as_async(catch, catch_async) if catch is not None else None
+
+        async def try_async(ctx: Context) -> None:
+            try:
+                await body(ctx)
+            except Exception as e:
+                if catch is not None:
+                    store_error(ctx, error_obj(e), 'object')
+                    await catch(ctx)
+        return try_async, True
+
+    def try_step(ctx: Context) -> None:
+        try:
+            body(ctx)
+        except Exception as e:
+            if catch is not None:
+                store_error(ctx, error_obj(e), 'object')
+                catch(ctx)
+    return try_step, False
+
+def _as_steps(steps: Any) -> List[Dict[str, Any]]:
+    """Branches may hold a single step or a list of steps."""
+    return steps if isinstance(steps, list) else [steps]
+
+def _compile_if(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    condition, condition_async = _compile(spec['condition'], layout)
+    then, then_async = compile_block(_as_steps(spec['then']), layout)
+    otherwise, else_async = compile_block(_as_steps(spec['else']), layout) if 'else' in spec else (None, False)
+
+    if condition_async or then_async or else_async:
+        condition = _as_async(condition, condition_async)
+        then = _as_async(then, then_async)
+        otherwise = _as_async(otherwise, else_async) if otherwise is not None else None
+
+        async def if_async(ctx: Context) -> None:
+            if (await condition(ctx))[0]:
+                await then(ctx)
+            elif otherwise is not None:
+                await otherwise(ctx)
+        return if_async, True
+
+    def if_step(ctx: Context) -> None:
+        if condition(ctx)[0]:
+            then(ctx)
+        elif otherwise is not None:
+            otherwise(ctx)
+    return if_step, False
+
+# Iteration budget of a `while` step without its own `max_iterations`.
+WHILE_MAX_ITERATIONS = 10000
+
+def _compile_while(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    global _cse
+    # The condition is re-evaluated after every iteration, so it must not
+    # reuse (or provide) results computed once
+    outer, _cse = _cse, None
+    try:
+        condition, condition_async = _compile(spec['condition'], layout)
+    finally:
+        _cse = outer
+    body, body_async = compile_block(spec['body'], layout)
+    budget = spec.get('max_iterations', WHILE_MAX_ITERATIONS)
+
+    def exhausted() -> RuntimeError:
+        return RuntimeError(f"while loop exceeded {budget} iterations")
+
+    if condition_async or body_async:
+        condition = _as_async(condition, condition_async)
+        body = _as_async(body, body_async)
+
+        async def while_async(ctx: Context) -> None:
+            iterations = 0
+            while (await condition(ctx))[0]:
+                if iterations == budget:
+                    raise exhausted()
+                iterations += 1
+                await body(ctx)
+                # Give timeouts and cancellation a chance even if nothing suspended
+                await asyncio.sleep(0)
+        return while_async, True
+
+    def while_step(ctx: Context) -> None:
+        iterations = 0
+        while condition(ctx)[0]:
+            if iterations == budget:
+                raise exhausted()
+            iterations += 1
+            body(ctx)
+    return while_step, False
+
+JOIN_POLICIES = ('all', 'any', 'first-error')
+
+def _compile_parallel(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    """
+    Compiles a `parallel` step. Branches run concurrently, each in its own
+    copy-on-write scope; the writes of the branches that are kept merge back
+    in branch order. Join policies:
+      all:          wait for every branch, keep those that succeeded, then
+                    raise the first error (in branch order), if any
+      first-error:  like all, but cancel the other branches on the first error
+      any:          keep the first branch to succeed and cancel the rest;
+                    raise the first error if none succeeds
+    """
+    join = spec.get('join', 'all')
+    if join not in JOIN_POLICIES:
+        error = ValueError(f"Unknown join policy: {join}")
+
+        def invalid_join(ctx: Context) -> None:
+            raise error
+        return invalid_join, False
+    branches = [_as_async(*compile_block(_as_steps(branch), layout)) for branch in spec['branches']]
+    if not branches:
+        # Nothing to wait for, whatever the join policy
+        def no_branches(ctx: Context) -> None:
+            pass
+        return no_branches, False
+
+    async def run_branch(branch: Callable, ctx: Context) -> Context:
+        scope = ctx.child()
+        await branch(scope)
+        return scope
+
+    async def parallel(ctx: Context) -> None:
+        tasks = [asyncio.ensure_future(run_branch(branch, ctx)) for branch in branches]
+        winner = None
+        try:
+            if join == 'any':
+                pending = set(tasks)
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((task for task in tasks
+                                   if task in done and not task.cancelled() and task.exception() is None), None)
+            else:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION if join == 'first-error' else asyncio.ALL_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if winner is not None:
+            ctx.merge(winner.result().writes)
+            return
+        errors = [result for result in results
+                  if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError)]
+        if join != 'any':
+            for result in results:
+                if isinstance(result, Context):
+                    ctx.merge(result.writes)
+        if errors:
+            raise errors[0]
+    return parallel, True
+
+def _compile_assert(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    condition, is_async = _compile(spec['condition'], layout)
+    message = spec.get('message', 'Assertion failed')
+
+    if is_async:
+        async def assert_async(ctx: Context) -> None:
+            if not (await condition(ctx))[0]:
+                raise AssertionError(message)
+        return assert_async, True
+
+    def assert_step(ctx: Context) -> None:
+        if not condition(ctx)[0]:
+            raise AssertionError(message)
+    return assert_step, False
+
+def _log_part(part: Any) -> Any:
+    """A message part is an expression, a quoted literal (`'text'`) or a variable name."""
+    if isinstance(part, str):
+        if len(part) >= 2 and part[0] == part[-1] == "'":
+            return {'value': part[1:-1]}
+        return {'get': part}
+    return part
+
+def _compile_log(spec: Dict[str, Any], layout: Layout) -> Tuple[Callable, bool]:
+    level = logging.getLevelName(str(spec.get('level', 'info')).upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    parts = _as_steps(spec.get('message', []))
+    part_fns, is_async = _compile_operands([_log_part(part) for part in parts], layout)
+
+    if is_async:
+        async def log_async(ctx: Context) -> None:
+            values = [(await part_fn(ctx))[0] for part_fn in part_fns]
+            flow_log.log(level, ' '.join(str(value) for value in values))
+        return log_async, True
+
+    def log_step(ctx: Context) -> None:
+        flow_log.log(level, ' '.join(str(part_fn(ctx)[0]) for part_fn in part_fns))
+    return log_step, False
+
+def _compile_return(expr: Any, layout: Layout) -> Tuple[Callable, bool]:
+    value_fn, is_async = _compile(expr, layout)
+
+    if is_async:
+        async def return_async(ctx: Context) -> None:
+            raise _Return((await value_fn(ctx))[0])
+        return return_async, True
+
+    def return_step(ctx: Context) -> None:
+        raise _Return(value_fn(ctx)[0])
+    return return_step, False
@@ -0,0 +1,305 @@
+import copy
+import itertools
+import logging
+from typing import Any, Dict, Iterator, List, MutableMapping, Tuple, Union
+
+from interpreter import tracing
+
+log = logging.getLogger(__name__)
+
+# Marks a slot whose variable has not been assigned.
+UNSET = object()
+
+class Layout:
+    """
+    Maps a compiled program's top-level variable names to slot indices. The
+    compiler adds names as it meets them; a Context bound to the layout keeps
+    those variables in a list instead of a dict. `temps` counts the unnamed
+    slots the compiler reserves for reusing expression results within a run.
+    """
+    __slots__ = ('names', 'index', 'temps')
+
+    def __init__(self, names: Tuple[str, ...] = ()):
+        self.names: List[str] = list(names)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.temps = 0
+
+    def slot(self, name: str) -> int:
+        index = self.index.get(name)
+        if index is None:
+            index = self.index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def temp(self) -> int:
+        self.temps += 1
+        return self.temps - 1
+
+EMPTY_LAYOUT = Layout()
+
+class Context:
+    """
+    Variable storage for a running flow. Variables known to the bound layout
+    live in `slots`; anything else (dynamic keys, values the program never
+    names) lives in `extras`. `data` is a live dict-like view over both.
+    """
+    def __init__(self, initial: Dict[str, Any] = None, schema_context: Dict[str, str] = None):
+        self.layout = EMPTY_LAYOUT
+        self.slots: List[Any] = []
+        self.temps: List[Any] = []
+        self.extras: Dict[str, Any] = initial or {}
+        self.schema_context = schema_context or {}
+
+    @property
+    def data(self) -> 'ContextView':
+        return ContextView(self)
+
+    def bind(self, layout: Layout) -> None:
+        """Moves variables into the slots of `layout`; a no-op if already bound to it."""
+        if layout is self.layout and len(self.slots) == len(layout.names) and len(self.temps) == layout.temps:
+            return
+        variables = dict(self.items())
+        self.layout = layout
+        self.slots = [variables.pop(name, UNSET) for name in layout.names]
+        self.temps = [UNSET] * layout.temps
+        self.extras = variables
+
+    def assign(self, values: Dict[str, Any]) -> None:
+        """Stores top-level variables directly, without type checks or tracing (e.g. a record's inputs)."""
+        index = self.layout.index
+        for name, value in values.items():
+            slot = index.get(name)
+            if slot is None:
+                self.extras[name] = value
+            else:
+                self.slots[slot] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for name, value in zip(self.layout.names, self.slots):
+            if value is not UNSET:
+                yield name, value
+        yield from self.extras.items()
+
+    def _load(self, name: str) -> Any:
+        index = self.layout.index.get(name)
+        if index is None:
+            return self.extras[name]
+        value = self.slots[index]
+        if value is UNSET:
+            raise KeyError(name)
+        return value
+
+    def _store(self, name: str, value: Any) -> None:
+        index = self.layout.index.get(name)
+        if index is None:
+            self.extras[name] = value
+        else:
+            self.slots[index] = value
+
+    def _delete(self, name: str) -> None:
+        index = self.layout.index.get(name)
+        if index is None:
+            del self.extras[name]
+        elif self.slots[index] is UNSET:
+            raise KeyError(name)
+        else:
+            self.slots[index] = UNSET
+
+    def resolve(self, path: Union[str, List[str]]) -> Any:
+        if isinstance(path, list):
+            ref = self._load(path[0])
+            for key in path[1:]:
+                ref = ref[key]
+            return ref
+        return self._load(path)
+
+    def set(self, path: Union[str, List[str]], value: Any, value_type: str) -> None:
+        self._check(path[-1] if isinstance(path, list) else path, value, value_type)
+        self._write(path, value)
+
+    def set_slot(self, index: int, name: str, value: Any, value_type: str) -> None:
+        """Compiled-code fast path for `set(name, ...)` when `name` is slot `index` of the bound layout."""
+        self._check(name, value, value_type)
+        self._write_slot(index, name, value)
+
+    def _check(self, target: str, value: Any, value_type: str) -> None:
+        expected_type = self.schema_context.get(target)
+        if expected_type and value_type != expected_type:
+            log.warning("Type mismatch for '%s': expected %s, got %s", target, expected_type, value_type)
+        if tracing.tracer is not None:
+            tracing.tracer.record(logging.DEBUG, 'set', target, value_type, value)
+
+    def _write(self, path: Union[str, List[str]], value: Any) -> None:
+        if isinstance(path, list):
+            self._write_nested(path, value)
+            return
+        index = self.layout.index.get(path)
+        if index is None:
+            self._write_extra(path, value)
+        else:
+            self._write_slot(index, path, value)
+
+    def _write_slot(self, index: int, name: str, value: Any) -> None:
+        current = self.slots[index]
+        if isinstance(current, list) and self.schema_context.get(name) == 'array':
+            self._append(current, value)
+        else:
+            self.slots[index] = value
+
+    def _write_extra(self, name: str, value: Any) -> None:
+        current = self.extras.get(name)
+        if isinstance(current, list) and self.schema_context.get(name) == 'array':
+            self._append(current, value)
+        else:
+            self.extras[name] = value
+
+    def _append(self, array: List[Any], value: Any) -> None:
+        array.append(value)
+        # Any other name may alias the array, so no reused result is safe
+        # any more; compiled code recomputes temps it finds unset
+        if self.temps:
+            self.temps[:] = [UNSET] * len(self.temps)
+
+    def _write_nested(self, path: List[str], value: Any) -> None:
+        try:
+            ref = self._load(path[0])
+        except KeyError:
+            ref = {}
+            self._store(path[0], ref)
+        for key in path[1:-1]:
+            ref = ref.setdefault(key, {})
+        ref[path[-1]] = value
+
+    def get(self, path: Union[str, List[str]]) -> Any:
+        return self.resolve(path)
+
+    def child(self) -> 'ChildContext':
+        """Returns a scope that starts from this context's variables but writes locally."""
+        return ChildContext(self)
+
+    def merge(self, writes: List[Tuple[Union[str, List[str]], Any]]) -> None:
+        """Replays a child scope's `writes` onto this context, in the order they happened."""
+        for path, value in writes:
+            self._write(path, value)
+
+class ContextView(MutableMapping):
+    """Dict-like view of a Context's variables, regardless of slot binding."""
+    __slots__ = ('_ctx',)
+
+    def __init__(self, ctx: Context):
+        self._ctx = ctx
+
+    def __getitem__(self, name: str) -> Any:
+        return self._ctx._load(name)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self._ctx._store(name, value)
+
+    def __delitem__(self, name: str) -> None:
+        self._ctx._delete(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name, _ in self._ctx.items())
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._ctx.items())
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+class ChildContext(Context):
+    """
+    A copy-on-write scope over a parent context. It starts with a shallow copy
+    of the parent's slots, so reads cost the same as in the parent; containers
+    along a written path are copied before the first write, and every write
+    is logged in `writes` so the parent can merge them back with
+    `Context.merge(child.writes)`. Overwriting a top-level variable drops the
+    earlier logged writes under it, so loop variables and accumulators cost
+    one merged write rather than one per iteration.
+    """
+    def __init__(self, parent: Context):
+        self.layout = parent.layout
+        self.slots = parent.slots[:]
+        self.temps = parent.temps[:]
+        self.extras = dict(parent.extras)
+        self.schema_context = parent.schema_context
+        self._log: Dict[Any, Tuple[Union[str, List[str]], Any]] = {}
+        self._log_heads: Dict[str, List[Any]] = {}
+        self._seq = itertools.count()
+        self._owned = set()
+
+    @property
+    def writes(self) -> List[Tuple[Union[str, List[str]], Any]]:
+        return list(self._log.values())
+
+    def _write_slot(self, index: int, name: str, value: Any) -> None:
+        if self._log_top_level(name, value):
+            super()._write_slot(index, name, value)
+        else:
+            self.slots[index] = value
+
+    def _write_extra(self, name: str, value: Any) -> None:
+        if self._log_top_level(name, value):
+            super()._write_extra(name, value)
+        else:
+            self.extras[name] = value
+
+    def _write_nested(self, path: List[str], value: Any) -> None:
+        self._record(path[0], path, value)
+        self._own(path[:-1])
+        super()._write_nested(path, value)
+
+    def _log_top_level(self, name: str, value: Any) -> bool:
+        """Logs a top-level write; returns True if it may append to an existing array."""
+        if self.schema_context.get(name) == 'array':
+            self._record(name, name, value)
+            self._own([name])
+            return True
+        for key in self._log_heads.pop(name, ()):
+            del self._log[key]
+        self._log[name] = (name, value)
+        return False
+
+    def _record(self, head: str, path: Union[str, List[str]], value: Any) -> None:
+        key = next(self._seq)
+        self._log[key] = (path, value)
+        self._log_heads.setdefault(head, []).append(key)
+
+    def _own(self, keys: List[str]) -> None:
+        """Copies the containers along `keys` into this scope before they are written."""
+        try:
+            ref = self._load(keys[0])
+        except KeyError:
+            return
+        container = None
+        for depth, key in enumerate(keys):
+            if depth:
+                if not isinstance(container, dict) or key not in container:
+                    return
+                ref = container[key]
+            if not isinstance(ref, (dict, list)):
+                return
+            if id(ref) not in self._owned:
+                ref = copy.copy(ref)
+                self._owned.add(id(ref))
+                if depth:
+                    container[key] = ref
+                else:
+                    self._store(key, ref)
+            container = ref
+
+def infer_type(value: Any) -> str:
+    if isinstance(value, int):
+        return 'integer'
+    elif isinstance(value, float):
+        return 'number'
+    elif isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, list):
+        return 'array'
+    elif isinstance(value, dict):
+        return 'object'
+    return 'string'
@@ -0,0 +1,86 @@
+"""
+Registry of host functions that `call` expressions dispatch to.
+
+A `call` names its function by string; the registry binds that name to a
+Python callable, sync or async, which receives the call's `args` as keyword
+arguments:
+
+    @register('quote')
+    async def quote(symbol):
+        ...
+
+Names are resolved when the call runs, so functions may be registered after
+a flow has been compiled. A call to an unregistered name evaluates to the
+placeholder string `name(arg, ...)`.
+"""
+import asyncio
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+class Function:
+    """
+    A registered callable. `max_concurrency` caps how many calls to it may be
+    in flight at once on an event loop (async functions only).
+    """
+    __slots__ = ('name', 'fn', 'is_async', 'max_concurrency', '_semaphores')
+
+    def __init__(self, name: str, fn: Callable, max_concurrency: Optional[int] = None):
+        self.name = name
+        self.fn = fn
+        self.is_async = asyncio.iscoroutinefunction(fn)
+        self.max_concurrency = max_concurrency
+        self._semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = \
+            weakref.WeakKeyDictionary()
+
+    async def call_async(self, kwargs: Dict[str, Any]) -> Any:
+        if not self.is_async:
+            return self.fn(**kwargs)
+        if self.max_concurrency is None:
+            return await self.fn(**kwargs)
+        async with loop_semaphore(self._semaphores, self.max_concurrency):
+            return await self.fn(**kwargs)
+
+    def call(self, kwargs: Dict[str, Any]) -> Any:
+        if self.is_async:
+            raise TypeError(f"Function '{self.name}' is async; mark the call with \"async\": true")
+        return self.fn(**kwargs)
+
+class FunctionRegistry:
+    def __init__(self):
+        self._functions: Dict[str, Function] = {}
+
+    def register(self, name: str, fn: Optional[Callable] = None, max_concurrency: Optional[int] = None) -> Any:
+        """Binds `name` to `fn`; without `fn`, returns a decorator that does."""
+        if fn is None:
+            def decorator(fn: Callable) -> Callable:
+                self.register(name, fn, max_concurrency)
+                return fn
+            return decorator
+        self._functions[name] = Function(name, fn, max_concurrency)
+        return fn
+
+    def unregister(self, name: str) -> None:
+        self._functions.pop(name, None)
+
+    def lookup(self, name: str) -> Optional[Function]:
+        return self._functions.get(name)
+
+    def clear(self) -> None:
+        self._functions.clear()
+
+registry = FunctionRegistry()
+
+register = registry.register
+
+def placeholder(name: str, args: Dict[str, Any]) -> str:
+    """Result of calling an unregistered function."""
+    return f"{name}({', '.join(str(value) for value in args.values())})"
+
+def loop_semaphore(semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]',
+                   limit: int) -> asyncio.Semaphore:
+    """Returns the semaphore for the running loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    semaphore = semaphores.get(loop)
+    if semaphore is None:
+        semaphore = semaphores[loop] = asyncio.Semaphore(limit)
+    return semaphore
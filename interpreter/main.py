@@ -1,17 +1,31 @@
-import spacy
-from typing import Dict, List, Any
-from parser import parse_kid_sentence_grammar
-from llm_parser import parse_kid_sentence_llm
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
+import logging
 
-nlp = spacy.load("en_core_web_sm")
+if TYPE_CHECKING:
+    import spacy
+
+log = logging.getLogger(__name__)
+
+# spaCy, Lark and OpenAI each take a while to import or load, so they are loaded
+# on first use: the grammar path never touches spaCy or OpenAI.
+_nlp = None
 context_map = {}
 
-def parse_natural_language(sentences: List[str]) -> Dict[str, Any]:
+def get_nlp() -> "spacy.language.Language":
+    """Loads the spaCy pipeline on first use."""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load("en_core_web_sm")
+    return _nlp
+
+def parse_natural_language(sentences: List[str], use_llm: bool = False) -> Dict[str, Any]:
     """
     Converts natural language sentences to an A+ JSONFlow program with context-aware parsing.
 
     Args:
         sentences: List of NL sentences (e.g., "Set balance to 100").
+        use_llm: Parse with the LLM (in batches) before falling back to the grammar.
 
     Returns:
         A+ JSONFlow program with function, schema, context, and steps.
@@ -22,31 +36,37 @@ def parse_natural_language(sentences: List[str]) -> Dict[str, Any]:
         "context": {},
         "steps": []
     }
-    for sentence in sentences:
-        doc = nlp(sentence)
-        action = parse_action(doc, sentence)
+    llm_actions = [None] * len(sentences)
+    if use_llm:
+        from llmsyntax import parse_sentences_llm
+        try:
+            llm_actions = parse_sentences_llm(sentences)
+        except Exception as e:
+            log.error(f"LLM parsing failed: {str(e)}")
+    for sentence, llm_action in zip(sentences, llm_actions):
+        action = parse_action(sentence, llm_action)
         flow["steps"].append(action)
         update_context(action, flow["schema"]["context"])
     return flow
 
-def parse_action(doc: spacy.tokens.Doc, sentence: str) -> Dict[str, Any]:
+def parse_action(sentence: str, llm_action: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
-    Parses a single sentence into a JSONFlow step, using context and fallback grammar.
+    Parses a single sentence into a JSONFlow step, using the LLM result if any,
+    then the grammar, then spaCy context-aware parsing.
     """
     global context_map
+    if llm_action is not None and "error" not in llm_action:
+        return llm_action
     try:
-        # Try LLM parsing first
-        action = parse_kid_sentence_llm(sentence)
-        if "error" not in action:
-            return action
-        # Fallback to grammar-based parsing
+        from kidlang_grammar import parse_kid_sentence_grammar
         action = parse_kid_sentence_grammar(sentence)
         if "error" not in action:
             return action
     except Exception as e:
         log.error(f"Parsing failed for '{sentence}': {str(e)}")
-    
+
     # Context-aware parsing
+    doc = get_nlp()(sentence)
     root = doc[0] if doc else None
     if root and root.lemma_ in ("set", "assign"):
         target = next((t.text for t in doc if t.dep_ == "dobj"), None)
@@ -0,0 +1,27 @@
+"""
+Long-lived process pool shared by every run that opts into process execution.
+
+The pool is created on first use and reused across runs, so worker start-up
+and per-worker flow compilation are paid once rather than per map step.
+"""
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+PROCESS_WORKERS = os.cpu_count() or 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+        atexit.register(shutdown_process_pool)
+    return _pool
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,192 @@
+"""
+Opt-in execution profiler for the interpreter.
+
+Like tracing, profiling is off by default and costs nothing when off: while
+a profiler is enabled, `compile_steps` builds (and caches separately) an
+instrumented copy of the program whose step and expression closures time
+themselves. Steps are identified by their `id` or, failing that, by their
+position and kind (e.g. `2:forEach`), nested under their enclosing steps.
+
+Results can be exported as collapsed stacks (self time in nanoseconds per
+stack, for flamegraph.pl or speedscope) and as a JSON summary.
+"""
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, IO, List, Optional, Tuple, Union
+
+Frames = Tuple[str, ...]
+
+class StepStats:
+    __slots__ = ('calls', 'wall_ns', 'alloc_bytes')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_ns = 0
+        self.alloc_bytes = 0
+
+class ExprStats:
+    __slots__ = ('calls', 'wall_ns')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_ns = 0
+
+class Profiler:
+    """
+    Collects per-step call counts, wall time and (with `memory=True`) net
+    allocated bytes measured via tracemalloc, plus per-expression-kind call
+    counts and wall time. Expression times include their operands.
+    """
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.steps: Dict[Frames, StepStats] = {}
+        self.exprs: Dict[str, ExprStats] = {}
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def step(self, frames: Frames) -> StepStats:
+        stats = self.steps.get(frames)
+        if stats is None:
+            stats = self.steps[frames] = StepStats()
+        return stats
+
+    def expr(self, kind: str) -> ExprStats:
+        stats = self.exprs.get(kind)
+        if stats is None:
+            stats = self.exprs[kind] = ExprStats()
+        return stats
+
+    def self_times(self) -> Dict[Frames, int]:
+        """Wall time of each step minus the time of the steps nested directly inside it."""
+        own = {frames: stats.wall_ns for frames, stats in self.steps.items()}
+        for frames, stats in self.steps.items():
+            if len(frames) > 1 and frames[:-1] in own:
+                own[frames[:-1]] -= stats.wall_ns
+        return own
+
+    def collapsed(self) -> List[str]:
+        return [f"{';'.join(frames)} {max(ns, 0)}" for frames, ns in sorted(self.self_times().items())]
+
+    def summary(self) -> Dict[str, Any]:
+        own = self.self_times()
+        steps = [
+            {
+                'step': ';'.join(frames),
+                'calls': stats.calls,
+                'wall_ns': stats.wall_ns,
+                'self_ns': max(own[frames], 0),
+                **({'alloc_bytes': stats.alloc_bytes} if self.memory else {}),
+            }
+            for frames, stats in self.steps.items()
+        ]
+        steps.sort(key=lambda entry: entry['self_ns'], reverse=True)
+        exprs = {
+            kind: {'calls': stats.calls, 'wall_ns': stats.wall_ns}
+            for kind, stats in sorted(self.exprs.items(), key=lambda item: item[1].wall_ns, reverse=True)
+        }
+        return {'steps': steps, 'expressions': exprs}
+
+    def dump_collapsed(self, out: Union[str, IO[str]]) -> None:
+        """Writes collapsed stacks (`frame;frame self_ns` per line)."""
+        if isinstance(out, str):
+            with open(out, 'w') as f:
+                self.dump_collapsed(f)
+            return
+        for line in self.collapsed():
+            out.write(line + '\n')
+
+    def dump_json(self, out: Union[str, IO[str]]) -> None:
+        if isinstance(out, str):
+            with open(out, 'w') as f:
+                self.dump_json(f)
+            return
+        json.dump(self.summary(), out, indent=2)
+
+    def clear(self) -> None:
+        self.steps.clear()
+        self.exprs.clear()
+
+profiler: Optional[Profiler] = None
+
+def enable_profiling(memory: bool = False) -> Profiler:
+    """Installs a fresh profiler and returns it. Programs compiled from now on are instrumented."""
+    global profiler
+    profiler = Profiler(memory)
+    return profiler
+
+def disable_profiling() -> None:
+    global profiler
+    if profiler is not None and profiler.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    profiler = None
+
+def step_label(step: Dict[str, Any], index: int) -> str:
+    if 'id' in step:
+        return str(step['id'])
+    kind = next((key for key in step if key not in ('id', 'timeout', 'on_error')), 'step')
+    return f"{index}:{kind}"
+
+def instrument_step(fn: Any, is_async: bool, frames: Frames) -> Any:
+    """Wraps a compiled step so each run is recorded under `frames` in the active profiler."""
+    clock = time.perf_counter_ns
+    traced = tracemalloc.get_traced_memory
+
+    if is_async:
+        async def profiled_step_async(ctx: Any) -> None:
+            active = profiler
+            if active is None:
+                return await fn(ctx)
+            before = traced()[0] if active.memory else 0
+            start = clock()
+            try:
+                return await fn(ctx)
+            finally:
+                _record_step(active, frames, clock() - start, traced()[0] - before if active.memory else 0)
+        return profiled_step_async
+
+    def profiled_step(ctx: Any) -> None:
+        active = profiler
+        if active is None:
+            return fn(ctx)
+        before = traced()[0] if active.memory else 0
+        start = clock()
+        try:
+            return fn(ctx)
+        finally:
+            _record_step(active, frames, clock() - start, traced()[0] - before if active.memory else 0)
+    return profiled_step
+
+def _record_step(active: Profiler, frames: Frames, wall_ns: int, alloc_bytes: int) -> None:
+    stats = active.step(frames)
+    stats.calls += 1
+    stats.wall_ns += wall_ns
+    stats.alloc_bytes += alloc_bytes
+
+def instrument_expr(fn: Any, is_async: bool, kind: str) -> Any:
+    """Wraps a compiled expression so each evaluation is recorded under `kind`."""
+    clock = time.perf_counter_ns
+
+    if is_async:
+        async def profiled_expr_async(ctx: Any) -> Any:
+            start = clock()
+            try:
+                return await fn(ctx)
+            finally:
+                if profiler is not None:
+                    _record_expr(profiler, kind, clock() - start)
+        return profiled_expr_async
+
+    def profiled_expr(ctx: Any) -> Any:
+        start = clock()
+        try:
+            return fn(ctx)
+        finally:
+            if profiler is not None:
+                _record_expr(profiler, kind, clock() - start)
+    return profiled_expr
+
+def _record_expr(active: Profiler, kind: str, wall_ns: int) -> None:
+    stats = active.expr(kind)
+    stats.calls += 1
+    stats.wall_ns += wall_ns
@@ -0,0 +1,81 @@
+"""
+Step deadlines and retries.
+
+A step with `timeout: {duration, action, max_retries}` runs each attempt under
+`asyncio.timeout`, so an attempt that overruns its deadline is cancelled,
+including any call it is awaiting. Each attempt writes to a copy-on-write
+scope that is merged back only if it completes, so an abandoned attempt
+leaves no partial writes. When the deadline passes, `action` decides:
+
+    fail   raise StepTimeout (the default)
+    skip   log a warning and continue with the next step
+    retry  try again, up to `max_retries` more times, after a jittered
+           exponential backoff; then raise StepTimeout
+
+A TimeoutError raised inside the step (by a host function, or by a nested
+step's own deadline) propagates unchanged; only this step's deadline is
+subject to its action.
+"""
+import asyncio
+import logging
+import random
+import re
+from typing import Any, Callable, Dict
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_RETRIES = 3
+
+# Backoff before retry n (from 0) is uniform in [0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**n)]
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 10.0
+
+class StepTimeout(asyncio.TimeoutError):
+    pass
+
+_DURATION = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def parse_duration(duration: Any) -> float:
+    """Converts a schema duration ('500ms', '30s', '1m', '2h' or a number of seconds) to seconds."""
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    match = _DURATION.match(duration)
+    if match is None:
+        raise ValueError(f"Invalid duration: {duration!r}")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or 's']
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (from 0)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+def with_timeout(step_fn: Callable, spec: Dict[str, Any], position: int) -> Callable:
+    """Wraps an async step function with the deadline and action of its `timeout` spec."""
+    seconds = parse_duration(spec['duration'])
+    action = spec.get('action', 'fail')
+    if action not in ('fail', 'skip', 'retry'):
+        raise ValueError(f"Unknown timeout action: {action}")
+    retries = spec.get('max_retries', DEFAULT_MAX_RETRIES) if action == 'retry' else 0
+
+    async def step_with_timeout(ctx: Any) -> None:
+        attempt = 0
+        while True:
+            scope = ctx.child()
+            try:
+                async with asyncio.timeout(seconds) as deadline:
+                    await step_fn(scope)
+            except TimeoutError:
+                if not deadline.expired():
+                    raise
+                if attempt < retries:
+                    log.warning("Step %s timed out after %ss; retrying (%d/%d)", position, seconds, attempt + 1, retries)
+                    await asyncio.sleep(backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                if action == 'skip':
+                    log.warning("Step %s timed out after %ss; skipped", position, seconds)
+                    return
+                raise StepTimeout(f"Step {position} timed out after {seconds}s") from None
+            ctx.merge(scope.writes)
+            return
+    return step_with_timeout
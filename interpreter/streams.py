@@ -0,0 +1,101 @@
+"""
+Lazy sources for `map` and `forEach`.
+
+A loop source may be any iterable (a list, a generator), an async iterable
+(marked on the loop with `"async": true`), or a JSONArray, which parses the
+top-level array of a JSON file one element at a time:
+
+    ctx = Context({'events': JSONArray('events.json')})
+
+Only the element being processed and one read buffer are held in memory, so
+a multi-gigabyte log can be folded with constant memory.
+"""
+import json
+from typing import Any, AsyncIterator, Iterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789.eE+-'
+
+class JSONArray:
+    """
+    Re-iterable view of the top-level JSON array in `path`; each iteration
+    reopens the file and decodes elements as it goes.
+    """
+    def __init__(self, path: str, chunk_size: int = 1 << 16):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[Any]:
+        with open(self.path, encoding='utf-8') as f:
+            yield from iter_json_array(f, self.chunk_size)
+
+    def __repr__(self) -> str:
+        return f"JSONArray({self.path!r})"
+
+def iter_json_array(f: Any, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yields the elements of the JSON array in text file `f`, reading `chunk_size` characters at a time."""
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(chars: str) -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    skip(_WHITESPACE)
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    expect_value = None  # None: first element or ']', True: after ',', False: after a value
+    while True:
+        skip(_WHITESPACE)
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        char = buffer[pos]
+        if char == ']' and expect_value is not True:
+            return
+        if expect_value is False:
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # A number cut off by the end of the buffer may continue in the next chunk
+            if isinstance(value, (int, float)) and (end == len(buffer) or buffer[end] in _NUMBER_CHARS):
+                if not eof and fill():
+                    continue
+            break
+        pos = end
+        expect_value = False
+        yield value
+
+async def iterate_async(items: Any) -> AsyncIterator[Any]:
+    """Iterates a sync or async iterable asynchronously."""
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
@@ -0,0 +1,60 @@
+"""
+Level-gated tracing for the interpreter.
+
+Tracing is off by default: the runtime only checks `tracing.tracer is not
+None` on its hot paths, so nothing is formatted or allocated unless a tracer
+is enabled. An enabled tracer appends compact tuples to a bounded ring
+buffer, which can be exported as JSONL for offline debugging.
+"""
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, IO, Iterator, Optional, Tuple, Union
+
+# Records are (timestamp_ns, level, event, *fields); fields per event:
+#   set:         target, value_type, value
+#   step_failed: step index, error message
+FIELDS = {
+    'set': ('target', 'type', 'value'),
+    'step_failed': ('step', 'message'),
+}
+
+class Tracer:
+    def __init__(self, capacity: int = 65536, level: int = logging.DEBUG):
+        self.level = level
+        self.records: Deque[Tuple[Any, ...]] = deque(maxlen=capacity)
+
+    def record(self, level: int, event: str, *fields: Any) -> None:
+        if level >= self.level:
+            self.records.append((time.perf_counter_ns(), level, event) + fields)
+
+    def iter_dicts(self) -> Iterator[Dict[str, Any]]:
+        for timestamp, level, event, *fields in self.records:
+            entry = {'ts': timestamp, 'level': logging.getLevelName(level), 'event': event}
+            entry.update(zip(FIELDS.get(event, ()), fields))
+            yield entry
+
+    def dump_jsonl(self, out: Union[str, IO[str]]) -> None:
+        """Writes the buffered records as JSON lines; values that are not JSON are written via repr."""
+        if isinstance(out, str):
+            with open(out, 'w') as f:
+                self.dump_jsonl(f)
+            return
+        for entry in self.iter_dicts():
+            out.write(json.dumps(entry, default=repr, separators=(',', ':')) + '\n')
+
+    def clear(self) -> None:
+        self.records.clear()
+
+tracer: Optional[Tracer] = None
+
+def enable_tracing(capacity: int = 65536, level: int = logging.DEBUG) -> Tracer:
+    """Installs a fresh tracer and returns it."""
+    global tracer
+    tracer = Tracer(capacity, level)
+    return tracer
+
+def disable_tracing() -> None:
+    global tracer
+    tracer = None
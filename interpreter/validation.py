@@ -0,0 +1,509 @@
+"""
+Validates flows against JSON Schema (draft-07) files such as schema/schema.json
+and the schemaCivil schemas.
+
+Each schema file is compiled once into a tree of closures, the same way flows
+themselves are compiled: keywords are resolved and regexes compiled up front,
+recursive `$ref`s (`$defs/step`, `$defs/expr`) are linked to the definition's
+compiled validator instead of being walked again, and a `oneOf`/`anyOf` whose
+branches are tagged by a required `const` property (like the `type` of each
+`$defs/step` branch) checks only the branches with the instance's tag.
+Compiled validators are cached per schema file until it, or a file it
+reaches through `$ref`, changes; results are cached per schema version and
+flow content hash, so re-validating an unchanged flow is a dict lookup:
+
+    errors = validate_flow(flow, 'schema/schema.json')
+    check_flow(flow, 'schema/schema.json')  # raises ValidationError
+
+A flow names its schema with a top-level `$schema` path, relative to the flow
+file (see flow_schema); the `$schema` key itself is not validated. `format` is
+treated as an annotation, as draft-07 allows, and unknown keywords are ignored.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import unquote
+
+# Validation results kept, least recently used first out.
+RESULT_CACHE_SIZE = 1024
+
+# Whether a oneOf/anyOf with `const`-tagged branches checks only the branches
+# for the instance's tag (see `compile_alternatives`). Read when a schema is
+# compiled.
+DISPATCH = True
+
+# (path inside the instance, message); a validator returns an empty sequence
+# for a valid instance.
+Error = Tuple[Tuple[Any, ...], str]
+Check = Callable[[Any], Sequence[Error]]
+
+_VALID: Tuple[Error, ...] = ()
+
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    'null': lambda value: value is None,
+    'boolean': lambda value: value is True or value is False,
+    'string': lambda value: isinstance(value, str),
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'integer': lambda value: (isinstance(value, int) and not isinstance(value, bool))
+                             or (isinstance(value, float) and value.is_integer()),
+}
+
+# schema file -> compiler, for every file loaded directly or through a `$ref`
+_compilers: Dict[str, '_SchemaCompiler'] = {}
+# (schema file, mtimes of the files it depends on, flow content hash) -> formatted errors
+_results: 'OrderedDict[Tuple[str, Tuple[Tuple[str, float], ...], str], List[str]]' = OrderedDict()
+
+class ValidationError(ValueError):
+    def __init__(self, schema_path: str, errors: List[str]):
+        super().__init__(f"Flow does not match {schema_path}:\n  " + "\n  ".join(errors))
+        self.schema_path = schema_path
+        self.errors = errors
+
+def validate_flow(flow: Mapping[str, Any], schema_path: str) -> List[str]:
+    """
+    Returns the ways `flow` fails `schema_path` as "path: message" strings
+    (empty if it is valid). Results are memoized by the flow's content hash;
+    a binary flow supplies its own, so a cached result skips decoding it.
+    """
+    path, compiler = _schema_compiler(schema_path)
+    check = compiler.ref('#')
+    key = (path, tuple(compiler.files.items()), getattr(flow, 'content_hash', None) or _content_hash(flow))
+    errors = _results.get(key)
+    if errors is not None:
+        _results.move_to_end(key)
+        return list(errors)
+
+    instance = flow.to_dict() if hasattr(flow, 'to_dict') else flow
+    if '$schema' in instance:
+        instance = {name: value for name, value in instance.items() if name != '$schema'}
+    errors = [_format(error) for error in check(instance)]
+    _results[key] = errors
+    if len(_results) > RESULT_CACHE_SIZE:
+        _results.popitem(last=False)
+    return list(errors)
+
+def check_flow(flow: Mapping[str, Any], schema_path: str) -> None:
+    """Raises ValidationError if `flow` does not match `schema_path`."""
+    errors = validate_flow(flow, schema_path)
+    if errors:
+        raise ValidationError(schema_path, errors)
+
+def flow_schema(flow: Mapping[str, Any], flow_path: str) -> Optional[str]:
+    """Returns the schema file a flow names in `$schema`, resolved against the flow's directory."""
+    schema = flow.get('$schema')
+    if not isinstance(schema, str) or '://' in schema:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(flow_path)), schema)
+
+def load_validator(schema_path: str) -> Check:
+    """Returns the compiled validator for a schema file, compiling it on first use."""
+    return _schema_compiler(schema_path)[1].ref('#')
+
+def compile_schema(schema: Any, base_dir: str = '.') -> Check:
+    """Compiles an in-memory schema; relative file `$ref`s resolve against `base_dir`."""
+    return _SchemaCompiler(schema, base_dir).ref('#')
+
+def clear_cache() -> None:
+    _compilers.clear()
+    _results.clear()
+
+def _schema_compiler(schema_path: str) -> Tuple[str, '_SchemaCompiler']:
+    path = os.path.realpath(schema_path)
+    compiler = _compilers.get(path)
+    if compiler is None or _changed(compiler.files):
+        mtime = os.stat(path).st_mtime
+        with open(path) as f:
+            schema = json.load(f)
+        compiler = _compilers[path] = _SchemaCompiler(schema, os.path.dirname(path))
+        compiler.files[path] = mtime
+    return path, compiler
+
+def _changed(files: Dict[str, float]) -> bool:
+    try:
+        return any(os.stat(path).st_mtime != mtime for path, mtime in files.items())
+    except OSError:
+        return True
+
+def _content_hash(flow: Mapping[str, Any]) -> str:
+    # The same encoding as compiler.flow_hash, without importing the compiler
+    encoded = json.dumps(flow, sort_keys=True, separators=(',', ':'), default=repr)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def _format(error: Error) -> str:
+    path, message = error
+    return f"{'/'.join(map(str, path)) or '(flow)'}: {message}"
+
+def _show(value: Any) -> str:
+    text = json.dumps(value, default=repr)
+    return text if len(text) <= 60 else text[:57] + '...'
+
+def _nested(key: Any, errors: Sequence[Error]) -> List[Error]:
+    return [((key,) + path, message) for path, message in errors]
+
+def _equal(a: Any, b: Any) -> bool:
+    """JSON equality: unlike ==, booleans are not numbers."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(value, b[key]) for key, value in a.items())
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(_equal, a, b))
+    return a == b
+
+def _always_valid(instance: Any) -> Sequence[Error]:
+    return _VALID
+
+def _never_valid(instance: Any) -> Sequence[Error]:
+    return [((), "no value is allowed here")]
+
+class _SchemaCompiler:
+    """Compiles one schema document; `$ref`s into it are compiled once and shared."""
+
+    def __init__(self, root: Any, base_dir: str):
+        self.root = root
+        self.base_dir = base_dir
+        self.refs: Dict[str, Check] = {}
+        # Schema file -> mtime, for the document's own file and every file its checks link into
+        self.files: Dict[str, float] = {}
+
+    def ref(self, ref: str) -> Check:
+        document, _, pointer = ref.partition('#')
+        if document:
+            _, compiler = _schema_compiler(os.path.join(self.base_dir, document))
+            check = compiler.ref('#' + pointer)
+            # The linked check goes stale with that file or any file it refers to
+            self.files.update(compiler.files)
+            return check
+        check = self.refs.get(pointer)
+        if check is None:
+            # Recursive references made while compiling the target go through this forwarder
+            target: List[Check] = []
+
+            def check(instance: Any) -> Sequence[Error]:
+                return target[0](instance)
+
+            self.refs[pointer] = check
+            try:
+                target.append(self.compile(self.resolve(pointer)))
+            except Exception:
+                del self.refs[pointer]
+                raise
+            check = self.refs[pointer] = target[0]
+        return check
+
+    def resolve(self, pointer: str) -> Any:
+        node = self.root
+        for part in filter(None, unquote(pointer).split('/')):
+            part = part.replace('~1', '/').replace('~0', '~')
+            try:
+                node = node[int(part)] if isinstance(node, list) else node[part]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise ValueError(f"Unresolvable $ref: #{pointer}") from None
+        return node
+
+    def compile(self, schema: Any) -> Check:
+        if schema is True or schema == {}:
+            return _always_valid
+        if schema is False:
+            return _never_valid
+        if not isinstance(schema, dict):
+            raise ValueError(f"Invalid schema: {_show(schema)}")
+        if '$ref' in schema:
+            # draft-07: siblings of $ref are ignored
+            return self.ref(schema['$ref'])
+
+        checks = [check for check in (
+            self.compile_type(schema),
+            self.compile_enum(schema),
+            self.compile_string(schema),
+            self.compile_number(schema),
+            self.compile_object(schema),
+            self.compile_array(schema),
+            self.compile_combinators(schema),
+        ) if check is not None]
+        if not checks:
+            return _always_valid
+        if len(checks) == 1:
+            return checks[0]
+
+        def validate(instance: Any) -> Sequence[Error]:
+            errors: Sequence[Error] = _VALID
+            for check in checks:
+                found = check(instance)
+                if found:
+                    errors = [*errors, *found]
+            return errors
+        return validate
+
+    def compile_type(self, schema: Dict[str, Any]) -> Optional[Check]:
+        if 'type' not in schema:
+            return None
+        names = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        tests = [_TYPES[name] for name in names]
+        expected = ', '.join(names)
+
+        def check_type(instance: Any) -> Sequence[Error]:
+            for test in tests:
+                if test(instance):
+                    return _VALID
+            return [((), f"{_show(instance)} is not of type {expected}")]
+        return check_type
+
+    def compile_enum(self, schema: Dict[str, Any]) -> Optional[Check]:
+        if 'const' in schema:
+            const = schema['const']
+
+            def check_const(instance: Any) -> Sequence[Error]:
+                return _VALID if _equal(instance, const) else [((), f"{_show(instance)} is not {_show(const)}")]
+            return check_const
+        if 'enum' not in schema:
+            return None
+        options = schema['enum']
+        if all(isinstance(option, str) for option in options):
+            strings = frozenset(options)
+
+            def check_enum(instance: Any) -> Sequence[Error]:
+                if isinstance(instance, str) and instance in strings:
+                    return _VALID
+                return [((), f"{_show(instance)} is not one of {_show(options)}")]
+            return check_enum
+
+        def check_enum(instance: Any) -> Sequence[Error]:
+            if any(_equal(instance, option) for option in options):
+                return _VALID
+            return [((), f"{_show(instance)} is not one of {_show(options)}")]
+        return check_enum
+
+    def compile_string(self, schema: Dict[str, Any]) -> Optional[Check]:
+        min_length = schema.get('minLength')
+        max_length = schema.get('maxLength')
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+        if min_length is None and max_length is None and pattern is None:
+            return None
+
+        def check_string(instance: Any) -> Sequence[Error]:
+            if not isinstance(instance, str):
+                return _VALID
+            errors = []
+            if min_length is not None and len(instance) < min_length:
+                errors.append(((), f"{_show(instance)} is shorter than {min_length}"))
+            if max_length is not None and len(instance) > max_length:
+                errors.append(((), f"{_show(instance)} is longer than {max_length}"))
+            if pattern is not None and not pattern.search(instance):
+                errors.append(((), f"{_show(instance)} does not match {_show(pattern.pattern)}"))
+            return errors
+        return check_string
+
+    def compile_number(self, schema: Dict[str, Any]) -> Optional[Check]:
+        bounds = [(schema[keyword], test, text) for keyword, test, text in (
+            ('minimum', lambda value, bound: value >= bound, "less than the minimum of"),
+            ('maximum', lambda value, bound: value <= bound, "greater than the maximum of"),
+            ('exclusiveMinimum', lambda value, bound: value > bound, "not greater than"),
+            ('exclusiveMaximum', lambda value, bound: value < bound, "not less than"),
+            ('multipleOf', lambda value, bound: math.isclose(value / bound, round(value / bound)), "not a multiple of"),
+        ) if keyword in schema]
+        if not bounds:
+            return None
+
+        def check_number(instance: Any) -> Sequence[Error]:
+            if not isinstance(instance, (int, float)) or isinstance(instance, bool):
+                return _VALID
+            return [((), f"{instance} is {text} {bound}") for bound, test, text in bounds if not test(instance, bound)]
+        return check_number
+
+    def compile_object(self, schema: Dict[str, Any]) -> Optional[Check]:
+        keywords = ('properties', 'required', 'additionalProperties', 'patternProperties',
+                    'minProperties', 'maxProperties', 'propertyNames', 'dependencies')
+        if not any(keyword in schema for keyword in keywords):
+            return None
+        properties = {name: self.compile(sub) for name, sub in schema.get('properties', {}).items()}
+        patterns = [(re.compile(pattern), self.compile(sub)) for pattern, sub in schema.get('patternProperties', {}).items()]
+        additional = schema.get('additionalProperties', True)
+        additional = None if additional is True else additional if additional is False else self.compile(additional)
+        required = schema.get('required', [])
+        min_properties = schema.get('minProperties')
+        max_properties = schema.get('maxProperties')
+        names = self.compile(schema['propertyNames']) if 'propertyNames' in schema else None
+        dependencies = [
+            (name, dependency if isinstance(dependency, list) else self.compile(dependency))
+            for name, dependency in schema.get('dependencies', {}).items()
+        ]
+
+        def check_object(instance: Any) -> Sequence[Error]:
+            if not isinstance(instance, dict):
+                return _VALID
+            errors = [((), f"missing required property '{name}'") for name in required if name not in instance]
+            for key, value in instance.items():
+                check = properties.get(key)
+                found = check(value) if check is not None else _VALID
+                matched = check is not None
+                for pattern, pattern_check in patterns:
+                    if pattern.search(key):
+                        matched = True
+                        found = [*found, *pattern_check(value)]
+                if not matched:
+                    if additional is False:
+                        errors.append(((), f"unexpected property '{key}'"))
+                    elif additional is not None:
+                        found = additional(value)
+                if found:
+                    errors.extend(_nested(key, found))
+                if names is not None and names(key):
+                    errors.append(((), f"property name {_show(key)} is not allowed"))
+            if min_properties is not None and len(instance) < min_properties:
+                errors.append(((), f"has fewer than {min_properties} properties"))
+            if max_properties is not None and len(instance) > max_properties:
+                errors.append(((), f"has more than {max_properties} properties"))
+            for name, dependency in dependencies:
+                if name in instance:
+                    if isinstance(dependency, list):
+                        errors.extend(((), f"'{other}' is required by '{name}'") for other in dependency if other not in instance)
+                    else:
+                        errors.extend(dependency(instance))
+            return errors
+        return check_object
+
+    def compile_array(self, schema: Dict[str, Any]) -> Optional[Check]:
+        keywords = ('items', 'additionalItems', 'minItems', 'maxItems', 'uniqueItems', 'contains')
+        if not any(keyword in schema for keyword in keywords):
+            return None
+        items = schema.get('items', True)
+        positional = [self.compile(sub) for sub in items] if isinstance(items, list) else None
+        every = None if positional is not None or items is True else self.compile(items)
+        extra = self.compile(schema.get('additionalItems', True)) if positional is not None else None
+        min_items = schema.get('minItems')
+        max_items = schema.get('maxItems')
+        unique = schema.get('uniqueItems', False)
+        contains = self.compile(schema['contains']) if 'contains' in schema else None
+
+        def check_array(instance: Any) -> Sequence[Error]:
+            if not isinstance(instance, list):
+                return _VALID
+            errors = []
+            if every is not None:
+                for index, item in enumerate(instance):
+                    found = every(item)
+                    if found:
+                        errors.extend(_nested(index, found))
+            elif positional is not None:
+                for index, item in enumerate(instance):
+                    found = (positional[index] if index < len(positional) else extra)(item)
+                    if found:
+                        errors.extend(_nested(index, found))
+            if min_items is not None and len(instance) < min_items:
+                errors.append(((), f"has fewer than {min_items} items"))
+            if max_items is not None and len(instance) > max_items:
+                errors.append(((), f"has more than {max_items} items"))
+            if unique and any(_equal(a, b) for i, a in enumerate(instance) for b in instance[i + 1:]):
+                errors.append(((), "has non-unique items"))
+            if contains is not None and all(contains(item) for item in instance):
+                errors.append(((), "does not contain a matching item"))
+            return errors
+        return check_array
+
+    def compile_combinators(self, schema: Dict[str, Any]) -> Optional[Check]:
+        checks = []
+        if 'allOf' in schema:
+            checks.extend(self.compile(sub) for sub in schema['allOf'])
+        if 'anyOf' in schema:
+            checks.append(self.compile_alternatives(schema['anyOf'], exactly_one=False))
+        if 'oneOf' in schema:
+            checks.append(self.compile_alternatives(schema['oneOf'], exactly_one=True))
+        if 'not' in schema:
+            negated = self.compile(schema['not'])
+
+            def check_not(instance: Any) -> Sequence[Error]:
+                return [((), f"{_show(instance)} should not be valid under {_show(schema['not'])}")] if not negated(instance) else _VALID
+            checks.append(check_not)
+        if 'if' in schema:
+            condition = self.compile(schema['if'])
+            then = self.compile(schema.get('then', True))
+            otherwise = self.compile(schema.get('else', True))
+            checks.append(lambda instance: otherwise(instance) if condition(instance) else then(instance))
+        if not checks:
+            return None
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_all(instance: Any) -> Sequence[Error]:
+            errors: Sequence[Error] = _VALID
+            for check in checks:
+                found = check(instance)
+                if found:
+                    errors = [*errors, *found]
+            return errors
+        return check_all
+
+    def compile_alternatives(self, branches: List[Any], exactly_one: bool) -> Check:
+        """
+        Compiles anyOf/oneOf. When branches are tagged by a required string
+        `const` property, an object is only checked against the branches with
+        its tag (plus any untagged ones): every other branch would fail on
+        the tag, so skipping them gives the same result.
+        """
+        checks = [self.compile(branch) for branch in branches]
+        tags = [self.tags(branch) for branch in branches]
+        counts: Dict[str, int] = {}
+        for branch_tags in tags:
+            for name in branch_tags:
+                counts[name] = counts.get(name, 0) + 1
+        tag = max(counts, key=counts.get) if counts else None
+        by_tag: Dict[str, Tuple[Check, ...]] = {}
+        untagged: Tuple[Check, ...] = ()
+        if DISPATCH and tag is not None and counts[tag] > 1:
+            untagged = tuple(check for check, branch_tags in zip(checks, tags) if tag not in branch_tags)
+            for check, branch_tags in zip(checks, tags):
+                if tag in branch_tags:
+                    by_tag[branch_tags[tag]] = by_tag.get(branch_tags[tag], ()) + (check,)
+            by_tag = {value: tagged + untagged for value, tagged in by_tag.items()}
+        all_checks = tuple(checks)
+        keyword = 'oneOf' if exactly_one else 'anyOf'
+
+        def check_alternatives(instance: Any) -> Sequence[Error]:
+            candidates = all_checks
+            tagged = False
+            if by_tag and isinstance(instance, dict):
+                value = instance.get(tag)
+                tagged = isinstance(value, str) and value in by_tag
+                candidates = by_tag[value] if tagged else untagged
+            matches = 0
+            failures = []
+            for check in candidates:
+                found = check(instance)
+                if found:
+                    failures.append(found)
+                else:
+                    matches += 1
+                    if not exactly_one:
+                        return _VALID
+            if matches == 1 or (matches and not exactly_one):
+                return _VALID
+            if matches:
+                return [((), f"{_show(instance)} matches more than one {keyword} branch")]
+            if len(failures) == 1 or tagged:
+                # With a known tag, the branch for that tag says what is wrong
+                return failures[0]
+            if by_tag and isinstance(instance, dict) and not candidates:
+                return [((), f"{_show(instance.get(tag))} is not a known '{tag}'")]
+            return [((), f"{_show(instance)} does not match any {keyword} branch")]
+        return check_alternatives
+
+    def tags(self, schema: Any) -> Dict[str, str]:
+        """Required properties with a string `const`, looking through `$ref` and `allOf`."""
+        if not isinstance(schema, dict):
+            return {}
+        if '$ref' in schema and not schema['$ref'].partition('#')[0]:
+            return self.tags(self.resolve(schema['$ref'].partition('#')[2]))
+        found = {
+            name: sub['const'] for name, sub in schema.get('properties', {}).items()
+            if name in schema.get('required', ()) and isinstance(sub, dict) and isinstance(sub.get('const'), str)
+        }
+        for sub in schema.get('allOf', ()):
+            found.update(self.tags(sub))
+        return found
@@ -1,14 +1,191 @@
-def estimate_cost(flow):
-    cost_table = {
-        "get": 1,
-        "set": 2,
-        "expr": 3,
-        "assert": 2,
-        "log": 1,
-        "return": 1
-    }
-    total = 0
-    for step in flow["steps"]:
-        for op in step:
-            total += cost_table.get(op, 0)
-    return total
+import math
+from typing import NamedTuple
+
+from analysis.visitor import AnalysisPass, analyze_flow, register_pass
+
+# Expected iterations of a loop whose source size is not declared anywhere.
+DEFAULT_LOOP_SIZE = 10
+
+# Iteration budget of a `while` step without its own `max_iterations`, as
+# enforced by the interpreter (interpreter.compiler.WHILE_MAX_ITERATIONS).
+WHILE_MAX_ITERATIONS = 10000
+
+# Per-backend op weights; "iteration" is the overhead of one loop iteration.
+#   default:  the original flat table, in abstract units
+#   solidity: rough gas (storage reads/writes dominate, arithmetic is cheap)
+#   python:   rough nanoseconds in the reference interpreter (see benchmarks/bench_cost_model.py)
+WEIGHTS = {
+    "default": {
+        "get": 1, "set": 2, "expr": 3, "assert": 2, "log": 1, "return": 1,
+    },
+    "solidity": {
+        "get": 200, "set": 5000, "let": 3, "value": 3, "expr": 0,
+        "add": 3, "subtract": 3, "multiply": 5, "divide": 5, "mod": 5, "neg": 3,
+        "compare": 3, "and": 3, "or": 3, "not": 3, "length": 100, "in": 200,
+        "call": 2600, "assert": 10, "if": 10, "log": 750, "return": 10,
+        "iteration": 30,
+    },
+    "python": {
+        "get": 140, "set": 400, "let": 400, "value": 45, "expr": 0,
+        "add": 190, "subtract": 190, "multiply": 190, "divide": 190, "mod": 190, "neg": 120,
+        "compare": 190, "and": 120, "or": 120, "not": 120, "length": 150, "in": 190,
+        "call": 3000, "assert": 190, "if": 120, "log": 6000, "return": 60, "try": 130,
+        "iteration": 280,
+    },
+}
+
+class Bounds(NamedTuple):
+    min: float
+    max: float
+    expected: float
+
+class CostEstimate(NamedTuple):
+    """Flow total and per top-level step cost bounds, in the backend's weight units."""
+    total: Bounds
+    steps: list
+
+# A symbolic cost is (counts, parts): op counts outside any loop or branch, as
+# sorted (op, count) pairs, plus a tuple of
+#   ("loop", source, body_cost)        body runs once per element of source
+#   ("branch", p, cost_a, cost_b)      cost_a with probability p, else cost_b
+# It depends only on the subtree, so it can be cached; sizes and weights are
+# applied when the flow is evaluated.
+EMPTY = ((), ())
+
+def _seq(costs, ops=()):
+    counts = {}
+    parts = []
+    for op in ops:
+        counts[op] = counts.get(op, 0) + 1
+    for cost_counts, cost_parts in costs:
+        for op, n in cost_counts:
+            counts[op] = counts.get(op, 0) + n
+        parts.extend(cost_parts)
+    return tuple(sorted(counts.items())), tuple(parts)
+
+class LiteralSource(NamedTuple):
+    """A loop over a `{"value": [...]}` literal, whose length is known statically."""
+    size: int
+
+class IterationCap(NamedTuple):
+    """A `while` loop, which runs at most `limit` times."""
+    limit: int
+
+def _source_key(source):
+    """Hashable form of a loop source: a name, a path tuple, a LiteralSource or an IterationCap."""
+    if isinstance(source, list):
+        return tuple(source)
+    if isinstance(source, dict):
+        value = source.get("value")
+        return LiteralSource(len(value)) if isinstance(value, (list, str, dict)) else None
+    return source
+
+class CostPass(AnalysisPass):
+    name = "cost"
+
+    def visit(self, node, ops, children, is_step):
+        def fields(*names):
+            return [result for field, result in children if field in names]
+
+        def other(*names):
+            return [result for field, result in children if field not in names]
+
+        loop_op = "forEach" if "forEach" in ops else "map" if "map" in ops else None
+        if is_step and loop_op:
+            body = _seq(fields("body"))
+            counts, parts = _seq(other("body"), ops)
+            return counts, parts + (("loop", _source_key(node[loop_op].get("source")), body),)
+        if is_step and "while" in ops:
+            body = _seq(fields("body", "condition"))
+            counts, parts = _seq(other("body", "condition"), ops)
+            limit = node["while"].get("max_iterations", WHILE_MAX_ITERATIONS)
+            return counts, parts + (("loop", IterationCap(limit), body),)
+        if is_step and "if" in ops:
+            branch = ("branch", 0.5, _seq(fields("then")), _seq(fields("else")))
+            counts, parts = _seq(other("then", "else"), ops)
+            return counts, parts + (branch,)
+        if is_step and "try" in ops:
+            # The handler only runs on failure: free in the best and expected case
+            branch = ("branch", 0.0, _seq(fields("catch")), EMPTY)
+            counts, parts = _seq(other("catch"), ops)
+            return counts, parts + (branch,)
+        return _seq([result for _, result in children], ops)
+
+    def combine(self, results):
+        return _seq(results)
+
+register_pass(CostPass())
+
+def evaluate_cost(cost, weights, sizes):
+    """
+    Evaluates a symbolic cost to Bounds.
+
+    Args:
+        cost: Symbolic cost from CostPass.
+        weights: Op -> weight map (e.g., WEIGHTS["solidity"]).
+        sizes: Callable mapping a loop source to Bounds on its length.
+    """
+    counts, parts = cost
+    base = sum(weights.get(op, 0) * n for op, n in counts)
+    low = high = expected = base
+    for part in parts:
+        if part[0] == "loop":
+            n = sizes(part[1])
+            body = evaluate_cost(part[2], weights, sizes)
+            per_iteration = weights.get("iteration", 0)
+            low += n.min * (body.min + per_iteration)
+            high += _times(n.max, body.max + per_iteration)
+            expected += n.expected * (body.expected + per_iteration)
+        else:
+            _, p, a, b = part
+            a = evaluate_cost(a, weights, sizes)
+            b = evaluate_cost(b, weights, sizes)
+            low += min(a.min, b.min)
+            high += max(a.max, b.max)
+            expected += p * a.expected + (1 - p) * b.expected
+    return Bounds(low, high, expected)
+
+def _times(n, weight):
+    return 0 if weight == 0 else n * weight
+
+def loop_sizes(flow):
+    """
+    Returns a resolver from loop sources to Bounds on their length. An array
+    in the flow's initial `context` or a literal source has an exact size; a
+    schema input or context declaration may bound it with minItems/maxItems,
+    and a `while` loop is bounded by its iteration budget. Anything else is
+    unbounded with DEFAULT_LOOP_SIZE expected iterations.
+    """
+    initial = flow.get("context", {})
+    schema = flow.get("schema", {})
+    declared = {**schema.get("context", {}), **schema.get("inputs", {})}
+
+    def sizes(source):
+        if isinstance(source, LiteralSource):
+            return Bounds(source.size, source.size, source.size)
+        if isinstance(source, IterationCap):
+            return Bounds(0, source.limit, min(source.limit, DEFAULT_LOOP_SIZE))
+        if not isinstance(source, (str, tuple)):
+            return Bounds(0, math.inf, DEFAULT_LOOP_SIZE)
+        path = source if isinstance(source, tuple) else (source,)
+        value = initial
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, list):
+            return Bounds(len(value), len(value), len(value))
+        decl = declared.get(path[0]) if len(path) == 1 else None
+        if isinstance(decl, dict) and ("minItems" in decl or "maxItems" in decl):
+            low = decl.get("minItems", 0)
+            high = decl.get("maxItems", math.inf)
+            return Bounds(low, high, (low + high) / 2 if high != math.inf else max(low, DEFAULT_LOOP_SIZE))
+        return Bounds(0, math.inf, DEFAULT_LOOP_SIZE)
+
+    return sizes
+
+def estimate_cost(flow, analysis=None, backend="default"):
+    weights = WEIGHTS[backend]
+    sizes = loop_sizes(flow)
+    analysis = analysis or analyze_flow(flow)
+    steps = [evaluate_cost(results["cost"], weights, sizes) for results in analysis.steps]
+    total = Bounds(*(sum(values) for values in zip(*steps))) if steps else Bounds(0, 0, 0)
+    return CostEstimate(total, steps)
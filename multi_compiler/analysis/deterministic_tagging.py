@@ -1,10 +1,20 @@
-def tag_determinism(flow):
+from analysis.visitor import AnalysisPass, analyze_flow, register_pass
+
+class DeterminismPass(AnalysisPass):
+    name = "deterministic"
     nondeterministic_ops = {"random", "timestamp", "external_call"}
 
-    for step in flow["steps"]:
-        for op in step:
-            if op in nondeterministic_ops:
-                step["deterministic"] = False
-            else:
-                step["deterministic"] = True
+    def visit(self, node, ops, children, is_step):
+        return self.nondeterministic_ops.isdisjoint(ops) and all(result for _, result in children)
+
+    def combine(self, results):
+        return all(results)
+
+register_pass(DeterminismPass())
+
+def tag_determinism(flow, analysis=None):
+    # A step is deterministic only if nothing nested inside it is non-deterministic
+    analysis = analysis or analyze_flow(flow)
+    for step, results in zip(flow["steps"], analysis.steps):
+        step["deterministic"] = results["deterministic"]
     return flow
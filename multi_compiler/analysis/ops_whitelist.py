@@ -1,14 +1,33 @@
+from analysis.visitor import AnalysisPass, analyze_flow, register_pass
+
 BACKEND_OPS = {
     "solidity": {"get", "set", "expr", "compare", "assert", "return"},
     "python": {"get", "set", "expr", "compare", "assert", "return", "log"},
     "javascript": {"get", "set", "expr", "compare", "assert", "return", "log"},
 }
 
-def validate_ops(flow):
-    used_ops = set()
-    for step in flow["steps"]:
-        used_ops.update(step.keys())
+# Expression ops generated for every backend by compiler/base.get_expr_code
+EXPR_OPS = {
+    "get", "value", "compare", "call", "length", "add", "subtract", "multiply",
+    "divide", "mod", "and", "or", "not", "in", "neg",
+}
+
+class OpsPass(AnalysisPass):
+    name = "ops"
+
+    def visit(self, node, ops, children, is_step):
+        if not children:
+            return ops
+        return ops.union(*(result for _, result in children))
+
+    def combine(self, results):
+        return frozenset().union(*results)
+
+register_pass(OpsPass())
+
+def validate_ops(flow, analysis=None):
+    used_ops = (analysis or analyze_flow(flow))["ops"]
     for backend, allowed in BACKEND_OPS.items():
-        if not used_ops.issubset(allowed):
-            disallowed = used_ops - allowed
+        if not used_ops.issubset(allowed | EXPR_OPS):
+            disallowed = used_ops - allowed - EXPR_OPS
             raise Exception(f"{backend} does not allow: {disallowed}")
@@ -0,0 +1,203 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+# Fields of a step's argument that hold nested steps (a step or a list of
+# steps; parallel "branches" is a list of such lists).
+STEP_FIELDS = {"then", "else", "body", "catch", "branches"}
+
+# Ops whose argument is a dict of named fields rather than an expression.
+ARG_OPS = {
+    "set", "let", "map", "forEach", "try", "if", "while", "parallel",
+    "assert", "log", "print", "call", "compare", "in",
+}
+
+# Fields whose value is a dict of named expressions (e.g., call.args).
+NAMED_FIELDS = {"args"}
+
+# Ops whose argument is data, not a nested expression.
+LEAF_OPS = {"get", "value"}
+
+# Step keys that annotate a step rather than name an op.
+STEP_METADATA = {"id", "deterministic", "schema", "timeout", "on_error", "cache"}
+
+# Annotations written by the analyses themselves; excluded from subtree keys.
+ANNOTATIONS = {"deterministic"}
+
+class AnalysisPass:
+    """
+    A bottom-up analysis over the step/expression tree. The Analyzer calls
+    `visit` once per op node (a step or an expression dict) with the node, its
+    ops, and its children's results as (field, result) pairs, where field is
+    the argument field the child came from (e.g., "body", "condition") or
+    None for an op's direct argument. `combine` folds the top-level step
+    results into the flow's result. Results must depend only on the subtree
+    and must not be mutated once returned, since they are cached and shared
+    between structurally equal subtrees.
+    """
+    name = None
+
+    def visit(self, node: Dict[str, Any], ops: FrozenSet[str], children: List[Tuple[Any, Any]], is_step: bool) -> Any:
+        raise NotImplementedError
+
+    def combine(self, results: List[Any]) -> Any:
+        raise NotImplementedError
+
+class Analysis:
+    """Results of running every pass over a flow: `results[name]` for the flow, `steps[i][name]` per top-level step."""
+    def __init__(self, results: Dict[str, Any], steps: List[Dict[str, Any]]):
+        self.results = results
+        self.steps = steps
+
+    def __getitem__(self, name: str) -> Any:
+        return self.results[name]
+
+class Analyzer:
+    """
+    Runs all registered passes in a single walk of a flow. Each step subtree's
+    results are cached under a structural hash built bottom-up from its
+    children's hashes (see `_subtree_key`), so a step seen
+    before (in this flow or an earlier one) is not walked again, and
+    re-analyzing an edited flow only walks the steps that changed.
+
+    Args:
+        passes: AnalysisPass instances; their names key the results.
+        maxsize: Maximum number of cached step subtrees (LRU).
+    """
+    def __init__(self, passes: Iterable[AnalysisPass], maxsize: int = 65536):
+        self.passes = tuple(passes)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, Tuple[Any, ...]]" = OrderedDict()
+        # id -> subtree key for the flow being analyzed
+        self._keys: Dict[int, str] = {}
+
+    def analyze(self, flow: Dict[str, Any]) -> Analysis:
+        try:
+            per_step = [self._step(step) for step in flow["steps"]]
+        finally:
+            self._keys = {}
+        results = {
+            p.name: p.combine([step_results[i] for step_results in per_step])
+            for i, p in enumerate(self.passes)
+        }
+        names = [p.name for p in self.passes]
+        return Analysis(results, [dict(zip(names, step_results)) for step_results in per_step])
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+    def _step(self, step: Dict[str, Any]) -> Tuple[Any, ...]:
+        key = _subtree_key(step, self._keys)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        ops = frozenset(k for k in step if k not in STEP_METADATA)
+        children = []
+        for op, arg in step.items():
+            if op in STEP_METADATA:
+                continue
+            if op in ARG_OPS and isinstance(arg, dict):
+                for field, value in arg.items():
+                    if field in STEP_FIELDS:
+                        for substep in _substeps(value):
+                            children.append((field, self._step(substep)))
+                    else:
+                        self._field(field, value, children)
+            elif op not in LEAF_OPS:
+                self._value(None, arg, children)
+        result = self._visit(step, ops, children, True)
+
+        self._cache[key] = result
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return result
+
+    def _expr(self, expr: Dict[str, Any]) -> Tuple[Any, ...]:
+        ops = frozenset(expr)
+        children = []
+        for op, arg in expr.items():
+            if op in ARG_OPS and isinstance(arg, dict):
+                for field, value in arg.items():
+                    self._field(field, value, children)
+            elif op not in LEAF_OPS:
+                self._value(None, arg, children)
+        return self._visit(expr, ops, children, False)
+
+    def _field(self, field: str, value: Any, children: List[Tuple[Any, Tuple[Any, ...]]]) -> None:
+        if field in NAMED_FIELDS and isinstance(value, dict):
+            for item in value.values():
+                self._value(field, item, children)
+        else:
+            self._value(field, value, children)
+
+    def _value(self, field: Any, value: Any, children: List[Tuple[Any, Tuple[Any, ...]]]) -> None:
+        if isinstance(value, dict):
+            children.append((field, self._expr(value)))
+        elif isinstance(value, list):
+            for item in value:
+                self._value(field, item, children)
+
+    def _visit(self, node: Dict[str, Any], ops: FrozenSet[str], children: List[Tuple[Any, Tuple[Any, ...]]],
+               is_step: bool) -> Tuple[Any, ...]:
+        return tuple(
+            p.visit(node, ops, [(field, results[i]) for field, results in children], is_step)
+            for i, p in enumerate(self.passes)
+        )
+
+def _substeps(value: Any) -> Iterable[Dict[str, Any]]:
+    if isinstance(value, list):
+        for item in value:
+            yield from _substeps(item)
+    else:
+        yield value
+
+def _subtree_key(root: Any, keys: Dict[int, str]) -> str:
+    """
+    Returns a canonical hash of a step, like `utils.structural_key` but
+    ignoring ANNOTATIONS. Each container's key is built from its children's
+    fixed-size keys and recorded in `keys` (by object id), so keying a step
+    after its ancestors costs nothing and a flow is hashed in O(nodes). The
+    walk uses an explicit stack, so deeply nested steps cannot overflow it.
+    """
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in keys:
+            continue
+        if not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in (node.values() if isinstance(node, dict) else node)
+                         if isinstance(child, (dict, list)))
+            continue
+        if isinstance(node, dict):
+            body = "{" + ",".join(f"{k!r}:{_node_key(v, keys)}" for k, v in sorted(node.items())
+                                  if k not in ANNOTATIONS) + "}"
+        else:
+            body = "[" + ",".join(_node_key(v, keys) for v in node) + "]"
+        keys[id(node)] = hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+    return keys[id(root)]
+
+def _node_key(value: Any, keys: Dict[int, str]) -> str:
+    return keys[id(value)] if isinstance(value, (dict, list)) else repr(value)
+
+_analyzer = Analyzer(())
+
+def register_pass(analysis_pass: AnalysisPass) -> None:
+    """Adds a pass to the shared analyzer used by analyze_flow (clearing its cache)."""
+    global _analyzer
+    passes = [p for p in _analyzer.passes if p.name != analysis_pass.name] + [analysis_pass]
+    _analyzer = Analyzer(passes, _analyzer.maxsize)
+
+def analyze_flow(flow: Dict[str, Any]) -> Analysis:
+    """Runs every registered pass over `flow` in one walk."""
+    return _analyzer.analyze(flow)
+
+def get_analyzer() -> Analyzer:
+    return _analyzer
@@ -1,11 +1,11 @@
 import logging
 from typing import Any, Dict, List, Tuple, Union
-from functools import lru_cache
+from utils import memoize_codegen
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-@lru_cache(maxsize=1000)
+@memoize_codegen(maxsize=4096)
 def get_expr_code(expr: Any, lang: str) -> Tuple[str, str]:
     """
     Recursively generates code for an A+ JSONFlow expression in the target language and returns its type.
@@ -218,6 +218,13 @@ def infer_nested_type(base_type: str, path: List[Any]) -> str:
         return "integer"  # Assume array elements are integers
     return base_type  # Fallback to base type
 
+def schema_type(decl: Union[str, Dict[str, Any]]) -> str:
+    """
+    Returns the type of a schema input/context declaration, which is either a
+    bare type name or a dict with a "type" key (e.g., {"type": "integer", "min": 1}).
+    """
+    return decl["type"] if isinstance(decl, dict) else decl
+
 def map_type(json_type: str, lang: str) -> str:
     """
     Maps an A+ JSONFlow type to a target language type.
@@ -1,16 +1,18 @@
 import logging
 from typing import Dict, List, Any
-from base import get_expr_code, map_type
+from base import get_expr_code, map_type, schema_type
+from utils import StepCache
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def generate_javascript_function(flow: Dict[str, Any]) -> str:
+def generate_javascript_function(flow: Dict[str, Any], step_cache: StepCache = None) -> str:
     """
     Generates an async JavaScript function from an A+ JSONFlow definition.
 
     Args:
         flow: JSONFlow definition with function, schema, context, and steps.
+        step_cache: Optional StepCache; steps whose code is cached are not regenerated.
 
     Returns:
         str: Generated JavaScript code.
@@ -23,11 +25,11 @@ def generate_javascript_function(flow: Dict[str, Any]) -> str:
     lines = [f"async function {func_name}({', '.join(inputs.keys())}) {{"]
 
     for var, json_type in context.items():
-        initial_value = {"string": "''", "number": "0", "boolean": "false", "object": "{}", "array": "[]"}.get(json_type, "null")
+        initial_value = {"string": "''", "number": "0", "boolean": "false", "object": "{}", "array": "[]"}.get(schema_type(json_type), "null")
         lines.append(f"    let {var} = {initial_value};")
 
     for step in steps:
-        lines.extend(generate_step(step))
+        lines.extend(step_cache.emit("javascript", step, generate_step) if step_cache else generate_step(step))
 
     lines.append("    return undefined;")
     lines.append("}")
@@ -50,8 +52,8 @@ def generate_step(step: Dict[str, Any], indent: int = 1) -> List[str]:
         lines.append(f"{pad}const {target} = await Promise.all({source}.map(async ({alias}) => {{")
         for substep in step["map"]["body"]:
             lines.extend(generate_step(substep, indent + 1))
-        lines.append(f"{pad}    return {alias};"))
-        lines.append(f"{pad}}));")
+        lines.append(f"{pad}    return {alias};")
+        lines.append(f"{pad}}}));")
     elif "call" in step:
         func = step["call"]["function"]
         args = step["call"]["args"]
@@ -61,3 +63,6 @@ def generate_step(step: Dict[str, Any], indent: int = 1) -> List[str]:
         lines.append(f"{pad}const {target} = {async_prefix}{func}({', '.join(arg_codes)});")
     # Other steps (if, forEach, try, etc.) remain as before
     return lines
+
+
+compile_to_javascript = generate_javascript_function
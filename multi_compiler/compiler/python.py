@@ -1,16 +1,22 @@
+import copy
+import keyword
 import logging
-from typing import Dict, List, Any
-from base import get_expr_code, map_type
+import math
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from base import get_expr_code, map_type, schema_type
+from utils import StepCache, structural_key
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def generate_python_function(flow: Dict[str, Any]) -> str:
+def generate_python_function(flow: Dict[str, Any], step_cache: StepCache = None) -> str:
     """
     Generates an async Python function from an A+ JSONFlow definition.
 
     Args:
         flow: JSONFlow definition with function, schema, context, and steps.
+        step_cache: Optional StepCache; steps whose code is cached are not regenerated.
 
     Returns:
         str: Generated Python code.
@@ -21,16 +27,15 @@ def generate_python_function(flow: Dict[str, Any]) -> str:
     steps = flow["steps"]
 
     lines = ["from typing import Dict, List, Any", "import asyncio", ""]
-    lines.append(f"async def {func_name}({', '.join(f'{var}: {map_type(json_type, \"python\")}' for var, json_type in inputs.items())}) -> int:")
+    params = ", ".join(f"{var}: {map_type(schema_type(json_type), 'python')}" for var, json_type in inputs.items())
+    lines.append(f"async def {func_name}({params}) -> Any:")
 
     for var, json_type in context.items():
-        initial_value = {"string": "''", "integer": "0", "number": "0.0", "boolean": "False", "object": "{}", "array": "[]"}.get(json_type, "None")
-        lines.append(f"    {var}: {map_type(json_type, 'python')} = {initial_value}")
+        initial_value = {"string": "''", "integer": "0", "number": "0.0", "boolean": "False", "object": "{}", "array": "[]"}.get(schema_type(json_type), "None")
+        lines.append(f"    {var}: {map_type(schema_type(json_type), 'python')} = {initial_value}")
 
     for step in steps:
-        lines.extend(generate_step(step))
-
-    lines.append("    return balance if 'balance' in locals() else 0")
+        lines.extend(step_cache.emit("python", step, generate_step) if step_cache else generate_step(step))
 
     return "\n".join(lines)
 
@@ -41,15 +46,16 @@ def generate_step(step: Dict[str, Any], indent: int = 1) -> List[str]:
     if "set" in step:
         target = step["set"]["target"]
         value, value_type = get_expr_code(step["set"]["value"], "python")
-        is_array = step.get("schema", {}).get("context", {}).get(target) == "array"
-        lines.append(f"{pad}{target}.append({value})" if is_array else f"{pad}{target} = {value}")
+        lines.append(f"{pad}{target} = {value}")
     elif "map" in step:
         source = step["map"]["source"]
         alias = step["map"]["as"]
         target = step["map"]["target"]
-        lines.append(f"{pad}{target} = [({alias} async for {alias} in {source}) for {alias} in {source}]")
+        lines.append(f"{pad}{target} = []")
+        lines.append(f"{pad}for {alias} in {source}:")
         for substep in step["map"]["body"]:
             lines.extend(generate_step(substep, indent + 1))
+        lines.append(f"{pad}    {target}.append({alias})")
     elif "call" in step:
         func = step["call"]["function"]
         args = step["call"]["args"]
@@ -57,5 +63,443 @@ def generate_step(step: Dict[str, Any], indent: int = 1) -> List[str]:
         async_prefix = "await " if step["call"].get("async", False) else ""
         arg_codes = [get_expr_code(arg, "python")[0] for arg in args.values()]
         lines.append(f"{pad}{target} = {async_prefix}{func}({', '.join(arg_codes)})")
+    elif "return" in step:
+        value, _ = get_expr_code(step["return"], "python")
+        lines.append(f"{pad}return {value}")
     # Other steps similar to javascript.py
     return lines
+
+
+compile_to_python = generate_python_function
+
+# Runnable mode: a flow compiled to a plain Python function with the
+# interpreter's semantics, run as native bytecode instead of by run_steps.
+
+PROGRAM_CACHE_SIZE = 256
+
+_programs: "OrderedDict[str, Callable[[Dict[str, Any]], Any]]" = OrderedDict()
+# id(flow) -> (flow, a copy of flow, function) for the flows loaded most recently
+_loaded: "OrderedDict[int, Tuple[Any, Any, Callable[[Dict[str, Any]], Any]]]" = OrderedDict()
+_runtime: Optional[Dict[str, Any]] = None
+
+# Mirror the interpreter's operator tables, in the same lookup order.
+_COMPARE_OPS = {">": ">", "<": "<", "===": "==", "!==": "!=", ">=": ">=", "<=": "<=", "==": "==", "!=": "!="}
+_ARITHMETIC_OPS = {"subtract": " - ", "multiply": " * ", "divide": " / ", "mod": " % "}
+_UNARY_OPS = {"not": "(not {})", "neg": "(-{})", "length": "len({})"}
+
+_STEP_KINDS = ("let", "set", "map", "forEach", "try", "if", "while", "parallel", "assert", "log", "return")
+
+def generate_python_program(flow: Dict[str, Any]) -> str:
+    """
+    Generates a runnable, synchronous Python function from a JSONFlow definition.
+
+    The function takes the flow's variables as a dict, returns the value of the
+    `return` step reached (if any) and writes the variables the flow assigns
+    back into the dict. Variables live in locals while it runs. Steps behave as
+    in the interpreter; async calls and maps, streaming or process-pool maps
+    and `parallel` steps need the event loop and are rejected.
+
+    Args:
+        flow: JSONFlow definition with function, schema and steps.
+
+    Returns:
+        str: Generated Python code, run by `load_python_function`.
+
+    Raises:
+        ValueError: If the flow uses a step that cannot run synchronously.
+    """
+    return _ProgramWriter(flow).write()
+
+def load_python_function(flow: Dict[str, Any]) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Compiles a flow with `generate_python_program` and executes the code into a
+    function object. Functions are cached by a structural hash of the flow,
+    so repeat loads of the same flow skip code generation and compilation;
+    reloading the same flow object, unchanged, skips hashing it as well.
+
+    Args:
+        flow: JSONFlow definition with function, schema and steps.
+
+    Returns:
+        Callable: `fn(variables)`, e.g. `fn({**flow.get("context", {}), **inputs})`.
+    """
+    entry = _loaded.get(id(flow))
+    # Compared with a copy taken when it was loaded, to notice in-place edits
+    if entry is not None and entry[0] is flow and entry[1] == flow:
+        _loaded.move_to_end(id(flow))
+        return entry[2]
+    writer = _ProgramWriter(flow)
+    key = structural_key([writer.name, sorted(writer.arrays), flow["steps"]])
+    fn = _programs.get(key)
+    if fn is not None:
+        _programs.move_to_end(key)
+    else:
+        source = writer.write()
+        namespace = dict(_runtime_namespace())
+        exec(compile(source, f"<jsonflow {writer.name}>", "exec"), namespace)
+        fn = _programs[key] = namespace[writer.name]
+        if len(_programs) > PROGRAM_CACHE_SIZE:
+            _programs.popitem(last=False)
+        log.debug("Compiled flow %s to a Python function", writer.name)
+    # The entry holds the flow itself, so its id cannot be reused while cached
+    _loaded[id(flow)] = (flow, copy.deepcopy(flow), fn)
+    if len(_loaded) > PROGRAM_CACHE_SIZE:
+        _loaded.popitem(last=False)
+    return fn
+
+def clear_program_cache() -> None:
+    _programs.clear()
+    _loaded.clear()
+
+def _runtime_namespace() -> Dict[str, Any]:
+    """Helpers the generated code calls; the interpreter is imported on first use."""
+    global _runtime
+    if _runtime is not None:
+        return _runtime
+    from interpreter.call_cache import MISSING, call_cache, call_key
+    from interpreter.compiler import WHILE_MAX_ITERATIONS, flow_log
+    from interpreter.context import UNSET, infer_type
+    from interpreter.functions import placeholder, registry
+
+    def unset(name: Any) -> Any:
+        raise KeyError(name)
+
+    def fail(error: Exception) -> Any:
+        raise error
+
+    def call(name: str, arg_names: tuple, args: tuple, return_type: Optional[str]) -> tuple:
+        kwargs = dict(zip(arg_names, args))
+        function = registry.lookup(name)
+        if function is None:
+            return placeholder(name, kwargs), "string"
+        value = function.call(kwargs)
+        return value, return_type or infer_type(value)
+
+    def cached_call(name: str, arg_names: tuple, args: tuple, return_type: Optional[str], ttl: float) -> tuple:
+        # Entries are shared with the interpreter, so they hold (value, type) as there
+        key = call_key(name, dict(zip(arg_names, args)))
+        cached = call_cache.get(key)
+        if cached is MISSING:
+            cached = call(name, arg_names, args, return_type)
+            call_cache.put(key, cached, ttl)
+        return cached
+
+    def error(e: Exception, step: int) -> Dict[str, Any]:
+        return {"message": str(e), "step": step, "details": {"type": type(e).__name__}}
+
+    def exhausted(budget: Any) -> RuntimeError:
+        return RuntimeError(f"while loop exceeded {budget} iterations")
+
+    _runtime = {
+        "_UNSET": UNSET, "_unset": unset, "_fail": fail, "_call": call, "_cached_call": cached_call,
+        "_error": error, "_exhausted": exhausted, "_flow_log": flow_log,
+        "_WHILE_MAX_ITERATIONS": WHILE_MAX_ITERATIONS,
+    }
+    return _runtime
+
+def _source(value: Any) -> str:
+    """Python source for a JSON value."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return f"float('{value}')"
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_source(key)}: {_source(item)}" for key, item in value.items()) + "}"
+    if isinstance(value, list):
+        return "[" + ", ".join(_source(item) for item in value) + "]"
+    return repr(value)
+
+def _as_steps(steps: Any) -> List[Dict[str, Any]]:
+    return steps if isinstance(steps, list) else [steps]
+
+class _ProgramWriter:
+    """
+    Writes the runnable function of one flow. Each variable becomes a local
+    (`v_<name>`) loaded from the variables dict; reads check it is set unless
+    every path to the read has already assigned it.
+    """
+    def __init__(self, flow: Dict[str, Any]):
+        name = flow.get("function")
+        valid = isinstance(name, str) and name.isidentifier() and not keyword.iskeyword(name)
+        self.name = name if valid and not name.startswith("_") else "flow"
+        self.steps = flow["steps"]
+        context = flow.get("schema", {}).get("context", {})
+        self.arrays = {var for var, decl in context.items()
+                       if (decl.get("type") if isinstance(decl, dict) else decl) == "array"}
+        self.lines: List[str] = []
+        self.locals: Dict[Any, str] = {}
+        self.assigned: Dict[Any, None] = {}
+        self.known = set()
+        self.constants: List[str] = []
+        self.temps = 0
+
+    def write(self) -> str:
+        self.block(self.steps, 2)
+        body = self.lines
+        lines = [f"_K{index} = {value}" for index, value in enumerate(self.constants)]
+        lines.append(f"def {self.name}(variables):")
+        lines.extend(f"    {local} = variables.get({_source(var)}, _UNSET)" for var, local in self.locals.items())
+        if not self.assigned:
+            lines.extend(line[4:] for line in body)
+            return "\n".join(lines) + "\n"
+        lines.append("    try:")
+        lines.extend(body)
+        lines.append("    finally:")
+        for var in self.assigned:
+            local = self.locals[var]
+            lines.append(f"        if {local} is not _UNSET:")
+            lines.append(f"            variables[{_source(var)}] = {local}")
+        return "\n".join(lines) + "\n"
+
+    def emit(self, depth: int, line: str) -> None:
+        self.lines.append("    " * depth + line)
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    def local(self, var: Any) -> str:
+        local = self.locals.get(var)
+        if local is None:
+            valid = isinstance(var, str) and var.isidentifier()
+            local = self.locals[var] = f"v_{var}" if valid else f"v{len(self.locals)}"
+        return local
+
+    def literal(self, value: Any) -> str:
+        # Container literals are built once, as the interpreter's are
+        if isinstance(value, (dict, list)):
+            self.constants.append(_source(value))
+            return f"_K{len(self.constants) - 1}"
+        return _source(value)
+
+    # Variables
+
+    def read(self, var: Any) -> str:
+        local = self.local(var)
+        if var in self.known:
+            return local
+        # A read that succeeds proves the variable set for what runs after it
+        self.known.add(var)
+        return f"({local} if {local} is not _UNSET else _unset({_source(var)}))"
+
+    def load(self, path: Any) -> str:
+        if isinstance(path, list):
+            return self.read(path[0]) + "".join(f"[{self.literal(key)}]" for key in path[1:])
+        return self.read(path)
+
+    def store(self, path: Any, value: str, depth: int) -> None:
+        if isinstance(path, list):
+            # The value is computed before a missing head is created
+            head = self.local(path[0])
+            temp = self.temp()
+            self.emit(depth, f"{temp} = {value}")
+            if path[0] not in self.known:
+                self.emit(depth, f"if {head} is _UNSET:")
+                self.emit(depth + 1, f"{head} = {{}}")
+            ref = head + "".join(f".setdefault({self.literal(key)}, {{}})" for key in path[1:-1])
+            self.emit(depth, f"{ref}[{self.literal(path[-1])}] = {temp}")
+            var = path[0]
+        else:
+            local = self.local(path)
+            if path in self.arrays:
+                temp = self.temp()
+                self.emit(depth, f"{temp} = {value}")
+                self.emit(depth, f"if isinstance({local}, list):")
+                self.emit(depth + 1, f"{local}.append({temp})")
+                self.emit(depth, "else:")
+                self.emit(depth + 1, f"{local} = {temp}")
+            else:
+                self.emit(depth, f"{local} = {value}")
+            var = path
+        self.assigned[var] = None
+        self.known.add(var)
+
+    # Expressions
+
+    def expr(self, expr: Any) -> str:
+        if isinstance(expr, dict):
+            if "get" in expr:
+                return self.load(expr["get"])
+            if "value" in expr:
+                return self.literal(expr["value"])
+            if "call" in expr:
+                return self.call(expr["call"])
+            if "expr" in expr:
+                return self.expr(expr["expr"])
+            if "add" in expr:
+                return "(" + " + ".join(["0"] + [self.expr(operand) for operand in expr["add"]]) + ")"
+            for op, symbol in _ARITHMETIC_OPS.items():
+                if op in expr:
+                    first, *rest = expr[op]
+                    return "(" + symbol.join(self.expr(operand) for operand in [first, *rest]) + ")"
+            if "and" in expr or "or" in expr:
+                is_and = "and" in expr
+                if not expr["and" if is_and else "or"]:
+                    return repr(is_and)
+                first, *rest = expr["and" if is_and else "or"]
+                operands = [f"bool({self.expr(first)})"]
+                # Later operands may be skipped, so their reads prove nothing
+                known = set(self.known)
+                operands.extend(f"bool({self.expr(operand)})" for operand in rest)
+                self.known = known
+                return "(" + (" and " if is_and else " or ").join(operands) + ")"
+            for op, template in _UNARY_OPS.items():
+                if op in expr:
+                    return template.format(self.expr(expr[op]))
+            if "in" in expr:
+                return f"({self.expr(expr['in']['item'])} in {self.expr(expr['in']['array'])})"
+            if "compare" in expr:
+                compare = expr["compare"]
+                op = compare["op"]
+                if op not in _COMPARE_OPS:
+                    return f"_fail(KeyError({op!r}))"
+                return f"({self.expr(compare['left'])} {_COMPARE_OPS[op]} {self.expr(compare['right'])})"
+        elif expr is None or isinstance(expr, (str, int, float, bool)):
+            return self.literal(expr)
+        return f"_fail(Exception({_source(f'Unsupported expression: {expr}')}))"
+
+    def call(self, call: Dict[str, Any]) -> str:
+        from interpreter.call_cache import cache_ttl
+        if call.get("async", False):
+            raise ValueError(f"Async call to {call['function']} cannot run as a Python function")
+        args = call.get("args", {})
+        values = "".join(f"{self.expr(arg)}, " for arg in args.values())
+        operands = f"{call['function']!r}, {tuple(args)!r}, ({values}), {call.get('return_type')!r}"
+        ttl = cache_ttl(call)
+        if ttl is None:
+            return f"_call({operands})[0]"
+        return f"_cached_call({operands}, {_source(ttl)})[0]"
+
+    # Steps
+
+    def block(self, steps: List[Dict[str, Any]], depth: int) -> None:
+        start = len(self.lines)
+        for index, step in enumerate(steps):
+            self.step(step, index, steps, depth)
+        if len(self.lines) == start:
+            self.emit(depth, "pass")
+
+    def step(self, step: Dict[str, Any], index: int, block: List[Dict[str, Any]], depth: int) -> None:
+        kind = next((kind for kind in _STEP_KINDS if kind in step), None)
+        if kind is None:
+            # Other steps (event, ai_*, etc.) are not executed, as in the interpreter
+            return
+        write = getattr(self, f"step_{kind}")
+        on_error = step.get("on_error")
+        if not isinstance(on_error, dict):
+            write(step[kind], index, depth)
+            return
+        if "body" in on_error:
+            handler = on_error["body"]
+        else:
+            target = next((other for other in block if other.get("id") == on_error.get("step_id")), None)
+            if target is None:
+                raise KeyError(f"on_error step not found: {on_error.get('step_id')}")
+            handler = [{key: value for key, value in target.items() if key != "on_error"}]
+        self.guarded(lambda body_depth: write(step[kind], index, body_depth), handler, index, depth)
+
+    def guarded(self, body: Callable[[int], None], catch: Optional[List[Dict[str, Any]]], index: int, depth: int) -> None:
+        known = set(self.known)
+        self.emit(depth, "try:")
+        start = len(self.lines)
+        body(depth + 1)
+        if len(self.lines) == start:
+            self.emit(depth + 1, "pass")
+        self.known = set(known)
+        if catch is None:
+            self.emit(depth, "except Exception:")
+            self.emit(depth + 1, "pass")
+        else:
+            error = self.temp()
+            self.emit(depth, f"except Exception as {error}:")
+            self.store("error", f"_error({error}, {index})", depth + 1)
+            self.block(catch, depth + 1)
+        self.known = known
+
+    def step_let(self, bindings: Dict[str, Any], index: int, depth: int) -> None:
+        for var, expr in bindings.items():
+            self.store(var, self.expr(expr), depth)
+
+    def step_set(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        self.store(spec["target"], self.expr(spec["value"]), depth)
+
+    def step_map(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        if spec.get("executor") == "process" or spec.get("stream", False) or spec.get("async", False):
+            raise ValueError("Async, streaming and process-pool maps cannot run as a Python function")
+        from interpreter.compiler import step_writes
+        # Map items run in their own scopes, so an item that fails leaves no
+        # writes behind; an in-place loop only matches that when the body
+        # writes nothing but the item itself
+        writes = step_writes(spec["body"], calls=False)
+        if writes is None or not writes <= {spec["as"]}:
+            raise ValueError("A map body that writes other variables cannot run as a Python function")
+        results = self.temp()
+        self.emit(depth, f"{results} = []")
+        self.loop(spec, depth, results)
+        self.store(spec["target"], results, depth)
+
+    def step_forEach(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        if spec.get("async", False):
+            raise ValueError("Async forEach cannot run as a Python function")
+        self.loop(spec, depth)
+
+    def loop(self, spec: Dict[str, Any], depth: int, results: Optional[str] = None) -> None:
+        """Runs the body per item of `source` with the item in `as`, collecting `as` into `results`."""
+        item = self.temp()
+        self.emit(depth, f"for {item} in {self.load(spec['source'])}:")
+        known = set(self.known)
+        self.store(spec["as"], item, depth + 1)
+        self.block(spec["body"], depth + 1)
+        if results is not None:
+            self.emit(depth + 1, f"{results}.append({self.load(spec['as'])})")
+        self.known = known
+
+    def step_try(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        self.guarded(lambda body_depth: self.block(spec["body"], body_depth),
+                     spec["catch"] if "catch" in spec else None, index, depth)
+
+    def step_if(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        self.emit(depth, f"if {self.expr(spec['condition'])}:")
+        known = set(self.known)
+        self.block(_as_steps(spec["then"]), depth + 1)
+        if "else" not in spec:
+            self.known = known
+            return
+        then_known, self.known = self.known, set(known)
+        self.emit(depth, "else:")
+        self.block(_as_steps(spec["else"]), depth + 1)
+        # Assigned after the step only if both branches assign it
+        self.known = known | (then_known & self.known)
+
+    def step_while(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        budget = self.literal(spec["max_iterations"]) if "max_iterations" in spec else "_WHILE_MAX_ITERATIONS"
+        iterations = self.temp()
+        self.emit(depth, f"{iterations} = 0")
+        self.emit(depth, f"while {self.expr(spec['condition'])}:")
+        self.emit(depth + 1, f"if {iterations} == {budget}:")
+        self.emit(depth + 2, f"raise _exhausted({budget})")
+        self.emit(depth + 1, f"{iterations} += 1")
+        known = set(self.known)
+        self.block(spec["body"], depth + 1)
+        self.known = known
+
+    def step_parallel(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        raise ValueError("parallel steps cannot run as a Python function")
+
+    def step_assert(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        self.emit(depth, f"if not {self.expr(spec['condition'])}:")
+        self.emit(depth + 1, f"raise AssertionError({self.literal(spec.get('message', 'Assertion failed'))})")
+
+    def step_log(self, spec: Dict[str, Any], index: int, depth: int) -> None:
+        level = logging.getLevelName(str(spec.get("level", "info")).upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+        parts = []
+        for part in _as_steps(spec.get("message", [])):
+            # A quoted string ('text') is a literal, any other string a variable name
+            if isinstance(part, str):
+                is_literal = len(part) >= 2 and part[0] == part[-1] == "'"
+                part = {"value": part[1:-1]} if is_literal else {"get": part}
+            parts.append(f"str({self.expr(part)})")
+        self.emit(depth, f"_flow_log.log({level}, ' '.join([{', '.join(parts)}]))")
+
+    def step_return(self, expr: Any, index: int, depth: int) -> None:
+        self.emit(depth, f"return {self.expr(expr)}")
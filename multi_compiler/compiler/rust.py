@@ -1,16 +1,18 @@
 import logging
 from typing import Dict, List, Any
-from base import get_expr_code, map_type
+from base import get_expr_code, map_type, schema_type
+from utils import StepCache
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def generate_rust_function(flow: Dict[str, Any]) -> str:
+def generate_rust_function(flow: Dict[str, Any], step_cache: StepCache = None) -> str:
     """
     Generates an async Rust function from an A+ JSONFlow definition using rayon and tokio.
 
     Args:
         flow: JSONFlow definition with function, schema, context, and steps.
+        step_cache: Optional StepCache; steps whose code is cached are not regenerated.
 
     Returns:
         str: Generated Rust code.
@@ -28,7 +30,7 @@ def generate_rust_function(flow: Dict[str, Any]) -> str:
         "struct Context {"
     ]
     for var, json_type in context.items():
-        lines.append(f"    {var}: {map_type(json_type, 'rust')},")
+        lines.append(f"    {var}: {map_type(schema_type(json_type), 'rust')},")
     lines.append("}")
 
     lines.extend([
@@ -49,15 +51,16 @@ def generate_rust_function(flow: Dict[str, Any]) -> str:
         ""
     ])
 
-    lines.append(f"async fn {func_name}({', '.join(f'{var}: {map_type(json_type, \"rust\")}' for var, json_type in inputs.items())}) -> Result<i32, FlowError> {{")
+    params = ", ".join(f"{var}: {map_type(schema_type(json_type), 'rust')}" for var, json_type in inputs.items())
+    lines.append(f"async fn {func_name}({params}) -> Result<i32, FlowError> {{")
     lines.append("    let mut context = Context {")
     for var, json_type in context.items():
-        initial_value = {"string": "String::new()", "integer": "0", "number": "0.0", "boolean": "false", "object": "HashMap::new()", "array": "Vec::new()"}.get(json_type, "Default::default()")
+        initial_value = {"string": "String::new()", "integer": "0", "number": "0.0", "boolean": "false", "object": "HashMap::new()", "array": "Vec::new()"}.get(schema_type(json_type), "Default::default()")
         lines.append(f"        {var}: {initial_value},")
     lines.append("    };")
 
     for step in steps:
-        lines.extend(generate_step(step))
+        lines.extend(step_cache.emit("rust", step, generate_step) if step_cache else generate_step(step))
 
     lines.append("    Ok(context.balance.unwrap_or(0))")
     lines.append("}")
@@ -89,3 +92,6 @@ def generate_step(step: Dict[str, Any], indent: int = 1) -> List[str]:
         lines.append(f"{pad}context.{target} = {target};")
     # Other steps remain as before
     return lines
+
+
+compile_to_rust = generate_rust_function
@@ -1,28 +1,44 @@
-from base import get_expr_code, map_type
+from base import get_expr_code, map_type, schema_type
+from utils import structural_key
 
-def generate_solidity_function(flow, state_vars=None, events=None):
+def generate_solidity_function(flow, state_vars=None, events=None, step_cache=None):
     """
     Generates a Solidity function from a JSONFlow definition (A+ schema).
     - state_vars: set for collecting contract-level state variables (e.g., mappings)
     - events: set for collecting event definitions
+    - step_cache: optional StepCache; cached steps are not regenerated
     """
     func_name = flow["function"]
     inputs = flow["schema"]["inputs"]
-    context = flow["schema"]["context"]
+    context = {var: schema_type(decl) for var, decl in flow["schema"]["context"].items()}
     steps = flow["steps"]
 
     # Generate input parameters
     input_params = []
     for name, meta in inputs.items():
-        solidity_type = map_type(meta["type"], "solidity")
+        solidity_type = map_type(schema_type(meta), "solidity")
         input_params.append(f"{solidity_type} {name}")
 
     # Start building the function
     lines = [f"function {func_name}({', '.join(input_params)}) public returns (uint256) {{"]
 
     # Compile steps
-    for step in steps:
-        lines.extend(generate_step(step, context, state_vars, events))
+    if step_cache is None:
+        for step in steps:
+            lines.extend(generate_step(step, context, state_vars, events))
+    else:
+        # Steps are cached together with the declarations they add, keyed on the context types they read
+        def emit(step):
+            step_vars, step_events = set(), set()
+            return generate_step(step, context, step_vars, step_events), sorted(step_vars), sorted(step_events)
+        salt = structural_key(context)
+        for step in steps:
+            step_lines, step_vars, step_events = step_cache.emit("solidity", step, emit, salt)
+            lines.extend(step_lines)
+            if state_vars is not None:
+                state_vars.update(step_vars)
+            if events is not None:
+                events.update(step_events)
 
     # Default return if no explicit return (e.g., return 0 for success)
     lines.append("    return 0;")
@@ -38,11 +54,11 @@ def generate_step(step, context, state_vars, events, indent=1):
             # Infer type from context or expression; default to uint256 for simplicity
             expr_type = infer_type(expr, context)
             solidity_type = map_type(expr_type, "solidity")
-            code = get_expr_code(expr, "solidity")
+            code = get_expr_code(expr, "solidity")[0]
             lines.append(f"{pad}{solidity_type} {var} = {code};")
     elif "set" in step:
         target = step["set"]["target"]
-        value = get_expr_code(step["set"]["value"], "solidity")
+        value = get_expr_code(step["set"]["value"], "solidity")[0]
         # Determine if target is an array for append behavior
         target_type = get_context_type(target, context)
         if isinstance(target, list):
@@ -57,11 +73,11 @@ def generate_step(step, context, state_vars, events, indent=1):
             # Direct assignment
             lines.append(f"{pad}{target_str} = {value};")
     elif "assert" in step:
-        condition = get_expr_code(step["assert"]["condition"], "solidity")
+        condition = get_expr_code(step["assert"]["condition"], "solidity")[0]
         message = step["assert"]["message"]
         lines.append(f'{pad}require({condition}, "{message}");')
     elif "if" in step:
-        condition = get_expr_code(step["if"]["condition"], "solidity")
+        condition = get_expr_code(step["if"]["condition"], "solidity")[0]
         lines.append(f"{pad}if ({condition}) {{")
         # Handle then as single step or array
         then_steps = step["if"]["then"] if isinstance(step["if"]["then"], list) else [step["if"]["then"]]
@@ -111,14 +127,14 @@ def generate_step(step, context, state_vars, events, indent=1):
         if events is not None:
             events.add("event Log(string message);")
         msg = " + ".join([
-            get_expr_code(part, "solidity") if isinstance(part, dict) else f'"{part}"'
+            get_expr_code(part, "solidity")[0] if isinstance(part, dict) else f'"{part}"'
             for part in step["log"]["message"]
         ])
         lines.append(f"{pad}emit Log({msg});")
     elif "print" in step:
         # Solidity: no print, use event or comment
         msg = " + ".join([
-            get_expr_code(part, "solidity") if isinstance(part, dict) else f'"{part}"'
+            get_expr_code(part, "solidity")[0] if isinstance(part, dict) else f'"{part}"'
             for part in step["print"]["values"]
         ])
         lines.append(f"{pad}// print: {msg}")
@@ -126,7 +142,7 @@ def generate_step(step, context, state_vars, events, indent=1):
         func = step["call"]["function"]
         target = step["call"]["target"]
         args = step["call"]["args"]
-        arg_list = ", ".join([get_expr_code(arg, "solidity") for arg in args.values()])
+        arg_list = ", ".join([get_expr_code(arg, "solidity")[0] for arg in args.values()])
         # Assume external contract call; simplistic handling
         lines.append(f"{pad}uint256 {target} = {func}({arg_list});")
         if state_vars is not None:
@@ -177,7 +193,7 @@ def get_context_type(target, context):
         return context.get(target[0], "integer")
     return context.get(target, "integer")
 
-def generate_contract(flow, contract_name="Generated"):
+def generate_contract(flow, contract_name="Generated", step_cache=None):
     """
     Generates a full Solidity contract from a JSONFlow definition (A+ schema).
     """
@@ -186,8 +202,8 @@ def generate_contract(flow, contract_name="Generated"):
     events = set()
 
     # Add context variables as contract-level state variables
-    for var, typ in flow["schema"]["context"].items():
-        solidity_type = map_type(typ, "solidity")
+    for var, decl in flow["schema"]["context"].items():
+        solidity_type = map_type(schema_type(decl), "solidity")
         if solidity_type == "mapping":
             # Assume mapping(address => uint256) for simplicity
             state_vars.add(f"mapping(address => uint256) public {var};")
@@ -198,7 +214,7 @@ def generate_contract(flow, contract_name="Generated"):
             state_vars.add(f"{solidity_type} public {var};")
 
     # Generate function code
-    func_code = generate_solidity_function(flow, state_vars, events)
+    func_code = generate_solidity_function(flow, state_vars, events, step_cache)
 
     # Compose contract
     contract_lines = [
@@ -219,3 +235,10 @@ def generate_contract(flow, contract_name="Generated"):
     contract_lines.append("}")
 
     return "\n".join(contract_lines)
+
+
+def compile_to_solidity(flow, step_cache=None):
+    """
+    Compiles a JSONFlow definition to a full Solidity contract.
+    """
+    return generate_contract(flow, step_cache=step_cache)
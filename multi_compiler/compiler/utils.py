@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+class CodegenCache:
+    """
+    Bounded LRU cache for generated code, keyed on (structural key, language).
+
+    Args:
+        maxsize: Maximum number of entries kept before the least recently used is evicted.
+    """
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+
+    def get(self, key: Any) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Any, value: Any) -> None:
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+def structural_key(expr: Any, memo: Optional[Dict[int, str]] = None) -> str:
+    """
+    Returns a canonical hash of a JSON expression tree. Dict keys are ordered,
+    so structurally equal expressions share a key. Each container's key is
+    built from its children's fixed-size keys, and `memo` (keyed by object id)
+    lets a recursive caller reuse subtree keys, so keying every node of a tree
+    costs O(nodes) overall.
+
+    Args:
+        expr: JSON-compatible value (dict, list, str, number, bool, None).
+        memo: Optional id -> key map valid while `expr` is alive and unmodified.
+
+    Returns:
+        str: Hex digest for containers, the repr for scalars.
+    """
+    if not isinstance(expr, (dict, list)):
+        return repr(expr)
+    if memo is not None:
+        key = memo.get(id(expr))
+        if key is not None:
+            return key
+    if isinstance(expr, dict):
+        body = "{" + ",".join(f"{k!r}:{structural_key(v, memo)}" for k, v in sorted(expr.items())) + "}"
+    else:
+        body = "[" + ",".join(structural_key(v, memo) for v in expr) + "]"
+    key = hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+    if memo is not None:
+        memo[id(expr)] = key
+    return key
+
+def memoize_codegen(maxsize: int = 4096) -> Callable:
+    """
+    Decorator for `fn(expr, lang)` code generators. Unlike `functools.lru_cache`
+    it accepts unhashable dict/list expressions, keying them on their
+    structural hash plus the language. Subtree keys are memoized for the
+    duration of the outermost call, so recursive generation stays linear.
+    Exposes `cache_info()` and `cache_clear()` like `lru_cache`.
+    """
+    def decorator(fn: Callable) -> Callable:
+        cache = CodegenCache(maxsize)
+        state = {"memo": None}
+
+        @wraps(fn)
+        def wrapper(expr: Any, lang: str) -> Any:
+            outermost = state["memo"] is None
+            if outermost:
+                state["memo"] = {}
+            try:
+                key = (structural_key(expr, state["memo"]), lang)
+                result = cache.get(key)
+                if result is None:
+                    result = fn(expr, lang)
+                    cache.put(key, result)
+                return result
+            finally:
+                if outermost:
+                    state["memo"] = None
+
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+_canonical_json = json.JSONEncoder(sort_keys=True, separators=(",", ":"), default=repr).encode
+
+def codegen_version() -> str:
+    """
+    Hashes the source of the code generators (every module in this package),
+    so code cached on disk by an older generator is never reused.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            digest.update(name.encode("utf-8"))
+            with open(os.path.join(directory, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+_codegen_version: Optional[str] = None
+
+class StepCache:
+    """
+    Per-backend cache of generated code for individual steps, keyed on the
+    step's structural hash, so an edited flow only regenerates the steps that
+    changed. Entries are whatever the backend's step emitter returns and must
+    be JSON-serializable if the cache is persisted.
+
+    Entries are stored per language and generator version, so a persisted
+    cache is invalidated whenever a backend's code changes.
+
+    Args:
+        path: Optional JSON file the cache is loaded from and saved to.
+        version: Generator version keyed into entries; defaults to `codegen_version()`.
+    """
+    def __init__(self, path: Optional[str] = None, version: Optional[str] = None):
+        global _codegen_version
+        if version is None:
+            if _codegen_version is None:
+                _codegen_version = codegen_version()
+            version = _codegen_version
+        self.path = path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._used: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[int, Tuple[Any, str]] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def emit(self, lang: str, step: Any, emit: Callable[[Any], Any], salt: str = "") -> Any:
+        """
+        Returns the cached output for `step` in `lang`, calling `emit(step)` on a miss.
+        `salt` keys in anything else the output depends on (e.g., the flow's context types).
+        """
+        key = self.step_key(step) + salt
+        lang = f"{lang}@{self.version}"
+        entries = self._entries.setdefault(lang, {})
+        value = entries.get(key)
+        if value is None:
+            self.misses += 1
+            value = entries[key] = emit(step)
+        else:
+            self.hits += 1
+        self._used.setdefault(lang, {})[key] = value
+        return value
+
+    def step_key(self, step: Any) -> str:
+        """
+        Hashes a step's canonical JSON. Keys are memoized per step object until
+        the next save(), so backends compiling the same flow hash each step once.
+        """
+        entry = self._keys.get(id(step))
+        if entry is not None and entry[0] is step:
+            return entry[1]
+        key = hashlib.blake2b(_canonical_json(step).encode("utf-8"), digest_size=16).hexdigest()
+        self._keys[id(step)] = (step, key)
+        return key
+
+    def save(self) -> None:
+        """
+        Drops entries not used since the last save (steps no longer in the flow,
+        or cached by another generator version) and writes the rest to `path`, if set.
+        """
+        self._entries, self._used = self._used, {}
+        self._keys.clear()
+        if self.path:
+            with open(self.path, "w") as f:
+                json.dump(self._entries, f, separators=(",", ":"))
@@ -1,33 +1,191 @@
+import argparse
 import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Backends import their shared helpers script-style (`from base import ...`).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "compiler"))
+# The repository root, for schema validation and `--emit bin`, which are shared
+# with the interpreter.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
 from compiler.solidity import compile_to_solidity
 from compiler.python import compile_to_python
 from compiler.javascript import compile_to_javascript
+from compiler.rust import compile_to_rust
 from analysis.cost_estimator import estimate_cost
 from analysis.deterministic_tagging import tag_determinism
 from analysis.ops_whitelist import validate_ops
+from analysis.visitor import analyze_flow
+from utils import StepCache
+from interpreter.validation import check_flow, flow_schema
+
+BACKENDS = {
+    "solidity": compile_to_solidity,
+    "python": compile_to_python,
+    "javascript": compile_to_javascript,
+    "rust": compile_to_rust,
+}
+DEFAULT_BACKENDS = ("solidity", "python", "javascript")
+EXTENSIONS = {"solidity": "sol", "python": "py", "javascript": "js", "rust": "rs"}
+
+def compile_jsonflow(flow_path, step_cache=None, backends=DEFAULT_BACKENDS, workers=None, schema=None, validate=True):
+    """
+    Compiles a JSONFlow file to each of `backends` (Rust is opt-in).
+
+    The flow is first checked against `schema`, or the schema file it names
+    in `$schema` (if any); pass validate=False for trusted flows.
+
+    Pass the same StepCache across calls (e.g., in an editor loop) to compile
+    incrementally: each step is keyed on its structural hash and only steps
+    that changed since the last call are regenerated. A cache created with a
+    path is reloaded from and saved to disk, so this also works across runs.
+
+    With `workers`, the backends run concurrently in a process pool instead;
+    see compile_many for compiling many flows at once.
+    """
+    if workers:
+        if step_cache is not None:
+            raise ValueError("step_cache is per-process and cannot be combined with workers")
+        return compile_many([flow_path], backends, workers, schema, validate)[flow_path]
+
+    cost, tagged = analyze(load_flow(flow_path, schema, validate))
+    result = {"cost": cost}
+    for backend in backends:
+        result[backend] = BACKENDS[backend](tagged, step_cache)
+
+    if step_cache is not None:
+        step_cache.save()
+
+    return result
+
+def compile_many(flow_paths, backends=DEFAULT_BACKENDS, workers=None, schema=None, validate=True):
+    """
+    Compiles many flows to every backend in a process pool. Workers load and
+    analyze flows themselves, so only paths and generated code cross process
+    boundaries. With at least as many flows as workers each task compiles one
+    flow to every backend; otherwise each (flow, backend) pair is its own task
+    so a single flow's backends still run concurrently.
 
-def compile_jsonflow(flow_path):
+    Args:
+        flow_paths: Flow files and/or directories (every *.json inside is compiled).
+        backends: Backend names from BACKENDS.
+        workers: Pool size; defaults to the CPU count.
+        schema, validate: As for compile_jsonflow.
+
+    Returns:
+        Dict mapping each flow path to {"cost": ..., <backend>: code, ...}.
+    """
+    paths = expand_paths(flow_paths)
+    for backend in backends:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend: {backend}")
+
+    if len(paths) >= (workers or os.cpu_count() or 1):
+        tasks = [(path, tuple(backends)) for path in paths]
+    else:
+        tasks = [(path, (backend,)) for path in paths for backend in backends]
+        # Validate once here rather than in every backend's task
+        for path in paths:
+            load_flow(path, schema, validate)
+        validate = False
+
+    results = {path: {} for path in paths}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(compile_task, path, task_backends, schema, validate) for path, task_backends in tasks]
+        for (path, _), future in zip(tasks, futures):
+            results[path].update(future.result())
+    return results
+
+def compile_task(flow_path, backends, schema=None, validate=True):
+    """Process-pool entry point: compiles one flow file to some of its backends."""
+    cost, tagged = analyze(load_flow(flow_path, schema, validate))
+    result = {"cost": cost}
+    for backend in backends:
+        result[backend] = BACKENDS[backend](tagged)
+    return result
+
+def analyze(flow):
+    analysis = analyze_flow(flow)  # one walk runs every registered pass
+    validate_ops(flow, analysis)  # 🔒 restrict to backend-supported ops
+    cost = estimate_cost(flow, analysis)  # 💸 estimate cost
+    tagged = tag_determinism(flow, analysis)  # 🏷️ tag deterministic/non-deterministic
+    return cost, tagged
+
+def load_flow(flow_path, schema=None, validate=True):
     with open(flow_path) as f:
         flow = json.load(f)
+    schema = schema or flow_schema(flow, flow_path)
+    if validate and schema:
+        check_flow(flow, schema)
+    return flow
 
-    validate_ops(flow)  # 🔒 restrict to backend-supported ops
-    cost = estimate_cost(flow)  # 💸 estimate cost
-    tagged = tag_determinism(flow)  # 🏷️ tag deterministic/non-deterministic
+def expand_paths(flow_paths):
+    paths = []
+    for path in flow_paths:
+        if os.path.isdir(path):
+            paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json"))
+        else:
+            paths.append(path)
+    return paths
 
-    sol_code = compile_to_solidity(tagged)
-    py_code = compile_to_python(tagged)
-    js_code = compile_to_javascript(tagged)
+def emit_binary(flow_path, out_dir=None, schema=None, validate=True):
+    """
+    Writes a flow in the interpreter's binary format (see interpreter/binary.py)
+    as <flow>.jfb, after validating it as compile_jsonflow does.
+    """
+    from interpreter.binary import dump
 
-    return {
-        "cost": cost,
-        "solidity": sol_code,
-        "python": py_code,
-        "javascript": js_code
-    }
+    stem = os.path.splitext(os.path.basename(flow_path))[0]
+    out_dir = out_dir or os.path.dirname(flow_path)
+    os.makedirs(out_dir or ".", exist_ok=True)
+    out_path = os.path.join(out_dir, f"{stem}.jfb")
+    dump(load_flow(flow_path, schema, validate), out_path)
+    return out_path
 
-if __name__ == "__main__":
-    result = compile_jsonflow("example.json")
+def write_outputs(out_dir, flow_path, result):
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(flow_path))[0]
     for lang, code in result.items():
         if lang != "cost":
-            print(f"\n--- {lang.upper()} ---\n{code}")
-    print(f"\n💰 Estimated Cost: {result['cost']}")
+            with open(os.path.join(out_dir, f"{stem}.{EXTENSIONS[lang]}"), "w") as f:
+                f.write(code)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile JSONFlow files to Solidity, Python and JavaScript (and optionally Rust).")
+    parser.add_argument("flows", nargs="*", default=["example.json"], help="Flow files or directories of flows")
+    parser.add_argument("--rust", action="store_true", help="Also compile to Rust")
+    parser.add_argument("--workers", type=int, help="Compile backends and flows concurrently in a process pool of this size")
+    parser.add_argument("--cache", help="Step cache file for incremental recompilation of a single flow")
+    parser.add_argument("--out", help="Write <flow>.<ext> files to this directory instead of printing")
+    parser.add_argument("--emit", choices=["code", "bin"], default="code",
+                        help="bin: write each flow as a binary program (<flow>.jfb) for the interpreter instead of compiling it")
+    parser.add_argument("--schema", help="Validate flows against this JSON Schema instead of the one each names in $schema")
+    parser.add_argument("--no-validate", dest="validate", action="store_false", help="Skip schema validation (trusted flows)")
+    args = parser.parse_args()
+
+    if args.emit == "bin":
+        for path in expand_paths(args.flows):
+            print(f"Wrote {emit_binary(path, args.out, args.schema, args.validate)}")
+    else:
+        backends = DEFAULT_BACKENDS + ("rust",) if args.rust else DEFAULT_BACKENDS
+        if args.workers:
+            results = compile_many(args.flows, backends, args.workers, args.schema, args.validate)
+        else:
+            step_cache = StepCache(args.cache) if args.cache else None
+            results = {
+                path: compile_jsonflow(path, step_cache, backends, schema=args.schema, validate=args.validate)
+                for path in expand_paths(args.flows)
+            }
+
+        for path, result in results.items():
+            if args.out:
+                write_outputs(args.out, path, result)
+                continue
+            for lang, code in result.items():
+                if lang != "cost":
+                    print(f"\n--- {lang.upper()} ---\n{code}")
+            print(f"\n💰 Estimated Cost: {result['cost'].total}")
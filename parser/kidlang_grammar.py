@@ -1,18 +1,92 @@
-from lark import Lark, Transformer, v_args
+import lark
+from lark import Lark, Transformer, UnexpectedCharacters, UnexpectedInput, UnexpectedToken, v_args
 from typing import Dict, Any, List
+import glob
+import hashlib
 import logging
+import os
+import re
+import sys
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Load grammar
-with open('kidlang.lark') as f:
-    grammar = f.read()
+# `start` ignores only inline whitespace (the `script` rule needs newlines as
+# tokens); a single sentence treats line breaks as spaces
+_LINE_BREAKS = re.compile(r'[\r\n\f]+')
 
-parser = Lark(grammar, parser='lalr', transformer=None)
+# A bad line costs a re-parse of the lines before it in its chunk, so chunks bound that cost
+SCRIPT_CHUNK_LINES = 50
+
+GRAMMAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kidlang.lark')
+
+# Prebuilt parse tables are saved next to the grammar, one file per start rule and grammar hash
+CACHE_DIR = os.path.dirname(GRAMMAR_PATH)
+
+_parser = None
+_script_parser = None
+
+def get_parser() -> Lark:
+    """Loads the LALR parser on first use, so importing this module stays cheap."""
+    global _parser
+    if _parser is None:
+        _parser = load_parser('start', transformer=None)
+    return _parser
+
+def get_script_parser() -> Lark:
+    """
+    Loads the whole-script parser on first use. The transformer runs inside
+    the LALR parser as each rule is reduced, so no parse tree is built.
+    """
+    global _script_parser
+    if _script_parser is None:
+        _script_parser = load_parser('script', transformer=KidLangTransformer())
+    return _script_parser
+
+def load_parser(start: str, **options: Any) -> Lark:
+    """
+    Loads the LALR parser for the `start` rule from its prebuilt tables in
+    CACHE_DIR. The tables are built and saved on first use, and again whenever
+    the grammar file (or the Lark or Python version) changes. Options,
+    including the transformer, are saved with the tables.
+    """
+    with open(GRAMMAR_PATH, encoding='utf-8') as f:
+        grammar = f.read()
+    key = f"{grammar}\0{lark.__version__}\0{sys.version_info[:2]}"
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(CACHE_DIR, f"kidlang.{start}.{digest}.lark-cache")
+    try:
+        with open(path, 'rb') as f:
+            return Lark.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.warning(f"Rebuilding unreadable parse tables {path}: {str(e)}")
+
+    parser = Lark(grammar, parser='lalr', start=start, **options)
+    # Write then rename, so concurrent processes never load a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            parser.save(f)
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning(f"Could not save parse tables to {path}: {str(e)}")
+        return parser
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"kidlang.{start}.*.lark-cache")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return parser
 
 @v_args(inline=True)
 class KidLangTransformer(Transformer):
+    def script(self, *statements) -> List[Dict[str, Any]]:
+        """Collects the statements of a script, in order."""
+        return list(statements)
+
     def remember_name(self, name: str) -> Dict[str, Any]:
         """Maps 'remember my name is X' to a set operation."""
         return {"set": {"target": "name", "value": str(name)}}
@@ -197,9 +271,62 @@ def parse_kid_sentence_grammar(sentence: str) -> Dict[str, Any]:
         A structured block compatible with A+ JSONFlow translation.
     """
     try:
-        tree = parser.parse(sentence)
+        tree = get_parser().parse(_LINE_BREAKS.sub(' ', sentence))
         transformer = KidLangTransformer()
         return transformer.transform(tree)
     except Exception as e:
         log.error(f"Failed to parse sentence '{sentence}': {str(e)}")
         return {"error": f"Parse error: {str(e)}"}
+
+def parse_kid_script(script: str) -> List[Dict[str, Any]]:
+    """
+    Parses a multi-line kid-friendly script into structured blocks in bulk.
+
+    Each line holds one or more statements. The script is parsed in chunks of
+    SCRIPT_CHUNK_LINES lines, each in one LALR pass. A line that fails to parse
+    becomes an error block carrying its line number, and parsing resumes on the
+    next line, so the rest of the script is still parsed in bulk.
+
+    Args:
+        script: The input script, one sentence per line.
+
+    Returns:
+        Blocks in script order, with {"error": ..., "line": n} for bad lines.
+    """
+    lines = script.splitlines()
+    blocks = []
+    for start in range(0, len(lines), SCRIPT_CHUNK_LINES):
+        blocks.extend(_parse_lines(lines, start, min(start + SCRIPT_CHUNK_LINES, len(lines))))
+    return blocks
+
+def _parse_lines(lines: List[str], start: int, end: int) -> List[Dict[str, Any]]:
+    parser = get_script_parser()
+    blocks = []
+    while start < end:
+        try:
+            blocks.extend(parser.parse("\n".join(lines[start:end]) + "\n"))
+            break
+        except UnexpectedInput as e:
+            bad = start + max(e.line, 1) - 1
+            # Statements never span lines, so the lines before the bad one parse cleanly
+            if bad > start:
+                blocks.extend(parser.parse("\n".join(lines[start:bad]) + "\n"))
+            # Lark's own position is relative to the parsed slice, so report ours
+            message = f"line {bad + 1}, column {e.column}: {_describe(e)}"
+            log.error(f"Failed to parse '{lines[bad].strip()}' on {message}")
+            blocks.append({"error": f"Parse error on {message}", "line": bad + 1})
+            start = bad + 1
+    return blocks
+
+def _describe(e: UnexpectedInput) -> str:
+    # str(e) would list every acceptable token, which costs a trial parse per terminal
+    if isinstance(e, UnexpectedToken):
+        return "unexpected end of line" if e.token.type in ("_NL", "$END") else f"unexpected '{e.token}'"
+    if isinstance(e, UnexpectedCharacters):
+        return f"unexpected character {e.char!r}"
+    return type(e).__name__
+
+if __name__ == "__main__":
+    # Prebuild the parse tables, e.g. when packaging or before starting workers
+    get_parser()
+    get_script_parser()
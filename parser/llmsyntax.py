@@ -1,19 +1,202 @@
-import re
+"""
+LLM backend for parsing kid-friendly sentences into JSONFlow blocks.
+
+Sentences are parsed in batches: each request asks the model for a JSON
+array with one block per numbered sentence, and up to
+MAX_CONCURRENT_REQUESTS batches are in flight at once. Parsed blocks are kept
+in an on-disk, content-addressed cache keyed by the sentence, the model name
+and PROMPT_VERSION, so repeat CLI runs skip the model entirely. Sentences the
+model fails on fall back to the grammar parser (and are not cached).
+
+The model is pluggable: OpenAIModel (the default) imports `openai` only when
+the first request is made; StandInModel answers offline from a local
+function, for tests and air-gapped use.
+"""
+import asyncio
+import hashlib
 import json
-import openai
-from typing import Dict, Any
 import logging
-from functools import lru_cache
-from parser import parse_kid_sentence_grammar
+import os
+import re
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-@lru_cache(maxsize=500)
-def parse_kid_sentence_llm(sentence: str) -> Dict[str, Any]:
+# Bump whenever the prompt changes, so cached blocks from the old prompt are not reused.
+PROMPT_VERSION = "2"
+
+BATCH_SIZE = 20
+MAX_CONCURRENT_REQUESTS = 4
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 0.5  # doubled after each failed attempt
+
+STEP_KEYS = ["set", "if", "forEach", "map", "try", "call", "assert", "log", "return"]
+
+CACHE_DIR = os.environ.get(
+    "JSONFLOW_LLM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "jsonflow", "llm")
+)
+
+def build_prompt(sentences: Sequence[str]) -> str:
+    numbered = "\n".join(f"{i + 1}. {json.dumps(sentence)}" for i, sentence in enumerate(sentences))
+    return f"""Convert each numbered sentence to a structured JSON block for an A+ JSONFlow interpreter.
+Sentences:
+{numbered}
+Each block must conform to A+ JSONFlow schema, supporting steps like set, if, forEach, map, try, call, assert, log, return.
+Include type information for values (e.g., integer, string, array).
+Respond with ONLY a JSON array of {len(sentences)} blocks, in sentence order. No explanation, no extra text."""
+
+_SENTENCE_LINE = re.compile(r'^\d+\. (".*")$', re.MULTILINE)
+
+def prompt_sentences(prompt: str) -> List[str]:
+    """Recovers the sentences from a prompt built by build_prompt."""
+    return [json.loads(line) for line in _SENTENCE_LINE.findall(prompt)]
+
+def parse_response(content: str, count: int) -> List[Any]:
+    """Extracts the JSON array of blocks from a model response."""
+    try:
+        blocks = json.loads(content)
+    except json.JSONDecodeError:
+        match = re.search(r"\[.*\]", content, re.DOTALL)
+        if not match:
+            raise ValueError("Failed to extract valid JSON")
+        blocks = json.loads(match.group(0))
+    if not isinstance(blocks, list) or len(blocks) != count:
+        raise ValueError(f"Expected a JSON array of {count} blocks")
+    return blocks
+
+def is_valid_block(block: Any) -> bool:
+    return isinstance(block, dict) and any(key in block for key in STEP_KEYS)
+
+class OpenAIModel:
+    def __init__(self, model: str = "gpt-3.5-turbo", max_tokens_per_sentence: int = 300):
+        self.name = model
+        self.max_tokens_per_sentence = max_tokens_per_sentence
+        self._openai = None
+
+    async def complete(self, prompt: str, count: int) -> str:
+        if self._openai is None:
+            import openai
+            self._openai = openai
+        response = await self._openai.ChatCompletion.acreate(
+            model=self.name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=self.max_tokens_per_sentence * count,
+        )
+        return response["choices"][0]["message"]["content"]
+
+class StandInModel:
+    """
+    Offline model: answers each sentence of a prompt with `respond(sentence)`.
+    `requests` counts the prompts it has answered.
+    """
+    def __init__(self, respond: Callable[[str], Dict[str, Any]], name: str = "stand-in"):
+        self.name = name
+        self.respond = respond
+        self.requests = 0
+
+    async def complete(self, prompt: str, count: int) -> str:
+        self.requests += 1
+        return json.dumps([self.respond(sentence) for sentence in prompt_sentences(prompt)])
+
+class DiskCache:
+    """Content-addressed store of parsed blocks, one JSON file per key."""
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+
+    def key(self, sentence: str, model: str) -> str:
+        return hashlib.sha256(f"{PROMPT_VERSION}\0{model}\0{sentence}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, block: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent runs never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(block, f)
+        os.replace(tmp, path)
+
+_default_model = None
+
+def default_model() -> OpenAIModel:
+    global _default_model
+    if _default_model is None:
+        _default_model = OpenAIModel()
+    return _default_model
+
+async def parse_sentences_llm_async(sentences: Sequence[str], model: Any = None, cache: Optional[DiskCache] = None,
+                                    batch_size: int = BATCH_SIZE,
+                                    max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> List[Dict[str, Any]]:
+    """
+    Parses sentences into JSONFlow blocks, in order.
+
+    Args:
+        sentences: Input sentences; duplicates are parsed once.
+        model: Object with a `name` and `async complete(prompt, count)`; defaults to OpenAIModel.
+        cache: DiskCache to read and fill; defaults to one at CACHE_DIR.
+        batch_size: Sentences per request.
+        max_concurrency: Requests in flight at once.
+    """
+    model = model or default_model()
+    cache = cache or DiskCache()
+    blocks: Dict[str, Dict[str, Any]] = {}
+    misses = []
+    for sentence in dict.fromkeys(sentences):
+        block = cache.get(cache.key(sentence, model.name))
+        if block is None:
+            misses.append(sentence)
+        else:
+            blocks[sentence] = block
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def parse_batch(batch: List[str]) -> None:
+        async with semaphore:
+            parsed = await _request(model, batch)
+        for sentence, block in zip(batch, parsed):
+            if is_valid_block(block):
+                cache.put(cache.key(sentence, model.name), block)
+            else:
+                log.info(f"Falling back to grammar parsing for '{sentence}'")
+                from kidlang_grammar import parse_kid_sentence_grammar
+                block = parse_kid_sentence_grammar(sentence)
+            blocks[sentence] = block
+
+    await asyncio.gather(*[parse_batch(misses[i:i + batch_size]) for i in range(0, len(misses), batch_size)])
+    return [blocks[sentence] for sentence in sentences]
+
+async def _request(model: Any, batch: List[str]) -> List[Any]:
+    """Asks the model for a batch, retrying failed requests; returns None per sentence after the last failure."""
+    prompt = build_prompt(batch)
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return parse_response(await model.complete(prompt, len(batch)), len(batch))
+        except Exception as e:
+            log.warning(f"LLM attempt {attempt + 1} failed for a batch of {len(batch)}: {str(e)}")
+            if attempt + 1 < MAX_ATTEMPTS:
+                await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+    return [None] * len(batch)
+
+def parse_sentences_llm(sentences: Sequence[str], **options: Any) -> List[Dict[str, Any]]:
+    """Synchronous wrapper for parse_sentences_llm_async."""
+    return asyncio.run(parse_sentences_llm_async(sentences, **options))
+
+def parse_kid_sentence_llm(sentence: str, **options: Any) -> Dict[str, Any]:
     """
     Uses an LLM to parse a natural language sentence into a structured JSON block
-    compatible with A+ JSONFlow, with retries and fallback.
+    compatible with A+ JSONFlow, with retries, caching and grammar fallback.
 
     Args:
         sentence: Input sentence (e.g., "set balance to 100").
@@ -21,35 +204,4 @@ def parse_kid_sentence_llm(sentence: str) -> Dict[str, Any]:
     Returns:
         Structured block with A+ JSONFlow-compatible structure.
     """
-    prompt = f"""Convert this sentence to a structured JSON block for an A+ JSONFlow interpreter:
-Sentence: "{sentence}"
-The block must conform to A+ JSONFlow schema, supporting steps like set, if, forEach, map, try, call, assert, log, return.
-Include type information for values (e.g., integer, string, array).
-Respond with ONLY the JSON block. No explanation, no extra text."""
-    for attempt in range(3):
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                max_tokens=300,
-            )
-            content = response["choices"][0]["message"]["content"]
-            try:
-                block = json.loads(content)
-                if not isinstance(block, dict) or not any(key in block for key in [
-                    "set", "if", "forEach", "map", "try", "call", "assert", "log", "return"
-                ]):
-                    raise ValueError("Invalid JSONFlow block structure")
-                return block
-            except json.JSONDecodeError:
-                match = re.search(r"\{.*\}", content, re.DOTALL)
-                if match:
-                    return json.loads(match.group(0))
-                raise ValueError("Failed to extract valid JSON")
-        except Exception as e:
-            log.warning(f"LLM attempt {attempt + 1} failed for '{sentence}': {str(e)}")
-            if attempt == 2:
-                log.info(f"Falling back to grammar parsing for '{sentence}'")
-                return parse_kid_sentence_grammar(sentence)
-    return {"error": "LLM parsing failed after retries"}
+    return parse_sentences_llm([sentence], **options)[0]
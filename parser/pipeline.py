@@ -1,7 +1,6 @@
 from typing import List, Dict, Any
-from parser import parse_kid_sentence_grammar
-from llm_parser import parse_kid_sentence_llm
 from kid2flow import translate_kid_blocks
+import json
 import logging
 
 log = logging.getLogger(__name__)
@@ -13,19 +12,20 @@ def parse_and_translate(sentences: List[str], use_llm: bool = False) -> Dict[str
 
     Args:
         sentences: List of natural language sentences.
-        use_llm: If True, uses LLM parser; otherwise, uses grammar parser.
+        use_llm: If True, uses the batched LLM parser; otherwise, parses the sentences
+            as one script with the grammar parser.
 
     Returns:
         An A+ JSONFlow program.
     """
-    blocks = []
-    for sentence in sentences:
-        if use_llm:
-            block = parse_kid_sentence_llm(sentence)
-        else:
-            block = parse_kid_sentence_grammar(sentence)
-        blocks.append(block)
-    
+    # Each backend is imported on first use, so the grammar path never loads OpenAI
+    if use_llm:
+        from llmsyntax import parse_sentences_llm
+        blocks = parse_sentences_llm(sentences)
+    else:
+        from kidlang_grammar import parse_kid_script
+        blocks = parse_kid_script("\n".join(sentences))
+
     try:
         flow = translate_kid_blocks(blocks)
         return flow
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The multi_compiler backends and the parsers import each other script-style (`from base import ...`).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'multi_compiler'), os.path.join(ROOT, 'multi_compiler', 'compiler'), os.path.join(ROOT, 'parser')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,120 @@
+import copy
+
+import pytest
+
+from analysis.cost_estimator import estimate_cost
+from analysis.deterministic_tagging import tag_determinism
+from analysis.ops_whitelist import validate_ops
+from analysis.visitor import Analyzer, analyze_flow
+from analysis.cost_estimator import WHILE_MAX_ITERATIONS, CostPass
+from analysis.deterministic_tagging import DeterminismPass
+from interpreter import compiler
+
+NESTED = {
+    "steps": [
+        {"set": {"target": "balance", "value": {"get": "amount"}}},
+        {"if": {
+            "condition": {"compare": {"left": {"get": "balance"}, "op": ">", "right": {"value": 0}}},
+            "then": [{"try": {
+                "body": [{"set": {"target": "stamp", "value": {"timestamp": {}}}}],
+                "catch": [{"log": {"message": ["'failed'"]}}],
+            }}],
+            "else": {"return": {"get": "balance"}},
+        }},
+    ]
+}
+
+def test_passes_descend_into_nested_steps_and_expressions():
+    flow = copy.deepcopy(NESTED)
+    # set(2) + get(1); if: get(1) + either [try: set(2), catch: log(1)] or [return(1) + get(1)]
+    assert estimate_cost(flow).total == (3 + 3, 3 + 4, 3 + 3)
+    tag_determinism(flow)
+    assert [step["deterministic"] for step in flow["steps"]] == [True, False]
+    assert {"if", "try", "timestamp", "log", "compare"} <= analyze_flow(flow)["ops"]
+
+def test_nested_disallowed_ops_are_rejected():
+    with pytest.raises(Exception, match="does not allow"):
+        validate_ops(copy.deepcopy(NESTED))
+    validate_ops({"steps": [{"set": {"target": "x", "value": {"add": [{"get": "x"}, {"value": 1}]}}}]})
+
+def test_subtree_results_are_cached_by_structure():
+    analyzer = Analyzer([CostPass(), DeterminismPass()])
+    flow = copy.deepcopy(NESTED)
+    first = analyzer.analyze(flow)
+    assert (analyzer.hits, analyzer.misses) == (0, 6)
+
+    # Tagging annotates steps but does not change their keys
+    tag_determinism(flow, first)
+    assert analyzer.analyze(flow).results == first.results
+    assert (analyzer.hits, analyzer.misses) == (2, 6)
+
+    # Editing one nested step re-walks only the steps on its path
+    flow["steps"][1]["if"]["then"][0]["try"]["catch"][0]["log"]["message"] = ["'retry'"]
+    analyzer.analyze(copy.deepcopy(flow))
+    assert analyzer.misses == 6 + 3
+
+def nested_ifs(depth):
+    step = {"set": {"target": "x", "value": {"get": "x"}}}
+    for _ in range(depth):
+        step = {"if": {"condition": {"get": "x"}, "then": [step]}}
+    return {"steps": [step]}
+
+def test_deeply_nested_steps_are_keyed_in_one_walk():
+    analyzer = Analyzer([CostPass()])
+    flow = nested_ifs(500)
+    # One get per condition, plus the innermost set
+    assert estimate_cost(flow, analyzer.analyze(flow)).total.max == 500 + 3
+    assert (analyzer.hits, analyzer.misses) == (0, 501)
+    analyzer.analyze(nested_ifs(500))
+    assert (analyzer.hits, analyzer.misses) == (1, 501)
+
+def loop_flow(**schema):
+    body = [{"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "x"}]}}}]
+    return {
+        "schema": {"inputs": schema},
+        "context": {"known": [1, 2, 3, 4]},
+        "steps": [
+            {"forEach": {"source": "known", "as": "x", "body": body}},
+            {"forEach": {"source": "items", "as": "x", "body": body}},
+        ],
+    }
+
+def test_loop_costs_scale_with_source_sizes():
+    estimate = estimate_cost(loop_flow(items={"type": "array", "minItems": 2, "maxItems": 100}), backend="solidity")
+    body = 5000 + 200 + 200 + 3 + 30
+    assert estimate.steps[0] == (4 * body, 4 * body, 4 * body)
+    assert estimate.steps[1] == (2 * body, 100 * body, 51 * body)
+    assert estimate.total.max == 104 * body
+
+def test_unbounded_loops_have_infinite_max():
+    estimate = estimate_cost(loop_flow(items="array"), backend="python")
+    assert estimate.steps[1].min == 0
+    assert estimate.steps[1].max == float("inf")
+    assert estimate.steps[1].expected > estimate.steps[0].expected
+
+def test_literal_and_computed_loop_sources():
+    body = [{"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "x"}]}}}]
+    flow = {"steps": [
+        {"forEach": {"source": {"value": [0, 1, 2]}, "as": "x", "body": body}},
+        {"forEach": {"source": {"get": "items"}, "as": "x", "body": body}},
+        {"forEach": {"source": 7, "as": "x", "body": body}},
+    ]}
+    estimate = estimate_cost(flow, backend="solidity")
+    step = 5000 + 200 + 200 + 3 + 30
+    # The source expressions are costed too: a `value` literal and a `get`
+    assert estimate.steps[0] == (3 + 3 * step, 3 + 3 * step, 3 + 3 * step)
+    assert estimate.steps[1] == (200, float("inf"), 200 + 10 * step)
+    assert estimate.steps[2] == (0, float("inf"), 10 * step)
+
+def test_while_loops_are_bounded_by_their_iteration_budget():
+    body = [{"set": {"target": "x", "value": {"add": [{"get": "x"}, 1]}}}]
+    condition = {"compare": {"left": {"get": "x"}, "op": "<", "right": 5}}
+    flow = {"steps": [
+        {"while": {"condition": condition, "body": body, "max_iterations": 4}},
+        {"while": {"condition": condition, "body": body}},
+    ]}
+    estimate = estimate_cost(flow, backend="solidity")
+    step = 5000 + 200 + 3 + 3 + 200 + 30
+    assert estimate.steps[0] == (0, 4 * step, 4 * step)
+    assert estimate.steps[1] == (0, WHILE_MAX_ITERATIONS * step, 10 * step)
+    assert WHILE_MAX_ITERATIONS == compiler.WHILE_MAX_ITERATIONS
@@ -0,0 +1,42 @@
+import asyncio
+
+from interpreter.batch import run_batch, run_batch_async
+from interpreter.pool import shutdown_process_pool
+
+FLOW = {
+    "function": "deposit",
+    "schema": {"inputs": {"sender": "string", "amount": "integer"}, "context": {"balances": "dict<string, int>"}},
+    "context": {"balances": {"alice": 10}},
+    "steps": [
+        {"let": {"ok": {"compare": {"left": {"get": "amount"}, "op": ">", "right": 0}}}},
+        {"set": {"target": ["balances", "sender"], "value": {"add": [{"get": "amount"}, {"get": "bonus"}]}}},
+    ],
+}
+
+RECORDS = [
+    {"sender": "bob", "amount": 5, "bonus": 1},
+    {"sender": "carol", "amount": 7},
+    {"sender": "dave", "amount": 3, "bonus": 0},
+]
+
+def check(results):
+    assert [r.index for r in results] == [0, 1, 2]
+    assert results[0].error is None
+    assert results[0].data["balances"] == {"alice": 10, "sender": 6}
+    assert results[1].error["details"]["type"] == "KeyError"
+    assert results[2].data["balances"] == {"alice": 10, "sender": 3}
+
+def test_run_batch_isolates_records_and_reports_errors():
+    check(list(run_batch(FLOW, iter(RECORDS), chunk_size=2)))
+    assert FLOW["context"]["balances"] == {"alice": 10}
+
+def test_run_batch_async():
+    async def collect():
+        return [r async for r in run_batch_async(FLOW, RECORDS, concurrency=2)]
+    check(asyncio.run(collect()))
+
+def test_run_batch_in_process_pool():
+    try:
+        check(list(run_batch(FLOW, RECORDS, workers=2, chunk_size=1)))
+    finally:
+        shutdown_process_pool()
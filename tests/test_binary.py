@@ -0,0 +1,89 @@
+import copy
+import json
+
+import pytest
+
+from interpreter import binary
+from interpreter.compiler import compile_flow, flow_hash
+from interpreter.runtime import Context, load_flow
+from main import emit_binary
+
+STEPS = [
+    {"let": {"total": {"add": [{"get": "a"}, {"value": 2}]}}},
+    {"if": {
+        "condition": {"compare": {"left": {"get": "total"}, "op": ">", "right": {"value": 3}}},
+        "then": [{"set": {"target": "status", "value": {"value": "high"}}}],
+        "else": [{"set": {"target": "status", "value": {"value": "low"}}}],
+    }},
+    {"return": {"get": "total"}},
+]
+
+def test_round_trip_preserves_every_json_value():
+    flow = {
+        "function": "sample",
+        "context": {
+            "ints": [0, -1, 2**31 - 1, -2**31, 2**40, -2**70],
+            "floats": [0.5, -1e300, 3.0],
+            "text": ["", "é", "naïve ✓", "0"],
+            "flags": [True, False, None],
+            "nested": {"empty": {}, "list": [[], [{}]], "mixed": [1, "1", 1.0]},
+        },
+        "steps": STEPS,
+    }
+    loaded = binary.loads(binary.encode(flow))
+    assert loaded.to_dict() == flow
+    assert json.dumps(loaded.to_dict()) == json.dumps(flow)
+    assert loaded.steps_hash == flow_hash(STEPS)
+
+def test_repeated_subtrees_are_stored_once():
+    steps = [{"let": {"x": {"add": [{"get": "x"}, {"value": 1}]}}}] * 200
+    data = binary.encode({"steps": steps})
+    assert len(data) < len(binary.encode({"steps": steps[:1]})) + 200 * 4
+    decoded = binary.loads(data)["steps"]
+    assert decoded == steps
+    assert decoded[0]["let"]["x"]["add"][0] is decoded[1]["let"]["x"]["add"][0]
+    assert decoded[0]["let"]["x"]["add"][1]["value"] == 1
+
+def test_value_literals_are_not_shared():
+    steps = [{"let": {"x": {"value": {"items": []}}}}, {"let": {"y": {"value": {"items": []}}}}]
+    decoded = binary.loads(binary.encode({"steps": steps}))["steps"]
+    assert decoded[0]["let"]["x"]["value"] is not decoded[1]["let"]["y"]["value"]
+
+def test_nested_value_literals_are_not_shared():
+    literal = {"value": {"inner": {"a": 1}, "list": [[1]]}}
+    steps = [
+        {"let": {"x": literal, "y": copy.deepcopy(literal)}},
+        {"set": {"target": ["x", "inner", "a"], "value": 2}},
+    ]
+    flow = binary.loads(binary.encode({"steps": steps}))
+    decoded = flow["steps"]
+    assert decoded[0]["let"]["x"]["value"]["inner"] is not decoded[0]["let"]["y"]["value"]["inner"]
+    assert decoded[0]["let"]["x"]["value"]["list"][0] is not decoded[0]["let"]["y"]["value"]["list"][0]
+    ctx = Context({})
+    compile_flow(flow).run_sync(ctx)
+    assert (ctx.get("x"), ctx.get("y")["inner"]) == ({"inner": {"a": 2}, "list": [[1]]}, {"a": 1})
+
+def test_binary_flow_runs_from_a_mapped_file(tmp_path):
+    flow_path = tmp_path / "flow.json"
+    flow_path.write_text(json.dumps({"function": "f", "context": {"a": 5}, "steps": STEPS}))
+    bin_path = emit_binary(str(flow_path))
+    assert bin_path == str(tmp_path / "flow.jfb")
+
+    flow = load_flow(bin_path)
+    assert isinstance(flow, binary.BinaryFlow)
+    program = compile_flow(flow)
+    ctx = Context(dict(flow["context"]))
+    assert program.run_sync(ctx) == 7
+    assert ctx.get("status") == "high"
+    assert compile_flow(load_flow(str(flow_path))) is program
+
+def test_cached_program_is_found_without_decoding_steps():
+    data = binary.encode({"steps": STEPS})
+    program = compile_flow(binary.loads(data))
+    flow = binary.loads(data)
+    assert compile_flow(flow) is program
+    assert "steps" not in flow._fields
+
+def test_rejects_other_files():
+    with pytest.raises(binary.FormatError):
+        binary.loads(b"\0" * 64)
@@ -0,0 +1,41 @@
+import unittest
+
+from base import get_expr_code
+from utils import CodegenCache, structural_key
+
+class TestCodegenCache(unittest.TestCase):
+    def setUp(self):
+        get_expr_code.cache_clear()
+
+    def test_dict_expressions_are_cached_structurally(self):
+        expr = {"compare": {"left": {"get": "a"}, "op": ">", "right": {"value": 1}}}
+        reordered = {"compare": {"right": {"value": 1}, "op": ">", "left": {"get": "a"}}}
+        first = get_expr_code(expr, "python")
+        misses = get_expr_code.cache_info().misses
+        self.assertEqual(get_expr_code(reordered, "python"), first)
+        info = get_expr_code.cache_info()
+        self.assertEqual(info.misses, misses)
+        self.assertGreaterEqual(info.hits, 1)
+
+    def test_language_is_part_of_the_key(self):
+        expr = {"compare": {"left": {"get": "a"}, "op": "===", "right": {"value": 1}}}
+        self.assertNotEqual(get_expr_code(expr, "python"), get_expr_code(expr, "javascript"))
+
+    def test_structural_key(self):
+        self.assertEqual(structural_key({"a": 1, "b": [1, 2]}), structural_key({"b": [1, 2], "a": 1}))
+        self.assertNotEqual(structural_key({"a": 1}), structural_key({"a": True}))
+        self.assertNotEqual(structural_key([1, 2]), structural_key([2, 1]))
+        self.assertNotEqual(structural_key({"a": "1"}), structural_key({"a": 1}))
+
+    def test_lru_eviction(self):
+        cache = CodegenCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.info().currsize, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import asyncio
+import copy
+import json
+
+import pytest
+
+from interpreter import compiler
+from interpreter.compiler import clear_cache, compile_steps
+from interpreter.pool import shutdown_process_pool
+from interpreter.runtime import Context, evaluate_expr, run_steps
+
+STEPS = [
+    {"let": {"total": {"add": [{"get": "a"}, {"get": "b"}, 1]}}},
+    {"set": {"target": ["balances", "alice"], "value": {"get": "total"}}},
+    {"let": {"big": {"compare": {"left": {"get": "total"}, "op": ">", "right": 10}}}},
+    {"map": {"source": "items", "as": "item", "target": "doubled", "body": [
+        {"set": {"target": "item", "value": {"add": [{"get": "item"}, {"get": "item"}]}}}
+    ]}},
+    {"forEach": {"source": "items", "as": "x", "body": [
+        {"set": {"target": "last", "value": {"get": "x"}}}
+    ]}},
+]
+
+def test_compiled_program_matches_expected_state():
+    ctx = Context({"a": 4, "b": 7, "items": [1, 2, 3]})
+    asyncio.run(run_steps(STEPS, ctx))
+    assert ctx.get(["balances", "alice"]) == 12
+    assert ctx.get("big") is True
+    assert ctx.get("doubled") == [2, 4, 6]
+    assert ctx.get("last") == 3
+
+def test_cache_is_keyed_by_content():
+    clear_cache()
+    first = compile_steps(STEPS)
+    assert compile_steps(copy.deepcopy(STEPS)) is first
+    changed = copy.deepcopy(STEPS)
+    changed[0]["let"]["total"]["add"][2] = 2
+    assert compile_steps(changed) is not first
+
+def test_repeat_runs_of_a_step_list_skip_hashing(monkeypatch):
+    clear_cache()
+    steps = copy.deepcopy(STEPS)
+    first = compile_steps(steps)
+    monkeypatch.setattr(compiler, "flow_hash", lambda steps: pytest.fail("steps hashed again"))
+    assert compile_steps(steps) is first
+    monkeypatch.undo()
+    steps[0]["let"]["total"]["add"][2] = 2
+    assert compile_steps(steps) is not first
+
+def test_try_records_step_position():
+    steps = [
+        {"let": {"x": 1}},
+        {"try": {"body": [{"let": {"y": {"compare": {"left": 1, "op": "~", "right": 2}}}}],
+                 "catch": [{"set": {"target": "handled", "value": True}}]}},
+    ]
+    ctx = Context()
+    asyncio.run(run_steps(steps, ctx))
+    assert ctx.get("error")["step"] == 1
+    assert ctx.get("error")["details"]["type"] == "KeyError"
+    assert ctx.get("handled") is True
+
+def test_unsupported_expression_fails_only_when_evaluated():
+    steps = [{"try": {"body": [{"let": {"x": {"bogus": 1}}}], "catch": []}}]
+    asyncio.run(run_steps(steps, Context()))
+    try:
+        asyncio.run(evaluate_expr({"bogus": 1}, Context()))
+    except Exception as e:
+        assert "Unsupported expression" in str(e)
+    else:
+        raise AssertionError("expected evaluation to fail")
+
+def test_transfer_example_compiles():
+    with open("examples/transfer.json") as f:
+        program = json.load(f)
+    assert compile_steps(program["steps"]).key
+
+def test_expressions_without_async_calls_run_synchronously():
+    program = compile_steps(STEPS)
+    assert program.is_async is False
+    ctx = Context({"a": 1, "b": 2, "items": []})
+    program.run_sync(ctx)
+    assert ctx.get("total") == 4
+
+def test_async_call_marks_only_its_path_async():
+    steps = [
+        {"let": {"x": {"add": [1, 2]}}},
+        {"let": {"y": {"call": {"function": "fetch", "args": {"a": {"get": "x"}}, "async": True}}}},
+    ]
+    program = compile_steps(steps)
+    assert program.is_async is True
+    ctx = Context()
+    asyncio.run(program.run(ctx))
+    assert ctx.get("y") == "fetch(3)"
+
+def test_async_map_items_run_concurrently_in_isolated_scopes():
+    steps = [{"map": {"source": "items", "as": "item", "target": "out", "concurrency": 8, "body": [
+        {"let": {"r": {"call": {"function": "f", "args": {"x": {"get": "item"}}, "async": True}}}},
+        {"set": {"target": "item", "value": {"get": "r"}}},
+        {"set": {"target": ["seen", "last"], "value": {"get": "r"}}},
+    ]}}]
+    ctx = Context({"items": list(range(16)), "seen": {"first": 0}})
+    loop = asyncio.new_event_loop()
+    start = loop.time()
+    loop.run_until_complete(run_steps(steps, ctx))
+    elapsed = loop.time() - start
+    loop.close()
+    assert ctx.get("out") == [f"f({i})" for i in range(16)]
+    assert ctx.get("seen") == {"first": 0, "last": "f(15)"}
+    assert ctx.get("item") == "f(15)"
+    assert ctx.get("items") == list(range(16))
+    assert elapsed < 1.0
+
+def test_map_bodies_merge_outer_writes_in_item_order():
+    body = [{"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "item"}]}}}]
+    wait = {"let": {"r": {"call": {"function": "f", "args": {"x": {"get": "item"}}, "async": True}}}}
+    # Sync items each see the writes of the items before them; async items
+    # all start from the total before the map, and the last write wins
+    for steps, total in ((body, 16), ([wait] + body, 13)):
+        ctx = Context({"items": [1, 2, 3], "total": 10})
+        asyncio.run(run_steps([{"map": {"source": "items", "as": "item", "target": "out", "body": steps}}], ctx))
+        assert ctx.get("total") == total
+        assert ctx.get("out") == [1, 2, 3]
+
+def test_child_scope_copies_on_write():
+    parent = Context({"balances": {"alice": 1}, "logs": ["a"]}, {"logs": "array"})
+    scope = parent.child()
+    scope.set(["balances", "bob"], 2, "integer")
+    scope.set("logs", "b", "string")
+    assert parent.get("balances") == {"alice": 1}
+    assert parent.get("logs") == ["a"]
+    assert scope.get(["balances", "alice"]) == 1
+    parent.merge(scope.writes)
+    assert parent.get("balances") == {"alice": 1, "bob": 2}
+    assert parent.get("logs") == ["a", "b"]
+
+def test_process_map_matches_in_process_map():
+    body = [
+        {"set": {"target": "item", "value": {"add": [{"get": "item"}, {"get": "offset"}]}}},
+        {"set": {"target": ["totals", "last"], "value": {"get": "item"}}},
+    ]
+    steps = [{"map": {"source": "items", "as": "item", "target": "out", "body": body}}]
+    process_steps = [{"map": {"source": "items", "as": "item", "target": "out", "body": body,
+                              "executor": "process", "chunk_size": 3}}]
+    expected = Context({"items": list(range(10)), "offset": 5, "totals": {}})
+    asyncio.run(run_steps(steps, expected))
+    ctx = Context({"items": list(range(10)), "offset": 5, "totals": {}})
+    try:
+        asyncio.run(run_steps(process_steps, ctx))
+    finally:
+        shutdown_process_pool()
+    assert ctx.get("out") == expected.get("out") == [i + 5 for i in range(10)]
+    assert ctx.get("totals") == expected.get("totals")
+
+def test_variables_resolve_to_slots_and_data_stays_a_dict_view():
+    program = compile_steps([
+        {"let": {"total": {"add": [{"get": "a"}, 1]}}},
+        {"set": {"target": ["balances", "alice"], "value": {"get": "total"}}},
+    ])
+    assert set(program.layout.names) == {"a", "total", "balances"}
+    ctx = Context({"a": 1, "note": "kept"})
+    program.run_sync(ctx)
+    assert ctx.slots[program.layout.index["total"]] == 2
+    assert ctx.extras == {"note": "kept"}
+    assert ctx.data == {"a": 1, "total": 2, "balances": {"alice": 2}, "note": "kept"}
+    ctx.data["a"] = 5
+    program.run_sync(ctx)
+    assert ctx.get("total") == 6
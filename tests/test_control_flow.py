@@ -0,0 +1,130 @@
+import asyncio
+import logging
+
+import pytest
+
+from interpreter.compiler import compile_steps
+from interpreter.functions import registry
+from interpreter.runtime import Context, run_steps
+
+@pytest.fixture(autouse=True)
+def functions():
+    @registry.register("wait")
+    async def wait(value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    @registry.register("fail")
+    async def fail(delay=0):
+        await asyncio.sleep(delay)
+        raise RuntimeError("branch failed")
+
+    yield registry
+    registry.clear()
+
+def _wait(value, delay):
+    return {"call": {"function": "wait", "args": {"value": value, "delay": delay}, "async": True}}
+
+FAIL = {"call": {"function": "fail", "args": {}, "async": True}}
+
+def _run(steps, initial=None):
+    ctx = Context(initial or {})
+    result = asyncio.run(run_steps(steps, ctx))
+    return ctx, result
+
+def test_if_assert_log_and_return(caplog):
+    steps = [
+        {"assert": {"condition": {"compare": {"left": {"get": "n"}, "op": ">", "right": 0}}, "message": "n must be positive"}},
+        {"if": {"condition": {"compare": {"left": {"get": "n"}, "op": ">", "right": 5}},
+                "then": {"let": {"size": "big"}},
+                "else": [{"let": {"size": "small"}}]}},
+        {"log": {"level": "warning", "message": ["'size is'", "size", {"add": [{"get": "n"}, 1]}]}},
+        {"return": {"get": "size"}},
+        {"let": {"unreachable": True}},
+    ]
+    with caplog.at_level(logging.INFO, logger="jsonflow.flow"):
+        ctx, result = _run(steps, {"n": 3})
+    assert result == "small"
+    assert "unreachable" not in ctx.to_dict()
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [(logging.WARNING, "size is small 4")]
+    with pytest.raises(AssertionError, match="n must be positive"):
+        _run(steps, {"n": 0})
+
+def test_return_unwinds_nested_blocks_and_try():
+    steps = [
+        {"forEach": {"source": "xs", "as": "x", "body": [
+            {"try": {"body": [
+                {"if": {"condition": {"compare": {"left": {"get": "x"}, "op": "===", "right": 2}},
+                        "then": {"return": {"get": "x"}}}},
+            ], "catch": [{"let": {"caught": True}}]}},
+            {"set": {"target": "last", "value": {"get": "x"}}},
+        ]}},
+    ]
+    ctx = Context({"xs": [1, 2, 3]})
+    assert compile_steps(steps).run_sync(ctx) == 2
+    assert ctx.get("last") == 1
+    assert "caught" not in ctx.to_dict()
+
+def test_while_loops_until_condition_or_budget():
+    steps = [{"while": {
+        "condition": {"compare": {"left": {"get": "i"}, "op": "<", "right": 5}},
+        "body": [{"set": {"target": "i", "value": {"add": [{"get": "i"}, 1]}}}],
+    }}]
+    ctx, _ = _run(steps, {"i": 0})
+    assert ctx.get("i") == 5
+    steps[0]["while"]["max_iterations"] = 3
+    with pytest.raises(RuntimeError, match="exceeded 3 iterations"):
+        _run(steps, {"i": 0})
+
+def test_async_while_is_cancelled_by_step_timeout():
+    steps = [{"while": {
+        "condition": {"compare": {"left": _wait(1, 0), "op": "===", "right": 1}},
+        "body": [{"let": {"x": 1}}],
+        "max_iterations": 10 ** 9,
+    }, "timeout": {"duration": "50ms"}}]
+    with pytest.raises(asyncio.TimeoutError):
+        _run(steps)
+
+def test_parallel_branches_run_concurrently_in_isolated_scopes():
+    steps = [{"parallel": {"branches": [
+        [{"let": {"a": _wait("a", 0.05)}}, {"set": {"target": ["seen", "a"], "value": {"get": "a"}}}],
+        [{"let": {"b": _wait("b", 0.05)}}, {"set": {"target": ["seen", "b"], "value": {"get": "b"}}}],
+        {"let": {"c": _wait("c", 0.05)}},
+    ]}}]
+    ctx = Context({"seen": {}})
+    loop = asyncio.new_event_loop()
+    start = loop.time()
+    loop.run_until_complete(run_steps(steps, ctx))
+    elapsed = loop.time() - start
+    loop.close()
+    assert (ctx.get("a"), ctx.get("b"), ctx.get("c")) == ("a", "b", "c")
+    assert ctx.get("seen") == {"a": "a", "b": "b"}
+    assert elapsed < 0.12
+
+def test_parallel_join_policies():
+    branches = [
+        [{"let": {"slow": _wait(1, 0.2)}}],
+        [{"let": {"failed": FAIL}}],
+        [{"let": {"fast": _wait(2, 0.01)}}],
+    ]
+
+    ctx = Context()
+    with pytest.raises(RuntimeError, match="branch failed"):
+        asyncio.run(run_steps([{"parallel": {"branches": branches}}], ctx))
+    assert (ctx.get("slow"), ctx.get("fast")) == (1, 2)
+
+    ctx = Context()
+    with pytest.raises(RuntimeError, match="branch failed"):
+        asyncio.run(run_steps([{"parallel": {"branches": branches, "join": "first-error"}}], ctx))
+    assert "slow" not in ctx.to_dict()
+
+    ctx, _ = _run([{"parallel": {"branches": branches, "join": "any"}}])
+    assert ctx.to_dict() == {"fast": 2}
+
+    with pytest.raises(RuntimeError, match="branch failed"):
+        _run([{"parallel": {"branches": [[{"let": {"x": FAIL}}]], "join": "any"}}])
+
+def test_parallel_without_branches_does_nothing():
+    for join in ("all", "first-error", "any"):
+        ctx, _ = _run([{"let": {"x": 1}}, {"parallel": {"branches": [], "join": join}}, {"let": {"y": 2}}])
+        assert ctx.to_dict() == {"x": 1, "y": 2}
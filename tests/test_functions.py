@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from interpreter.batch import run_batch_async
+from interpreter.compiler import compile_flow
+from interpreter.functions import registry
+from interpreter.resilience import parse_duration
+from interpreter.runtime import Context, run_steps
+
+@pytest.fixture(autouse=True)
+def functions():
+    yield registry
+    registry.clear()
+
+def _call(function, args, **options):
+    return {"call": {"function": function, "args": args, **options}}
+
+def test_registered_functions_receive_keyword_arguments():
+    registry.register("scale", lambda x, factor: x * factor)
+
+    @registry.register("fetch")
+    async def fetch(key):
+        await asyncio.sleep(0)
+        return {"key": key}
+
+    steps = [
+        {"let": {"y": _call("scale", {"x": {"get": "x"}, "factor": 3})}},
+        {"let": {"z": _call("fetch", {"key": "a"}, **{"async": True})}},
+    ]
+    ctx = Context({"x": 2})
+    asyncio.run(run_steps(steps, ctx))
+    assert ctx.get("y") == 6
+    assert ctx.get("z") == {"key": "a"}
+
+def test_unregistered_functions_evaluate_to_a_placeholder():
+    ctx = Context()
+    asyncio.run(run_steps([{"let": {"y": _call("missing", {"a": 1, "b": 2})}}], ctx))
+    assert ctx.get("y") == "missing(1, 2)"
+
+def test_async_function_requires_an_async_call():
+    @registry.register("fetch")
+    async def fetch():
+        return 1
+
+    with pytest.raises(TypeError):
+        asyncio.run(run_steps([{"let": {"y": _call("fetch", {})}}], Context()))
+
+def test_async_arguments_are_awaited_concurrently():
+    @registry.register("slow")
+    async def slow(n):
+        await asyncio.sleep(0.05)
+        return n
+
+    registry.register("total", lambda **values: sum(values.values()))
+    args = {f"a{i}": _call("slow", {"n": i}, **{"async": True}) for i in range(10)}
+    ctx = Context()
+    loop = asyncio.new_event_loop()
+    start = loop.time()
+    loop.run_until_complete(run_steps([{"let": {"y": _call("total", args)}}], ctx))
+    elapsed = loop.time() - start
+    loop.close()
+    assert ctx.get("y") == sum(range(10))
+    assert elapsed < 0.3
+
+def test_function_max_concurrency_limits_calls_in_flight():
+    in_flight = [0, 0]
+
+    @registry.register("limited", max_concurrency=2)
+    async def limited(n):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return n
+
+    steps = [{"map": {"source": "items", "as": "item", "target": "out", "body": [
+        {"set": {"target": "item", "value": _call("limited", {"n": {"get": "item"}}, **{"async": True})}},
+    ]}}]
+    ctx = Context({"items": list(range(8))})
+    asyncio.run(run_steps(steps, ctx))
+    assert ctx.get("out") == list(range(8))
+    assert in_flight[1] == 2
+
+def test_step_timeout_cancels_the_step():
+    cancelled = []
+
+    @registry.register("hang")
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    steps = [{"let": {"y": _call("hang", {}, **{"async": True})}, "timeout": {"duration": "20ms"}}]
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_steps(steps, Context()))
+    assert cancelled == [True]
+
+def test_parse_duration():
+    assert parse_duration("500ms") == 0.5
+    assert parse_duration("30s") == 30
+    assert parse_duration("1m") == 60
+    assert parse_duration(2) == 2
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+def test_max_concurrent_runs_limits_batch_runs():
+    in_flight = [0, 0]
+
+    @registry.register("work")
+    async def work(n):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return n * 2
+
+    flow = {
+        "execution_policy": {"max_concurrent_runs": 3},
+        "steps": [{"let": {"y": _call("work", {"n": {"get": "n"}}, **{"async": True})}}],
+    }
+    assert compile_flow(flow).max_concurrent_runs == 3
+
+    async def collect():
+        return [result async for result in run_batch_async(flow, [{"n": i} for i in range(10)])]
+
+    results = asyncio.run(collect())
+    assert [result.data["y"] for result in results] == [i * 2 for i in range(10)]
+    assert in_flight[1] == 3
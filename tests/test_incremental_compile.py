@@ -0,0 +1,58 @@
+import json
+
+from main import compile_jsonflow
+from utils import StepCache
+
+def build_flow(steps):
+    return {
+        "function": "accumulate",
+        "schema": {"inputs": {"amount": {"type": "integer"}}, "context": {"balance": "integer", "logs": "array"}},
+        "steps": [
+            {"set": {"target": "balance", "value": {"add": [{"get": "balance"}, {"value": i}]}}}
+            for i in range(steps)
+        ] + [{"set": {"target": "logs", "value": {"get": "balance"}}}],
+    }
+
+def write(path, flow):
+    with open(path, "w") as f:
+        json.dump(flow, f)
+
+def test_one_step_edit_regenerates_one_step_per_backend(tmp_path):
+    path = tmp_path / "flow.json"
+    flow = build_flow(20)
+    write(path, flow)
+    step_cache = StepCache()
+    compile_jsonflow(path, step_cache)
+    assert step_cache.misses == 3 * 21
+
+    flow["steps"][7]["set"]["value"]["add"][1]["value"] = -7
+    write(path, flow)
+    result = compile_jsonflow(path, step_cache)
+
+    assert step_cache.misses == 3 * 22
+    assert result == compile_jsonflow(path)
+    assert "balance + -7" in result["python"]
+
+def test_step_cache_persists_to_disk(tmp_path):
+    path = tmp_path / "flow.json"
+    write(path, build_flow(5))
+    cache_path = str(tmp_path / "flow.stepcache.json")
+    expected = compile_jsonflow(path, StepCache(cache_path))
+
+    reloaded = StepCache(cache_path)
+    assert compile_jsonflow(path, reloaded) == expected
+    assert reloaded.misses == 0
+    assert reloaded.hits == 3 * 6
+
+def test_persisted_steps_are_regenerated_after_a_generator_change(tmp_path):
+    path = tmp_path / "flow.json"
+    write(path, build_flow(5))
+    cache_path = str(tmp_path / "flow.stepcache.json")
+    compile_jsonflow(path, StepCache(cache_path, version="old"))
+
+    upgraded = StepCache(cache_path, version="new")
+    compile_jsonflow(path, upgraded)
+    assert upgraded.hits == 0
+    assert upgraded.misses == 3 * 6
+    with open(cache_path) as f:
+        assert all(lang.endswith("@new") for lang in json.load(f))
@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("lark")
+
+import kidlang_grammar
+from kidlang_grammar import parse_kid_script
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(kidlang_grammar, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(kidlang_grammar, "_parser", None)
+    monkeypatch.setattr(kidlang_grammar, "_script_parser", None)
+    return tmp_path
+
+def test_script_is_parsed_line_by_line_in_order():
+    script = 'set balance to 100\n\nif balance is greater than 50, then say "High"\n  return balance\n'
+    assert parse_kid_script(script) == [
+        {"set": {"target": "balance", "value": {"value": 100}}},
+        {"if": {
+            "condition": {"compare": {"left": {"get": "balance"}, "op": ">", "right": {"value": 50}}},
+            "then": [{"log": {"level": "info", "message": [{"value": "High"}]}}],
+            "else": [],
+        }},
+        {"return": {"get": "balance"}},
+    ]
+
+def test_bad_lines_are_reported_with_line_numbers():
+    lines = [f"set v{i} to {i}" for i in range(kidlang_grammar.SCRIPT_CHUNK_LINES + 5)]
+    lines[3] = "set v3 to"
+    lines[-2] = "bogus line"
+    blocks = parse_kid_script("\n".join(lines))
+    assert len(blocks) == len(lines)
+    assert [block["line"] for block in blocks if "error" in block] == [4, len(lines) - 1]
+    assert blocks[3]["error"].startswith("Parse error on line 4, column 10")
+    assert blocks[-1] == {"set": {"target": f"v{len(lines) - 1}", "value": {"value": len(lines) - 1}}}
+
+def test_parse_tables_are_saved_and_reused(cache_dir):
+    kidlang_grammar.get_script_parser()
+    [saved] = cache_dir.glob("kidlang.script.*.lark-cache")
+    built = saved.stat().st_mtime_ns
+    parser = kidlang_grammar.load_parser("script", transformer=kidlang_grammar.KidLangTransformer())
+    assert parser.parse("return a\n") == [{"return": {"get": "a"}}]
+    assert [path.name for path in cache_dir.iterdir()] == [saved.name]
+    assert saved.stat().st_mtime_ns == built
+
+def test_grammar_change_rebuilds_the_tables(cache_dir, tmp_path_factory, monkeypatch):
+    kidlang_grammar.load_parser("start")
+    [old] = cache_dir.glob("kidlang.start.*.lark-cache")
+    grammar = tmp_path_factory.mktemp("grammar") / "kidlang.lark"
+    with open(kidlang_grammar.GRAMMAR_PATH) as f:
+        grammar.write_text(f.read() + "\n// changed\n")
+    monkeypatch.setattr(kidlang_grammar, "GRAMMAR_PATH", str(grammar))
+    kidlang_grammar.load_parser("start")
+    [new] = cache_dir.glob("kidlang.start.*.lark-cache")
+    assert new.name != old.name
+
+def test_single_sentences_may_span_or_end_with_newlines():
+    x, y = ({"set": {"target": name, "value": {"value": value}}} for name, value in (("x", 1), ("y", 2)))
+    assert kidlang_grammar.parse_kid_sentence_grammar("set x to 1\n").children == [x]
+    assert kidlang_grammar.parse_kid_sentence_grammar("set x to 1\r\nset y to 2").children == [x, y]
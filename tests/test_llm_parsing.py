@@ -0,0 +1,72 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import llmsyntax
+from llmsyntax import DiskCache, StandInModel, parse_sentences_llm
+
+def _respond(sentence):
+    name, value = sentence.split(" to ")
+    return {"set": {"target": name.split()[-1], "value": {"value": int(value)}}}
+
+SENTENCES = [f"set v{i} to {i}" for i in range(7)]
+
+def test_sentences_are_parsed_in_batches_in_order(tmp_path):
+    model = StandInModel(_respond)
+    blocks = parse_sentences_llm(SENTENCES + SENTENCES[:2], model=model, cache=DiskCache(tmp_path), batch_size=3)
+    assert blocks == [_respond(sentence) for sentence in SENTENCES + SENTENCES[:2]]
+    assert model.requests == 3
+
+def test_requests_run_concurrently_up_to_the_limit(tmp_path):
+    in_flight = [0, 0]
+
+    class SlowModel(StandInModel):
+        async def complete(self, prompt, count):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+            await asyncio.sleep(0.02)
+            in_flight[0] -= 1
+            return await super().complete(prompt, count)
+
+    model = SlowModel(_respond)
+    parse_sentences_llm(SENTENCES, model=model, cache=DiskCache(tmp_path), batch_size=1, max_concurrency=3)
+    assert model.requests == len(SENTENCES)
+    assert in_flight[1] == 3
+
+def test_cached_blocks_survive_across_runs(tmp_path):
+    parse_sentences_llm(SENTENCES, model=StandInModel(_respond), cache=DiskCache(tmp_path))
+    model = StandInModel(_respond)
+    blocks = parse_sentences_llm(SENTENCES, model=model, cache=DiskCache(tmp_path))
+    assert blocks == [_respond(sentence) for sentence in SENTENCES]
+    assert model.requests == 0
+
+def test_prompt_version_change_invalidates_the_cache(tmp_path, monkeypatch):
+    parse_sentences_llm(SENTENCES, model=StandInModel(_respond), cache=DiskCache(tmp_path))
+    monkeypatch.setattr(llmsyntax, "PROMPT_VERSION", llmsyntax.PROMPT_VERSION + "-next")
+    model = StandInModel(_respond)
+    parse_sentences_llm(SENTENCES, model=model, cache=DiskCache(tmp_path))
+    assert model.requests == 1
+
+def test_malformed_responses_are_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(llmsyntax, "RETRY_DELAY", 0)
+
+    class FlakyModel(StandInModel):
+        async def complete(self, prompt, count):
+            content = await super().complete(prompt, count)
+            return "not json" if self.requests == 1 else f"Here you go: {content}"
+
+    model = FlakyModel(_respond)
+    assert parse_sentences_llm(SENTENCES[:2], model=model, cache=DiskCache(tmp_path)) == [
+        _respond(sentence) for sentence in SENTENCES[:2]
+    ]
+    assert model.requests == 2
+
+def test_importing_the_parsers_does_not_load_heavy_dependencies():
+    code = (
+        "import sys; sys.path[:0] = ['parser', 'interpreter']; import llmsyntax, main; "
+        "print(sorted({'spacy', 'openai', 'lark'} & set(sys.modules)))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert out.strip() == "[]"
@@ -0,0 +1,155 @@
+import asyncio
+
+from interpreter import profiling
+from interpreter.call_cache import MISSING, TTLCache, call_cache
+from interpreter.compiler import compile_steps
+from interpreter.functions import registry
+from interpreter.runtime import Context, run_steps
+
+TOTAL = {"add": [{"get": ["prices", "a"]}, {"get": ["prices", "b"]}]}
+
+def _run_profiled(steps, initial):
+    profiler = profiling.enable_profiling()
+    try:
+        ctx = Context(initial)
+        asyncio.run(run_steps(steps, ctx))
+    finally:
+        profiling.disable_profiling()
+    return ctx, profiler.summary()["expressions"]
+
+def test_repeated_pure_expression_is_evaluated_once():
+    steps = [
+        {"let": {"total": TOTAL}},
+        {"let": {"big": {"compare": {"left": TOTAL, "op": ">", "right": 10}}}},
+        {"set": {"target": "again", "value": TOTAL}},
+    ]
+    ctx, exprs = _run_profiled(steps, {"prices": {"a": 4, "b": 9}})
+    assert (ctx.get("total"), ctx.get("big"), ctx.get("again")) == (13, True, 13)
+    assert exprs["add"]["calls"] == 1
+    assert compile_steps(steps).layout.temps == 4
+
+def test_write_between_occurrences_invalidates():
+    steps = [
+        {"let": {"before": {"add": [{"get": "x"}, 1]}}},
+        {"set": {"target": "x", "value": 10}},
+        {"let": {"after": {"add": [{"get": "x"}, 1]}}},
+        {"set": {"target": ["prices", "a"], "value": 100}},
+        {"let": {"total": TOTAL}},
+    ]
+    ctx, exprs = _run_profiled(steps, {"x": 1, "prices": {"a": 4, "b": 9}})
+    assert (ctx.get("before"), ctx.get("after"), ctx.get("total")) == (2, 11, 109)
+    assert exprs["add"]["calls"] == 3
+
+def test_binding_within_let_invalidates_later_bindings():
+    steps = [{"let": {
+        "first": {"add": [{"get": "n"}, 1]},
+        "n": 5,
+        "second": {"add": [{"get": "n"}, 1]},
+    }}]
+    ctx = Context({"n": 1})
+    asyncio.run(run_steps(steps, ctx))
+    assert (ctx.get("first"), ctx.get("second")) == (2, 6)
+
+def test_loop_body_is_recomputed_each_iteration():
+    steps = [
+        {"set": {"target": "total", "value": 0}},
+        {"forEach": {"source": "xs", "as": "x", "body": [
+            {"let": {"y": {"add": [{"get": "x"}, 1]}}},
+            {"set": {"target": "total", "value": {"add": [{"get": "total"}, {"add": [{"get": "x"}, 1]}]}}},
+        ]}},
+    ]
+    ctx = Context({"xs": [1, 2, 3]})
+    asyncio.run(run_steps(steps, ctx))
+    assert ctx.get("total") == 9
+
+def test_non_deterministic_steps_are_not_memoized():
+    steps = [
+        {"let": {"a": TOTAL}},
+        {"let": {"b": TOTAL}, "deterministic": False},
+    ]
+    _, exprs = _run_profiled(steps, {"prices": {"a": 1, "b": 2}})
+    assert exprs["add"]["calls"] == 2
+
+def test_cached_calls_are_reused_across_runs():
+    call_cache.clear()
+    steps = [{"let": {"q": {"call": {
+        "function": "quote", "args": {"symbol": {"get": "symbol"}},
+        "cache": {"enabled": True, "ttl": 60},
+    }}}}]
+    for _ in range(3):
+        ctx = Context({"symbol": "ABC"})
+        asyncio.run(run_steps(steps, ctx))
+        assert ctx.get("q") == "quote(ABC)"
+    assert (call_cache.hits, call_cache.misses) == (2, 1)
+
+def test_ttl_cache_expires_entries():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, clock=lambda: now[0])
+    cache.put("a", 1, ttl=10)
+    cache.put("b", 2, ttl=0)
+    assert cache.get("a") == 1
+    assert cache.get("b") is MISSING
+    now[0] = 10.0
+    assert cache.get("a") is MISSING
+    cache.put("a", 1, ttl=10)
+    cache.put("b", 2, ttl=10)
+    cache.put("c", 3, ttl=10)
+    assert cache.get("a") is MISSING
+    assert cache.get("c") == 3
+
+def test_skipped_logical_operands_are_not_reused():
+    steps = [
+        {"let": {"a": {"and": [False, TOTAL]}}},
+        {"let": {"b": {"or": [{"get": "flag"}, TOTAL]}}},
+        {"return": TOTAL},
+    ]
+    ctx = Context({"flag": True, "prices": {"a": 4, "b": 9}})
+    assert compile_steps(steps).run_sync(ctx) == 13
+    assert (ctx.get("a"), ctx.get("b")) == (False, True)
+
+def test_cached_calls_are_keyed_by_argument_name():
+    call_cache.clear()
+    registry.register("sub", lambda a, b: a - b)
+
+    def sub(args):
+        return {"call": {"function": "sub", "args": args, "cache": {"enabled": True, "ttl": 60}}}
+
+    steps = [
+        {"let": {"first": sub({"a": 10, "b": 3})}},
+        {"let": {"second": sub({"b": 10, "a": 3})}},
+        {"let": {"third": sub({"b": 3, "a": 10})}},
+    ]
+    ctx = Context({})
+    try:
+        asyncio.run(run_steps(steps, ctx))
+    finally:
+        registry.unregister("sub")
+    assert (ctx.get("first"), ctx.get("second"), ctx.get("third")) == (7, -7, 7)
+    assert call_cache.misses == 2
+
+def test_append_through_an_alias_invalidates_reused_results():
+    steps = [
+        {"let": {"n": {"length": {"get": ["data", "items"]}}}},
+        {"let": {"alias": {"get": ["data", "items"]}}},
+        {"set": {"target": "alias", "value": 5}},
+        {"let": {"m": {"length": {"get": ["data", "items"]}}}},
+    ]
+    ctx = Context({"data": {"items": [1]}}, {"alias": "array"})
+    compile_steps(steps).run_sync(ctx)
+    assert (ctx.get("n"), ctx.get("m")) == (1, 2)
+
+def test_loop_iterations_do_not_reuse_results_from_failed_guarded_steps():
+    recorded = []
+    registry.register("record", lambda value: recorded.append(value))
+    next_item = {"add": [{"get": "item"}, 1]}
+    steps = [{"forEach": {"source": "items", "as": "item", "body": [
+        # Fails for item 100 before it computes item + 1
+        {"let": {"ratio": {"multiply": [{"divide": [1, {"subtract": [{"get": "item"}, 100]}]}, next_item]}},
+         "on_error": {"body": [{"let": {"ratio": 0}}]}},
+        {"let": {"r": {"call": {"function": "record", "args": {"value": next_item}}}}},
+    ]}}]
+    try:
+        asyncio.run(run_steps(steps, Context({"items": [1, 100]})))
+    finally:
+        registry.unregister("record")
+    assert recorded == [2, 101]
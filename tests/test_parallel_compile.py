@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from main import DEFAULT_BACKENDS, compile_jsonflow, compile_many
+
+BACKENDS = DEFAULT_BACKENDS + ("rust",)
+
+def write_flows(directory, count):
+    for i in range(count):
+        flow = {
+            "function": f"flow{i}",
+            "schema": {"inputs": {"amount": {"type": "integer"}}, "context": {"balance": "integer"}},
+            "steps": [{"set": {"target": "balance", "value": {"add": [{"get": "balance"}, {"value": i}]}}}],
+        }
+        with open(directory / f"flow{i}.json", "w") as f:
+            json.dump(flow, f)
+    (directory / "notes.txt").write_text("not a flow")
+
+def test_compile_many_matches_serial_compilation(tmp_path):
+    write_flows(tmp_path, 3)
+    results = compile_many([str(tmp_path)], BACKENDS, workers=2)
+
+    assert sorted(results) == [str(tmp_path / f"flow{i}.json") for i in range(3)]
+    for path, result in results.items():
+        assert result == compile_jsonflow(path, backends=BACKENDS)
+        assert set(result) == {"cost", *BACKENDS}
+
+def test_single_flow_backends_run_in_pool(tmp_path):
+    write_flows(tmp_path, 1)
+    path = str(tmp_path / "flow0.json")
+    assert compile_jsonflow(path, workers=4) == compile_jsonflow(path)
+
+def test_unknown_backend_is_rejected(tmp_path):
+    write_flows(tmp_path, 1)
+    with pytest.raises(ValueError):
+        compile_many([str(tmp_path)], ("cobol",))
@@ -0,0 +1,52 @@
+import asyncio
+import io
+import json
+
+from interpreter import profiling
+from interpreter.compiler import compile_steps
+from interpreter.runtime import Context, run_steps
+
+STEPS = [
+    {"id": "init", "set": {"target": "total", "value": 0}},
+    {"forEach": {"source": "xs", "as": "x", "body": [
+        {"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "x"}]}}},
+        {"let": {"big": {"compare": {"left": {"get": "total"}, "op": ">", "right": {"value": 10}}}}},
+    ]}},
+]
+
+def test_profiler_records_steps_by_id_or_path_and_expression_kinds():
+    profiler = profiling.enable_profiling(memory=True)
+    try:
+        ctx = Context({"xs": [1, 2, 3, 4, 5]})
+        asyncio.run(run_steps(STEPS, ctx))
+    finally:
+        profiling.disable_profiling()
+    assert ctx.get("total") == 15
+
+    summary = profiler.summary()
+    steps = {entry["step"]: entry for entry in summary["steps"]}
+    assert set(steps) == {"init", "1:forEach", "1:forEach;0:set", "1:forEach;1:let"}
+    assert steps["init"]["calls"] == 1
+    assert steps["1:forEach;0:set"]["calls"] == 5
+    assert steps["1:forEach"]["wall_ns"] >= steps["1:forEach;0:set"]["wall_ns"] + steps["1:forEach;1:let"]["wall_ns"]
+    assert all("alloc_bytes" in entry for entry in summary["steps"])
+    assert summary["expressions"]["add"]["calls"] == 5
+    assert summary["expressions"]["get"]["calls"] == 5 * 3
+
+    out = io.StringIO()
+    profiler.dump_collapsed(out)
+    stacks = dict(line.rsplit(" ", 1) for line in out.getvalue().splitlines())
+    assert set(stacks) == set(steps)
+    assert all(int(ns) >= 0 for ns in stacks.values())
+    json.loads(json.dumps(summary))
+
+def test_profiled_programs_are_cached_separately():
+    plain = compile_steps(STEPS)
+    profiling.enable_profiling()
+    try:
+        profiled = compile_steps(STEPS)
+    finally:
+        profiling.disable_profiling()
+    assert profiled is not plain
+    assert profiled.key == plain.key
+    assert compile_steps(STEPS) is plain
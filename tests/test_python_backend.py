@@ -0,0 +1,163 @@
+import copy
+import glob
+import json
+import logging
+import os
+
+import pytest
+
+from interpreter.batch import schema_types
+from interpreter.compiler import compile_flow
+from interpreter.context import Context
+from python import generate_python_function, generate_python_program, load_python_function
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EXAMPLES = sorted(glob.glob(os.path.join(ROOT, "examples", "*.json")))
+
+# Paths like ["balances", "sender"] read literal keys, so the examples get
+# balances keyed that way.
+INPUTS = {
+    "square": {"x": 7},
+    "transfer": {"sender": "alice", "recipient": "bob", "amount": 30,
+                 "balances": {"sender": 100, "recipient": None}},
+    "deposit": {"key": "alice", "amount": 5, "balances": {"sender": 10}},
+}
+
+LEDGER = {
+    "function": "ledger",
+    "schema": {"inputs": {}, "context": {"history": "array", "total": "integer"}},
+    "context": {"history": [], "total": 0},
+    "steps": [
+        {"let": {"count": {"length": {"get": "items"}}, "seen": {"value": []}}},
+        {"set": {"target": "label", "value": {"call": {
+            "function": "describe", "args": {"n": {"get": "count"}}, "cache": {"enabled": True, "ttl": 60}}}}},
+        {"forEach": {"source": "items", "as": "item", "body": [
+            {"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "item"}]}}},
+            {"set": {"target": "history", "value": {"get": "total"}}},
+            {"if": {
+                "condition": {"and": [
+                    {"compare": {"left": {"get": "item"}, "op": ">", "right": 2}},
+                    {"not": {"in": {"item": {"get": "item"}, "array": {"value": [4]}}}},
+                ]},
+                "then": [{"set": {"target": ["stats", "big"], "value": {"get": "item"}}}],
+            }},
+        ]}},
+        {"map": {"source": "items", "as": "x", "target": "squares", "body": [
+            {"set": {"target": "x", "value": {"multiply": [{"get": "x"}, {"get": "x"}]}}},
+        ]}},
+        {"let": {"i": 0}},
+        {"while": {
+            "condition": {"compare": {"left": {"get": "i"}, "op": "<", "right": {"get": "count"}}},
+            "max_iterations": 4,
+            "body": [{"let": {"i": {"add": [{"get": "i"}, 1]}}}],
+        }},
+        {"try": {
+            "body": [{"set": {"target": "ratio", "value": {"divide": [{"get": "total"}, {"get": "zero"}]}}}],
+            "catch": [{"log": {"level": "warning", "message": ["'failed:'", "error"]}}],
+        }},
+        {"set": {"target": "copy", "value": {"get": "nope"}},
+         "on_error": {"body": [{"set": {"target": "recovered", "value": {"value": True}}}]}},
+        {"assert": {"condition": {"or": [{"get": "recovered"}, {"get": "nope"}]}, "message": "not recovered"}},
+        {"emit": {"event": "ignored"}},
+        {"if": {
+            "condition": {"compare": {"left": {"mod": [{"get": "total"}, 2]}, "op": "==", "right": 0}},
+            "then": {"return": {"get": ["stats", "big"]}},
+            "else": [{"return": {"neg": {"subtract": [{"get": "total"}, 1, 2]}}}],
+        }},
+    ],
+}
+
+LEDGER_INPUTS = [
+    {"items": [1, 2, 3, 4], "zero": 0},
+    {"items": [1, 2, 3], "zero": 2},
+    {"items": [], "zero": 0},
+    {"items": [1, 2, 3, 4, 5], "zero": 1},
+    {"items": [1], "nope": 0, "recovered": False, "zero": 1},
+]
+
+def interpret(flow, variables):
+    program = compile_flow(flow)
+    ctx = Context(variables, schema_types(flow))
+    return program.run_sync(ctx), ctx.to_dict()
+
+def run_native(flow, variables):
+    return load_python_function(flow)(variables), variables
+
+def outcome(run, flow, inputs, caplog):
+    caplog.clear()
+    variables = {**copy.deepcopy(flow.get("context", {})), **copy.deepcopy(inputs)}
+    try:
+        result = ("ok",) + run(flow, variables)
+    except Exception as e:
+        result = (type(e).__name__, str(e))
+    messages = [(record.levelno, record.getMessage()) for record in caplog.records if record.name == "jsonflow.flow"]
+    return result, messages
+
+def assert_same(flow, inputs, caplog):
+    with caplog.at_level(logging.INFO, logger="jsonflow.flow"):
+        expected = outcome(interpret, flow, inputs, caplog)
+        assert outcome(run_native, flow, inputs, caplog) == expected
+    return expected
+
+@pytest.mark.parametrize("path", EXAMPLES, ids=lambda path: os.path.basename(path))
+def test_examples_match_the_interpreter(path, caplog):
+    with open(path) as f:
+        flow = json.load(f)
+    assert_same(flow, INPUTS.get(flow["function"], {}), caplog)
+
+def test_every_step_kind_matches_the_interpreter(caplog):
+    results = [assert_same(LEDGER, inputs, caplog)[0] for inputs in LEDGER_INPUTS]
+    assert results[0][1] == 3
+    assert results[0][2]["history"] == [1, 3, 6, 10]
+    assert results[0][2]["squares"] == [1, 4, 9, 16]
+    assert results[0][2]["label"] == "describe(4)"
+    assert results[1][2]["ratio"] == 3.0
+    assert results[2] == ("KeyError", "'stats'")
+    assert results[3] == ("RuntimeError", "while loop exceeded 4 iterations")
+    assert results[4] == ("AssertionError", "not recovered")
+
+def test_functions_are_cached_and_write_back_assigned_variables():
+    fn = load_python_function(LEDGER)
+    assert load_python_function(copy.deepcopy(LEDGER)) is fn
+    variables = {"items": [2, 3], "history": [], "total": 0, "zero": 1}
+    assert fn(variables) == -2
+    assert variables["history"] == [2, 5] and variables["stats"] == {"big": 3} and "nope" not in variables
+
+def test_steps_the_native_mode_cannot_match_are_rejected():
+    parallel = {"function": "f", "steps": [{"parallel": {"branches": [[], []]}}]}
+    async_call = {"function": "f", "steps": [{"set": {"target": "x", "value": {"call": {"function": "g", "async": True}}}}]}
+    accumulate = {"function": "f", "steps": [{"map": {"source": "items", "as": "x", "target": "out", "body": [
+        {"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "x"}]}}}]}}]}
+    for flow in (parallel, async_call, accumulate):
+        with pytest.raises(ValueError):
+            generate_python_program(flow)
+
+def test_generated_source_maps_and_returns():
+    flow = {
+        "function": "double_all",
+        "schema": {"inputs": {"values": "array"}, "context": {}},
+        "steps": [
+            {"map": {"source": "values", "as": "v", "target": "doubled", "body": []}},
+            {"return": {"get": "doubled"}},
+        ],
+    }
+    code = generate_python_function(flow)
+    compile(code, "<double_all>", "exec")
+    assert "for v in values:" in code and "doubled.append(v)" in code
+    assert "return doubled" in code and "return balance" not in code
+
+def test_reloading_a_flow_object_skips_hashing_until_it_is_edited(monkeypatch):
+    import python
+
+    flow = copy.deepcopy(LEDGER)
+    fn = load_python_function(flow)
+
+    def rehashed(*args):
+        raise AssertionError("flow hashed again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(python, "structural_key", rehashed)
+        assert load_python_function(flow) is fn
+    flow["steps"][-1] = {"return": {"value": 1}}
+    assert load_python_function(flow) is not fn
+    assert load_python_function(flow)({"items": [], "history": [], "total": 0, "zero": 1}) == 1
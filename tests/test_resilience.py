@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from interpreter import resilience
+from interpreter.functions import registry
+from interpreter.resilience import StepTimeout
+from interpreter.runtime import Context, run_steps
+
+@pytest.fixture(autouse=True)
+def functions(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY", 0.001)
+    attempts = []
+
+    @registry.register("flaky")
+    async def flaky(hangs):
+        attempts.append(len(attempts))
+        if len(attempts) <= hangs:
+            await asyncio.sleep(10)
+        return len(attempts)
+
+    @registry.register("fail")
+    def fail():
+        raise ValueError("bad input")
+
+    yield attempts
+    registry.clear()
+
+def _flaky(hangs):
+    return {"call": {"function": "flaky", "args": {"hangs": hangs}, "async": True}}
+
+def _step(hangs, **timeout):
+    return {"id": "fetch", "let": {"r": _flaky(hangs)}, "timeout": {"duration": "20ms", **timeout}}
+
+def _run(steps):
+    ctx = Context()
+    asyncio.run(run_steps(steps, ctx))
+    return ctx
+
+def test_timeout_retries_with_backoff_until_an_attempt_succeeds(functions):
+    ctx = _run([_step(2, action="retry", max_retries=3)])
+    assert ctx.get("r") == 3
+    assert functions == [0, 1, 2]
+
+def test_timeout_gives_up_after_max_retries(functions):
+    with pytest.raises(StepTimeout, match="Step 0 timed out"):
+        _run([_step(5, action="retry", max_retries=1)])
+    assert functions == [0, 1]
+
+def test_timeout_skip_continues_without_partial_writes():
+    steps = [
+        {"let": {"before": 1}},
+        {"let": {"partial": 1, "r": _flaky(1)}, "timeout": {"duration": "20ms", "action": "skip"}},
+        {"let": {"after": 2}},
+    ]
+    ctx = _run(steps)
+    assert ctx.to_dict() == {"before": 1, "after": 2}
+
+def test_timeouts_raised_inside_the_step_are_not_its_own(functions):
+    @registry.register("deadline")
+    def deadline():
+        functions.append("called")
+        raise TimeoutError("upstream deadline")
+
+    for action in ("retry", "skip"):
+        functions.clear()
+        step = {"let": {"r": {"call": {"function": "deadline"}}}, "timeout": {"duration": "1s", "action": action}}
+        with pytest.raises(TimeoutError, match="upstream deadline"):
+            _run([step])
+        assert functions == ["called"]
+
+    # A nested step's own deadline is not retried by the outer one
+    functions.clear()
+    inner = _step(5)
+    outer = {"if": {"condition": {"value": True}, "then": [inner]}, "timeout": {"duration": "1s", "action": "retry", "max_retries": 2}}
+    with pytest.raises(StepTimeout, match="Step 0 timed out"):
+        _run([outer])
+    assert functions == [0]
+
+def test_on_error_body_handles_failures():
+    steps = [
+        {"let": {"x": {"call": {"function": "fail", "args": {}}}},
+         "on_error": {"body": [{"set": {"target": "handled", "value": {"get": ["error", "message"]}}}]}},
+        {"let": {"after": True}},
+    ]
+    ctx = _run(steps)
+    assert ctx.get("handled") == "bad input"
+    assert ctx.get(["error", "step"]) == 0
+    assert ctx.get("after") is True
+
+def test_on_error_step_id_runs_the_referenced_step():
+    steps = [
+        {"let": {"x": {"call": {"function": "fail", "args": {}}}}, "on_error": {"step_id": "recover"}},
+        {"id": "recover", "let": {"recovered": {"add": [{"get": "recovered"}, 1]}},
+         "on_error": {"step_id": "recover"}},
+    ]
+    ctx = Context({"recovered": 0})
+    asyncio.run(run_steps(steps, ctx))
+    assert ctx.get("recovered") == 2
+
+def test_exhausted_timeout_falls_through_to_on_error():
+    steps = [{**_step(5), "on_error": {"body": [{"let": {"fallback": True}}]}}]
+    ctx = _run(steps)
+    assert ctx.get("fallback") is True
+    assert ctx.get(["error", "details", "type"]) == "StepTimeout"
+
+def test_backoff_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY", 1)
+    monkeypatch.setattr(resilience, "RETRY_MAX_DELAY", 4)
+    delays = [resilience.backoff_delay(attempt) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+    assert max(resilience.backoff_delay(0) for _ in range(50)) <= 1
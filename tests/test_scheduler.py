@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from interpreter.functions import registry
+from interpreter.runtime import Context, run_steps
+
+@pytest.fixture(autouse=True)
+def functions():
+    order = []
+
+    @registry.register("fetch")
+    async def fetch(key, delay=0.05):
+        order.append(("start", key))
+        await asyncio.sleep(delay)
+        order.append(("end", key))
+        return key.upper()
+
+    @registry.register("fail")
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    yield order
+    registry.clear()
+
+def _fetch(key, **args):
+    return {"call": {"function": "fetch", "args": {"key": key, **args}, "async": True}}
+
+def _timed(steps, ctx):
+    loop = asyncio.new_event_loop()
+    start = loop.time()
+    try:
+        loop.run_until_complete(run_steps(steps, ctx))
+    finally:
+        elapsed = loop.time() - start
+        loop.close()
+    return elapsed
+
+def test_independent_calls_overlap():
+    steps = [{"let": {f"r{i}": _fetch(f"k{i}")}} for i in range(6)]
+    ctx = Context()
+    elapsed = _timed(steps, ctx)
+    assert [ctx.get(f"r{i}") for i in range(6)] == [f"K{i}" for i in range(6)]
+    assert elapsed < 0.2
+
+def test_dependent_steps_keep_program_order(functions):
+    steps = [
+        {"let": {"a": _fetch("a")}},
+        {"let": {"b": _fetch({"get": "a"})}},
+        {"let": {"c": _fetch("c", delay=0)}},
+        {"set": {"target": "a", "value": "rewritten"}},
+    ]
+    ctx = Context()
+    _timed(steps, ctx)
+    assert (ctx.get("b"), ctx.get("c"), ctx.get("a")) == ("A", "C", "rewritten")
+    assert functions.index(("end", "a")) < functions.index(("start", "A"))
+    assert functions.index(("start", "c")) < functions.index(("end", "a"))
+
+def test_try_steps_are_boundaries(functions):
+    steps = [
+        {"let": {"a": _fetch("a")}},
+        {"try": {"body": [{"let": {"t": _fetch("t", delay=0)}}]}},
+        {"let": {"b": _fetch("b", delay=0)}},
+    ]
+    _timed(steps, Context())
+    assert [event for event in functions if event[0] == "start"] == [("start", "a"), ("start", "t"), ("start", "b")]
+
+def test_failure_cancels_pending_steps_and_raises_its_error(functions):
+    steps = [
+        {"let": {"a": {"call": {"function": "fail", "args": {}, "async": True}}}},
+        {"let": {"b": _fetch("b", delay=1)}},
+        {"let": {"c": {"get": "a"}}},
+    ]
+    ctx = Context()
+    with pytest.raises(RuntimeError, match="boom"):
+        _timed(steps, ctx)
+    assert ("end", "b") not in functions
+    with pytest.raises(KeyError):
+        ctx.get("c")
+
+def test_assert_and_log_steps_are_boundaries(functions, caplog):
+    steps = [
+        {"let": {"a": _fetch("a")}},
+        {"assert": {"condition": {"get": "ok"}, "message": "not ok"}},
+        {"let": {"paid": _fetch("pay", delay=0)}},
+    ]
+    with pytest.raises(AssertionError, match="not ok"):
+        _timed(steps, Context({"ok": False}))
+    assert ("start", "pay") not in functions
+
+    functions.clear()
+    steps = [
+        {"let": {"a": _fetch("a")}},
+        {"log": {"message": ["'fetched'", "a"]}},
+        {"let": {"b": _fetch("b", delay=0)}},
+    ]
+    with caplog.at_level("INFO", logger="jsonflow.flow"):
+        _timed(steps, Context())
+    assert [record.getMessage() for record in caplog.records if record.name == "jsonflow.flow"] == ["fetched A"]
+    assert functions.index(("end", "a")) < functions.index(("start", "b"))
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from interpreter.compiler import compile_steps
+from interpreter.functions import registry
+from interpreter.runtime import Context, run_steps
+from interpreter.streams import JSONArray, iter_json_array
+
+SUM = [{"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": "x"}]}}}]
+
+def test_iter_json_array_across_chunk_boundaries():
+    values = [1, 23456, -7.5, "a,]b", {"k": [1, {"n": None}]}, [], True, "é"]
+    text = " [\n" + " ,\n".join(json.dumps(v) for v in values) + " ] "
+    for chunk_size in (1, 2, 3, 7, 1 << 16):
+        assert list(iter_json_array(io.StringIO(text), chunk_size)) == values
+    assert list(iter_json_array(io.StringIO("[]"))) == []
+    for bad in ("{}", "[1 2]", "[1,", "[1,]"):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO(bad), 2))
+
+def test_for_each_over_generator_and_json_file(tmp_path):
+    path = tmp_path / "events.json"
+    path.write_text(json.dumps(list(range(100))))
+    steps = [{"set": {"target": "total", "value": 0}}, {"forEach": {"source": "xs", "as": "x", "body": SUM}}]
+    for source in (JSONArray(str(path)), (i for i in range(100))):
+        ctx = Context({"xs": source})
+        compile_steps(steps).run_sync(ctx)
+        assert ctx.get("total") == 4950
+
+def test_for_each_over_async_iterator():
+    async def numbers():
+        for i in range(10):
+            await asyncio.sleep(0)
+            yield i
+
+    steps = [{"set": {"target": "total", "value": 0}},
+             {"forEach": {"source": "xs", "as": "x", "body": SUM, "async": True}}]
+    ctx = Context({"xs": numbers()})
+    asyncio.run(run_steps(steps, ctx))
+    assert ctx.get("total") == 45
+
+def test_streamed_map_is_lazy_and_bounded():
+    pulled = []
+
+    def source():
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    @registry.register("double")
+    async def double(n):
+        await asyncio.sleep(0)
+        return n * 2
+
+    registry.register("pulled", lambda: len(pulled))
+    steps = [
+        {"map": {"source": "xs", "as": "x", "target": "doubled", "stream": True, "concurrency": 4, "body": [
+            {"set": {"target": "x", "value": {"call": {"function": "double", "args": {"n": {"get": "x"}}, "async": True}}}},
+        ]}},
+        {"let": {"before": {"call": {"function": "pulled", "args": {}}}, "total": 0}},
+        {"forEach": {"source": "doubled", "as": "x", "async": True, "body": SUM}},
+    ]
+    ctx = Context({"xs": source()})
+    try:
+        asyncio.run(run_steps(steps, ctx))
+    finally:
+        registry.clear()
+    assert ctx.get("before") == 0
+    assert ctx.get("total") == 2 * sum(range(1000))
+    assert len(pulled) == 1000
+
+def test_sync_streamed_map_matches_list_map():
+    body = [{"set": {"target": "x", "value": {"add": [{"get": "x"}, 1]}}}]
+    listed = Context({"xs": [1, 2, 3]})
+    compile_steps([{"map": {"source": "xs", "as": "x", "target": "ys", "body": body}}]).run_sync(listed)
+    streamed = Context({"xs": iter([1, 2, 3])})
+    compile_steps([{"map": {"source": "xs", "as": "x", "target": "ys", "body": body, "stream": True}}]).run_sync(streamed)
+    assert list(streamed.get("ys")) == listed.get("ys") == [2, 3, 4]
+
+def test_streaming_memory_is_constant(tmp_path):
+    steps = [{"set": {"target": "total", "value": 0}}, {"forEach": {"source": "xs", "as": "x", "body": SUM}}]
+    peaks = []
+    for n in (5_000, 50_000):
+        path = tmp_path / f"events{n}.json"
+        path.write_text(json.dumps([{"id": i, "payload": "x" * 40} for i in range(n)]))
+        steps[1]["forEach"]["body"] = [{"set": {"target": "total", "value": {"add": [{"get": "total"}, {"get": ["x", "id"]}]}}}]
+        ctx = Context({"xs": JSONArray(str(path))})
+        tracemalloc.start()
+        compile_steps(steps).run_sync(ctx)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert ctx.get("total") == n * (n - 1) // 2
+    assert peaks[1] < peaks[0] * 2
@@ -0,0 +1,38 @@
+import io
+import json
+
+from interpreter import tracing
+from interpreter.runtime import Context
+from interpreter.compiler import compile_steps
+
+STEPS = [
+    {"let": {"x": 1}},
+    {"forEach": {"source": "items", "as": "i", "body": [{"set": {"target": "x", "value": {"get": "i"}}}]}},
+]
+
+def test_tracing_is_off_by_default():
+    assert tracing.tracer is None
+    compile_steps(STEPS).run_sync(Context({"items": [1, 2]}))
+
+def test_ring_buffer_keeps_latest_records():
+    tracer = tracing.enable_tracing(capacity=3)
+    try:
+        compile_steps(STEPS).run_sync(Context({"items": [1, 2, 3]}))
+    finally:
+        tracing.disable_tracing()
+    entries = list(tracer.iter_dicts())
+    assert [(e["event"], e["target"], e["value"]) for e in entries] == [("set", "x", 2), ("set", "i", 3), ("set", "x", 3)]
+
+def test_failures_are_traced_and_exported_as_jsonl():
+    tracer = tracing.enable_tracing(level=30)
+    try:
+        try:
+            compile_steps([{"let": {"x": 1}}, {"let": {"y": {"get": "missing"}}}]).run_sync(Context())
+        except KeyError:
+            pass
+    finally:
+        tracing.disable_tracing()
+    out = io.StringIO()
+    tracer.dump_jsonl(out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(e["event"], e["level"], e["step"]) for e in lines] == [("step_failed", "ERROR", 1)]
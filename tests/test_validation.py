@@ -0,0 +1,174 @@
+import json
+import os
+
+import pytest
+
+from interpreter import binary, validation
+from interpreter.validation import ValidationError, check_flow, compile_schema, validate_flow
+from main import compile_jsonflow, emit_binary
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SCHEMA = os.path.join(ROOT, "schema", "schema.json")
+
+FLOW_SCHEMA = {
+    "type": "object",
+    "required": ["function", "steps"],
+    "properties": {
+        "function": {"type": "string", "pattern": "^[a-z]+$"},
+        "steps": {"type": "array", "items": {"$ref": "#/$defs/step"}},
+    },
+    "$defs": {
+        "step": {"oneOf": [
+            {"properties": {"kind": {"const": "set"}, "target": {"type": "string"}}, "required": ["kind", "target"]},
+            {"properties": {"kind": {"const": "if"}, "then": {"type": "array", "items": {"$ref": "#/$defs/step"}}},
+             "required": ["kind", "then"]},
+            {"properties": {"note": {"type": "string"}}, "required": ["note"]},
+        ]},
+    },
+}
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    validation.clear_cache()
+    yield
+    validation.DISPATCH = True
+    validation.clear_cache()
+
+def errors(schema, instance):
+    return [f"{'/'.join(map(str, path))}: {message}" for path, message in compile_schema(schema)(instance)]
+
+def test_draft7_keywords():
+    schema = {
+        "type": "object",
+        "required": ["name"],
+        "properties": {
+            "name": {"type": "string", "minLength": 2},
+            "count": {"type": "integer", "minimum": 0, "exclusiveMaximum": 10},
+            "flag": {"const": True},
+            "tags": {"type": "array", "items": {"enum": ["a", "b"]}, "uniqueItems": True},
+            "either": {"anyOf": [{"type": "null"}, {"type": "number"}]},
+            "cond": {"if": {"type": "string"}, "then": {"maxLength": 1}, "else": {"not": {"type": "null"}}},
+        },
+        "additionalProperties": False,
+    }
+    assert errors(schema, {"name": "ok", "count": 2.0, "flag": True, "tags": ["a"], "either": None, "cond": 3}) == []
+    found = errors(schema, {"name": "x", "count": 10, "flag": 1, "tags": ["a", "a", "c"], "either": "1", "cond": "ab", "extra": 1})
+    assert found == [
+        "name: \"x\" is shorter than 2",
+        "count: 10 is not less than 10",
+        "flag: 1 is not true",
+        "tags/2: \"c\" is not one of [\"a\", \"b\"]",
+        "tags: has non-unique items",
+        "either: \"1\" does not match any anyOf branch",
+        "cond: \"ab\" is longer than 1",
+        ": unexpected property 'extra'",
+    ]
+    assert errors(schema, {}) == [": missing required property 'name'"]
+    assert errors(schema, {"name": "ok", "cond": None}) != []
+
+def test_recursive_refs_and_tagged_branches():
+    flow = {"function": "f", "steps": [
+        {"kind": "set", "target": "x"},
+        {"kind": "if", "then": [{"kind": "set", "target": 1}, {"note": "hi"}]},
+        {"kind": "loop"},
+    ]}
+    found = errors(FLOW_SCHEMA, flow)
+    assert found == [
+        "steps/1/then/0/target: 1 is not of type string",
+        "steps/2: missing required property 'note'",
+    ]
+
+def test_dispatch_matches_checking_every_branch():
+    flows = [
+        {"function": "f", "steps": [{"kind": "set", "target": "x", "note": "both"}]},
+        {"function": "f", "steps": [{"kind": "if", "then": []}, {"kind": 3}, "step"]},
+    ]
+    dispatched = [bool(errors(FLOW_SCHEMA, flow)) for flow in flows]
+    validation.DISPATCH = False
+    assert [bool(errors(FLOW_SCHEMA, flow)) for flow in flows] == dispatched == [True, True]
+    assert errors(FLOW_SCHEMA, flows[0]) == [f"steps/0: {json.dumps(flows[0]['steps'][0])} matches more than one oneOf branch"]
+
+def test_schema_json_steps_are_checked_against_their_type(tmp_path):
+    flow = {
+        "function": "deposit",
+        "schema": {"inputs": {}, "context": {}, "outputs": {}},
+        "steps": [
+            {"type": "if", "condition": {"get": "ok"}, "then": [{"type": "set", "target": 1, "value": {"add": [1]}}]},
+            {"type": "teleport"},
+        ],
+    }
+    found = validate_flow(flow, SCHEMA)
+    assert "steps/0/then/0/target: 1 is not of type string" in found
+    assert "steps/0/then/0/value/add: has fewer than 2 items" in found
+    assert 'steps/1/type: "teleport" does not match "^custom_[a-zA-Z0-9_]+$"' in found
+
+def test_results_are_memoized_per_schema_file_version(tmp_path):
+    schema_path = tmp_path / "flow.schema.json"
+    schema_path.write_text(json.dumps(FLOW_SCHEMA))
+    flow = {"function": "f", "steps": [{"kind": "set", "target": "x"}]}
+
+    validator = validation.load_validator(str(schema_path))
+    assert validate_flow(flow, str(schema_path)) == []
+    assert validation.load_validator(str(schema_path)) is validator
+    assert len(validation._results) == 1
+    validate_flow(dict(flow), str(schema_path))
+    assert len(validation._results) == 1
+
+    schema_path.write_text(json.dumps({**FLOW_SCHEMA, "properties": {"function": {"const": "g"}}}))
+    stat = os.stat(schema_path)
+    os.utime(schema_path, (stat.st_atime, stat.st_mtime + 1))
+    assert validate_flow(flow, str(schema_path)) == ['function: "f" is not "g"']
+    assert validation.load_validator(str(schema_path)) is not validator
+
+def test_changing_a_referenced_schema_file_invalidates_the_cache(tmp_path):
+    defs_path = tmp_path / "defs.json"
+    defs_path.write_text(json.dumps({"$defs": {"name": {"type": "string"}}}))
+    schema_path = tmp_path / "flow.schema.json"
+    schema_path.write_text(json.dumps({"properties": {"function": {"$ref": "defs.json#/$defs/name"}}}))
+    flow = {"function": "f"}
+
+    validator = validation.load_validator(str(schema_path))
+    assert validate_flow(flow, str(schema_path)) == []
+
+    defs_path.write_text(json.dumps({"$defs": {"name": {"const": "g"}}}))
+    stat = os.stat(defs_path)
+    os.utime(defs_path, (stat.st_atime, stat.st_mtime + 1))
+    assert validate_flow(flow, str(schema_path)) == ['function: "f" is not "g"']
+    assert validation.load_validator(str(schema_path)) is not validator
+
+def test_binary_flows_are_memoized_without_decoding(tmp_path):
+    schema_path = tmp_path / "flow.schema.json"
+    schema_path.write_text(json.dumps(FLOW_SCHEMA))
+    data = binary.encode({"function": "f", "steps": [{"kind": "set", "target": 1}]})
+
+    assert validate_flow(binary.loads(data), str(schema_path)) == ["steps/0/target: 1 is not of type string"]
+    flow = binary.loads(data)
+    with pytest.raises(ValidationError) as error:
+        check_flow(flow, str(schema_path))
+    assert error.value.errors == ["steps/0/target: 1 is not of type string"]
+    assert flow._fields == {}
+
+def test_compile_jsonflow_validates_against_the_flows_schema(tmp_path):
+    (tmp_path / "flow.schema.json").write_text(json.dumps({
+        "type": "object",
+        "properties": {"function": {"type": "string", "pattern": "^[a-z]+$"}},
+    }))
+    flow = {
+        "$schema": "flow.schema.json",
+        "function": "Deposit",
+        "schema": {"inputs": {}, "context": {"balance": "integer"}},
+        "steps": [{"set": {"target": "balance", "value": {"value": 1}}}],
+    }
+    path = tmp_path / "flow.json"
+    path.write_text(json.dumps(flow))
+
+    with pytest.raises(ValidationError, match='"Deposit" does not match'):
+        compile_jsonflow(str(path))
+    with pytest.raises(ValidationError):
+        emit_binary(str(path))
+    assert "python" in compile_jsonflow(str(path), validate=False)
+
+    path.write_text(json.dumps({**flow, "function": "deposit"}))
+    assert "python" in compile_jsonflow(str(path))
+    with pytest.raises(ValidationError, match="missing required property"):
+        compile_jsonflow(str(path), schema=SCHEMA)